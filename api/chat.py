@@ -4,7 +4,7 @@ Chat API service using Kimi K2.5 (Moonshot AI, OpenAI-compatible endpoint).
 Features:
 - Kimi K2.5 function calling agent loop
 - SSE (Server-Sent Events) streaming for real-time tool call visibility
-- Lightweight RAG retrieval over local publications & GitHub projects
+- Lightweight RAG retrieval over local publications, GitHub projects & site pages
 - 10 agent tools: search_publications, fetch_webpage, search_github_repo,
   list_github_repos, get_citation_stats, read_site_page, get_pinned_repos,
   search_site_pages, get_repo_contributors
@@ -16,6 +16,7 @@ import os
 import sys
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Ensure sibling modules in api/ are importable on Vercel
 sys.path.insert(0, os.path.dirname(__file__))
@@ -23,7 +24,9 @@ sys.path.insert(0, os.path.dirname(__file__))
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from openai import OpenAI, RateLimitError, BadRequestError
+import github_graphql
 import rag_utils
+import tool_metrics
 import tools as agent_tools
 
 
@@ -51,7 +54,7 @@ SYSTEM_PROMPT_TEMPLATE = """\
 3. **search_github_repo** — 浏览 GitHub 仓库的文件和代码
 4. **list_github_repos** — 列出 GitHub 用户的所有仓库
 5. **get_citation_stats** — 获取引用统计和地理分布数据
-6. **read_site_page** — 读取安翔个人网站上的页面内容
+6. **read_site_page** — 读取安翔个人网站上的页面内容；长页面可先用 `list_sections=true` 查看章节目录，再用 `section` 只读取需要的章节
 7. **get_pinned_repos** — 获取 GitHub 用户 Pin 在首页的精选仓库（需要 GraphQL API）
 8. **search_site_pages** — 在安翔的个人网站上搜索所有页面（博客、可视化页面等），按关键词匹配返回相关页面标题和摘要
 9. **get_repo_contributors** — 获取 GitHub 仓库的贡献者列表（用户名、提交数、个人主页链接）
@@ -224,6 +227,8 @@ def _parse_retry_after(e):
 _CHARS_PER_TOKEN = 2.5
 # Leave headroom for system prompt (~4k tokens) + RAG (~2k) + reply (131k)
 _MAX_CONTEXT_CHARS = 100_000  # ~40k tokens, well under 131k limit
+# RAG context is packed to this budget; it is resent on every agent round
+_RAG_CONTEXT_CHARS = 5_000  # ~2k tokens
 
 
 def _estimate_message_chars(messages):
@@ -307,9 +312,9 @@ def _truncate_tool_results(messages):
     """Truncate long tool results to save context space."""
     truncated = []
     for m in messages:
-        if m.get("role") == "tool" and len(m.get("content", "")) > 2000:
+        if m.get("role") == "tool" and len(m.get("content", "")) > tool_metrics.DISPLAY_CHARS:
             m = dict(m)
-            m["content"] = m["content"][:2000] + "\n... [truncated for context limit]"
+            m["content"] = m["content"][:tool_metrics.DISPLAY_CHARS] + "\n... [truncated for context limit]"
         truncated.append(m)
     return truncated
 
@@ -317,14 +322,62 @@ def _truncate_tool_results(messages):
 # Agent Loop (SSE streaming)
 # ═══════════════════════════════════════════════════════════════════════════
 
-def _run_agent_loop(client, messages, system_content):
+# Tool calls of one round run in parallel on this pool (shared by all
+# requests served by this process)
+_TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=_TOOL_WORKERS, thread_name_prefix="tool")
+
+
+def _execute_tool_call(tc, calls=None, tool_round=None):
+    """Run one tool call from the model; errors become the result string.
+
+    The call's metrics record is appended to *calls* if given.  Calls of a
+    round that run concurrently share *tool_round*, which lets GitHub
+    GraphQL fields wait for each other only while the others still run.
+    """
+    tool_name = tc["function"]["name"]
+    try:
+        if tool_round is None:
+            return agent_tools.execute_tool(tool_name, tc["function"]["arguments"], calls)
+        with tool_round.call():
+            return agent_tools.execute_tool(tool_name, tc["function"]["arguments"], calls)
+    except Exception as e:
+        logger.exception(f"Tool execution error: {tool_name}")
+        return f"Error executing {tool_name}: {e}"
+
+
+def _run_agent_loop(client, messages, system_content, include_metrics=False):
     """Generator that yields SSE events for the agent loop.
 
     Flow:
       1. Call Kimi K2.5 with tools
-      2. If model returns tool_calls → execute each, yield SSE events, loop
+      2. If model returns tool_calls → execute them concurrently, yield SSE events, loop
       3. If model returns final text → yield message event, done
+
+    The tool calls of the request are summarized in the log, and with
+    *include_metrics* also in a ``metrics`` event sent before ``done``.
     """
+    calls = []
+    try:
+        yield from _agent_rounds(client, messages, system_content, calls, include_metrics)
+    finally:
+        if calls:
+            summary = tool_metrics.summarize(calls)
+            logger.info(
+                f"Agent request: {summary['calls']} tool calls, {summary['total_ms']:.0f} ms in tools, "
+                f"{summary['total_bytes']} result bytes, {summary['truncated']} truncated"
+            )
+
+
+def _done_events(calls, include_metrics):
+    """The closing event(s) of a successful agent run."""
+    if include_metrics:
+        yield _sse_event("metrics", tool_metrics.summarize(calls))
+    yield _sse_event("done", {})
+
+
+def _agent_rounds(client, messages, system_content, calls, include_metrics):
+    """The body of ``_run_agent_loop``; tool call metrics are collected in *calls*."""
     # RAG retrieval for initial context
     last_user_msg = next(
         (m["content"] for m in reversed(messages) if m["role"] == "user"), ""
@@ -332,7 +385,9 @@ def _run_agent_loop(client, messages, system_content):
     rag_context = ""
     if last_user_msg:
         results = rag_utils.search(last_user_msg, top_k=3)
-        rag_context = rag_utils.format_context(results)
+        rag_context = rag_utils.format_context(
+            results, query=last_user_msg, max_chars=_RAG_CONTEXT_CHARS
+        )
 
     full_system = system_content
     if rag_context:
@@ -477,17 +532,16 @@ def _run_agent_loop(client, messages, system_content):
                 msg_dict["reasoning_content"] = accumulated_reasoning
             api_messages.append(msg_dict)
 
-            # Execute each tool call
+            # Announce every call up front, then run them concurrently: results
+            # stream to the client as they finish, but enter the context in
+            # call order so the provider sees them matched to tool_calls
             for tc in tool_calls_list:
                 tool_name = tc["function"]["name"]
-                tool_args_raw = tc["function"]["arguments"]
                 display = agent_tools.TOOL_DISPLAY.get(tool_name, {})
-
                 try:
-                    tool_args = json.loads(tool_args_raw) if tool_args_raw else {}
+                    tool_args = json.loads(tc["function"]["arguments"] or "{}")
                 except json.JSONDecodeError:
                     tool_args = {}
-
                 yield _sse_event("tool_call", {
                     "id": tc["id"],
                     "name": tool_name,
@@ -497,23 +551,30 @@ def _run_agent_loop(client, messages, system_content):
                     "status": "running",
                 })
 
-                try:
-                    result = agent_tools.execute_tool(tool_name, tool_args_raw)
-                except Exception as e:
-                    logger.exception(f"Tool execution error: {tool_name}")
-                    result = f"Error executing {tool_name}: {e}"
-
+            results = [None] * len(tool_calls_list)
+            if len(tool_calls_list) == 1:
+                finished = [(0, _execute_tool_call(tool_calls_list[0], calls))]
+            else:
+                tool_round = github_graphql.ToolRound(len(tool_calls_list))
+                futures = {
+                    _TOOL_EXECUTOR.submit(_execute_tool_call, tc, calls, tool_round): i
+                    for i, tc in enumerate(tool_calls_list)
+                }
+                finished = ((futures[f], f.result()) for f in as_completed(futures))
+            for i, result in finished:
+                results[i] = result
+                tc = tool_calls_list[i]
                 display_result = result
-                if len(display_result) > 2000:
-                    display_result = display_result[:2000] + "\n... [truncated for display]"
-
+                if len(display_result) > tool_metrics.DISPLAY_CHARS:
+                    display_result = display_result[:tool_metrics.DISPLAY_CHARS] + "\n... [truncated for display]"
                 yield _sse_event("tool_result", {
                     "id": tc["id"],
-                    "name": tool_name,
+                    "name": tc["function"]["name"],
                     "result": display_result,
                     "status": "done",
                 })
 
+            for tc, result in zip(tool_calls_list, results):
                 api_messages.append({
                     "role": "tool",
                     "tool_call_id": tc["id"],
@@ -529,14 +590,14 @@ def _run_agent_loop(client, messages, system_content):
         # No tool calls — final response
         if not accumulated_content:
             yield _sse_event("message", {"content": ""})
-        yield _sse_event("done", {})
+        yield from _done_events(calls, include_metrics)
         return
 
     # Safety: exceeded max rounds
     yield _sse_event("message", {
         "content": "I've reached the maximum number of tool call rounds. Here's what I found so far based on the information gathered above."
     })
-    yield _sse_event("done", {})
+    yield from _done_events(calls, include_metrics)
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -583,7 +644,7 @@ def chat():
     if use_sse:
         # SSE streaming response
         def generate():
-            for event in _run_agent_loop(client, messages, system_content):
+            for event in _run_agent_loop(client, messages, system_content, bool(data.get("metrics"))):
                 yield event
 
         return Response(
@@ -603,7 +664,9 @@ def chat():
         )
         if last_user_msg:
             results = rag_utils.search(last_user_msg, top_k=3)
-            rag_context = rag_utils.format_context(results)
+            rag_context = rag_utils.format_context(
+                results, query=last_user_msg, max_chars=_RAG_CONTEXT_CHARS
+            )
 
         full_system = system_content
         if rag_context:
@@ -638,6 +701,12 @@ def chat():
         return jsonify({"reply": reply})
 
 
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Return this instance's tool-layer counters (caches, HTTP pool, GitHub quota)."""
+    return jsonify(agent_tools.metrics())
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "5000"))
     app.run(host="0.0.0.0", port=port)
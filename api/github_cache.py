@@ -0,0 +1,252 @@
+"""
+Conditional-request cache for the GitHub API tools.
+
+REST responses are stored with their ``ETag`` / ``Last-Modified`` headers.
+Within the endpoint's TTL a cached body is served without any request;
+after that it is revalidated with ``If-None-Match`` / ``If-Modified-Since``.
+A ``304 Not Modified`` carries no body and does not count against the REST
+rate limit (60 requests/hour unauthenticated).  GraphQL has its own
+field cache in github_graphql.
+
+Two tiers: a bounded in-process LRU, and — when ``POSTGRES_URL`` is set —
+the ``github_cache`` table (see schema.sql), so entries survive cold starts
+and are shared between serverless instances.  If GitHub is unreachable, a
+stale entry is served rather than failing the tool call — and, through
+github_quota, also when the rate-limit budget runs low or out.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+import github_quota
+import http_client
+import tool_metrics
+from cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached response is served without revalidation, by endpoint
+# (first matching path pattern wins)
+_TTLS = (
+    (re.compile(r"^/repos/[^/]+/[^/]+/contents(/|$)"), 5 * 60),  # changes with every push
+    (re.compile(r"^/repos/[^/]+/[^/]+/contributors$"), 6 * 3600),
+    (re.compile(r"^/users/[^/]+/repos$"), 30 * 60),
+)
+_DEFAULT_TTL = 10 * 60
+
+_MEMORY = LRUCache(256)
+_DB_ENABLED = bool(os.getenv("POSTGRES_URL")) and os.getenv("GITHUB_CACHE_DB", "1") != "0"
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def _ttl(url):
+    path = urlsplit(url).path
+    return next((ttl for pattern, ttl in _TTLS if pattern.match(path)), _DEFAULT_TTL)
+
+
+def _cache_key(method, url, headers, body):
+    """Hash of everything that selects the response, including who is asking."""
+    h = hashlib.sha256(f"{method} {url}\n".encode())
+    h.update(headers.get("Authorization", "").encode() + b"\0")
+    h.update(headers.get("Accept", "").encode() + b"\0")
+    h.update(body or b"")
+    return h.hexdigest()
+
+
+def _count(outcome):
+    with _counts_lock:
+        _counts[outcome] += 1
+
+
+def stats():
+    """Return outcome counters (fresh, revalidated, miss, stale, quota_stale) and memory-tier stats."""
+    with _counts_lock:
+        counts = dict(_counts)
+    return {**counts, "memory": _MEMORY.stats()}
+
+
+# ── Postgres tier ────────────────────────────────────────────────────
+# Set once the table has been created/migrated by this process
+_table_ready = False
+
+
+def _ensure_cache_table(conn):
+    """Create the github_cache table if it doesn't exist (once per process)."""
+    global _table_ready
+    if _table_ready:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS github_cache (
+                key VARCHAR(64) PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                body BYTEA NOT NULL,
+                link TEXT,
+                fetched_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        cur.execute("ALTER TABLE github_cache ADD COLUMN IF NOT EXISTS link TEXT")
+        conn.commit()
+    _table_ready = True
+
+
+def _db_get(key):
+    """Read an entry from Postgres, or None (also when the DB is unavailable)."""
+    if not _DB_ENABLED:
+        return None
+    from db_utils import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        _ensure_cache_table(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT etag, last_modified, body, link,
+                          EXTRACT(EPOCH FROM NOW() - fetched_at) AS age
+                   FROM github_cache WHERE key = %s""",
+                (key,),
+            )
+            row = cur.fetchone()
+        if row:
+            return {
+                "body": bytes(row["body"]),
+                "etag": row["etag"],
+                "last_modified": row["last_modified"],
+                "link": row["link"],
+                "fetched_at": time.time() - float(row["age"]),
+            }
+    except Exception as e:
+        logger.warning(f"GitHub cache read failed: {e}")
+    finally:
+        conn.close()
+    return None
+
+
+def _db_put(key, url, entry):
+    """Upsert an entry into Postgres; failures only log."""
+    if not _DB_ENABLED:
+        return
+    from db_utils import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        import psycopg2
+
+        _ensure_cache_table(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """INSERT INTO github_cache (key, url, etag, last_modified, body, link, fetched_at)
+                   VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                   ON CONFLICT (key) DO UPDATE SET
+                       etag = EXCLUDED.etag, last_modified = EXCLUDED.last_modified,
+                       body = EXCLUDED.body, link = EXCLUDED.link, fetched_at = NOW()""",
+                (key, url, entry["etag"], entry["last_modified"], psycopg2.Binary(entry["body"]), entry.get("link")),
+            )
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"GitHub cache write failed: {e}")
+    finally:
+        conn.close()
+
+
+# ── cached fetch ─────────────────────────────────────────────────────
+def fetch(method, url, headers=None, body=None, timeout=15):
+    """Return the response body of a GitHub API request, using the cache.
+
+    4xx/5xx responses raise ``HTTPError`` as usual and are never cached.
+    """
+    return _fetch_entry(method, url, headers, body, timeout)["body"]
+
+
+def fetch_with_link(url, headers=None, timeout=15):
+    """GET *url* through the cache; return ``(body, Link header or None)``."""
+    entry = _fetch_entry("GET", url, headers, None, timeout)
+    return entry["body"], entry.get("link")
+
+
+def _fetch_entry(method, url, headers, body, timeout):
+    headers = dict(headers or {})
+    key = _cache_key(method, url, headers, body)
+    entry = _MEMORY.get(key)
+    if entry is None:
+        entry = _db_get(key)
+        if entry is not None:
+            _MEMORY.put(key, entry)
+
+    if entry is not None and time.time() - entry["fetched_at"] < _ttl(url):
+        _count("fresh")
+        tool_metrics.cache_hit("github_cache")
+        return entry
+
+    # With the rate-limit budget low, an expired entry beats spending it
+    auth = headers.get("Authorization", "")
+    resource = "core"
+    status, wait = github_quota.reserve(auth, resource)
+    if status != "ok" and entry is not None:
+        _count("quota_stale")
+        tool_metrics.cache_hit("github_cache_stale")
+        return entry
+    if status == "exhausted":
+        github_quota.wait_or_raise(resource, wait)
+
+    request_headers = dict(headers)
+    if entry is not None and method == "GET":
+        if entry["etag"]:
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+    for attempt in range(2):
+        try:
+            resp = http_client.request(method, url, headers=request_headers, body=body, timeout=timeout)
+            break
+        except HTTPError as e:
+            github_quota.update(auth, e.headers, resource)
+            if not github_quota.is_rate_limited(e):
+                raise
+            if entry is not None:
+                logger.warning(f"GitHub rate limit hit, serving cached response for {url}")
+                _count("quota_stale")
+                tool_metrics.cache_hit("github_cache_stale")
+                return entry
+            if attempt:
+                raise github_quota.RateLimitError(resource, github_quota.retry_wait(e.headers)) from e
+            github_quota.wait_or_raise(resource, github_quota.retry_wait(e.headers))
+        except OSError as e:
+            if entry is None:
+                raise
+            logger.warning(f"GitHub request failed, serving cached response for {url}: {e}")
+            _count("stale")
+            tool_metrics.cache_hit("github_cache_stale")
+            return entry
+    github_quota.update(auth, resp.headers, resource)
+
+    if resp.status == 304 and entry is not None:
+        _count("revalidated")
+        tool_metrics.cache_hit("github_cache_304")
+        entry = {**entry, "fetched_at": time.time()}
+    else:
+        _count("miss")
+        entry = {
+            "body": resp.body,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "link": resp.headers.get("Link"),
+            "fetched_at": time.time(),
+        }
+    _MEMORY.put(key, entry)
+    _db_put(key, url, entry)
+    return entry
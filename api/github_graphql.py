@@ -0,0 +1,276 @@
+"""
+Batched GitHub GraphQL gateway for the agent tools.
+
+Over REST every GitHub tool call is its own round trip.  With a token, the
+repository tools ask this module for GraphQL *fields* instead — a user's
+repositories, their pinned items, a repository's counters — and every
+field requested while a batch is open (the agent loop runs one round's
+tool calls concurrently) goes out as one aliased query.  The batch only
+stays open for ``_BATCH_WINDOW`` when other tool calls of the same round
+are still running (the agent loop wraps each call in ``ToolRound.call``);
+a lone call sends its query at once.  Each query also
+selects ``rateLimit { cost remaining resetAt }``, so the point budget
+(5,000/hour) is tracked in ``stats()``.  Field results are cached in
+memory by TTL, so a repeated field costs no points at all; when the
+budget runs low (see github_quota) expired results are served instead.
+
+GraphQL requires a token; without one the tools keep using REST.  It also
+has no equivalent of the REST contributors endpoint (commit counts per
+author), so ``get_repo_contributors`` stays on REST.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.error import HTTPError
+
+import github_quota
+import http_client
+import tool_metrics
+from cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_ENDPOINT = "https://api.github.com/graphql"
+# How long the first field of a batch waits for concurrent tool calls to
+# add theirs before the query is sent (only while any are running)
+_BATCH_WINDOW = 0.01
+# Seconds a field result is served from memory
+_TTL = 30 * 60
+
+# Largest page GitHub serves for a connection; longer listings are paged
+# with the endCursor of the previous page
+_PAGE_SIZE = 100
+
+_REPO_FIELDS = "name description url stargazerCount forkCount isFork primaryLanguage { name }"
+_REPO_ORDER = {
+    "stars": "STARGAZERS",
+    "updated": "UPDATED_AT",
+    "created": "CREATED_AT",
+    "pushed": "PUSHED_AT",
+    "full_name": "NAME",
+}
+
+_RESULTS = LRUCache(128)
+_pending = {}  # token -> open _Batch
+_lock = threading.Lock()
+_round = contextvars.ContextVar("tool_round", default=None)
+_stats = {
+    "queries": 0, "fields": 0, "cached": 0, "quota_stale": 0, "cost": 0, "remaining": None, "reset_at": None,
+}
+
+
+class GraphQLError(Exception):
+    """GitHub answered a field of the query with a GraphQL error."""
+
+
+class ToolRound:
+    """The tool calls of one agent round, counted while they run.
+
+    The agent loop creates one per round of concurrent tool calls and runs
+    each call inside ``call()``; a field then waits for a batch only while
+    other calls of its round are still running and might add theirs.
+    """
+
+    def __init__(self, size):
+        self._running = size
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def call(self):
+        """Run one tool call of this round (in the calling thread's context)."""
+        token = _round.set(self)
+        try:
+            yield
+        finally:
+            _round.reset(token)
+            with self._lock:
+                self._running -= 1
+
+    def others_running(self):
+        with self._lock:
+            return self._running > 1
+
+
+class _Batch:
+    """Fields collected for one aliased query, and its outcome."""
+
+    __slots__ = ("aliases", "done", "data", "errors", "error")
+
+    def __init__(self):
+        self.aliases = {}  # field -> alias
+        self.done = threading.Event()
+        self.data = {}
+        self.errors = {}  # alias -> message
+        self.error = None
+
+
+def _literal(value):
+    """GraphQL literal for a string or number (JSON syntax is compatible)."""
+    return json.dumps(value)
+
+
+def stats():
+    """Return query/field counters, total point cost and the last known budget."""
+    with _lock:
+        return {**_stats, "memory": _RESULTS.stats()}
+
+
+def _build_query(aliases):
+    lines = [f"  {alias}: {field}" for field, alias in aliases.items()]
+    lines.append("  rateLimit { cost remaining resetAt }")
+    return "query {\n" + "\n".join(lines) + "\n}"
+
+
+def _send(batch, token, timeout):
+    """Run *batch* as one query and record per-alias data and errors."""
+    query = _build_query(batch.aliases)
+    auth = f"Bearer {token}"
+    status, wait = github_quota.reserve(auth, "graphql")
+    if status == "exhausted":
+        github_quota.wait_or_raise("graphql", wait)
+    headers = {
+        "Authorization": auth,
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "User-Agent": "Mozilla/5.0 (compatible; XiangAnBot/1.0)",
+    }
+    try:
+        # Queries only read, so a POST lost on a stale keep-alive connection
+        # is safe to resend
+        resp = http_client.request(
+            "POST", _ENDPOINT, headers=headers, body=json.dumps({"query": query}).encode("utf-8"),
+            timeout=timeout, idempotent=True,
+        )
+    except HTTPError as e:
+        github_quota.update(auth, e.headers, "graphql")
+        if github_quota.is_rate_limited(e):
+            raise github_quota.RateLimitError("graphql", github_quota.retry_wait(e.headers)) from e
+        raise
+    github_quota.update(auth, resp.headers, "graphql")
+    result = json.loads(resp.body.decode("utf-8"))
+    batch.data = result.get("data") or {}
+    for err in result.get("errors") or []:
+        message = err.get("message", "unknown")
+        path = err.get("path") or []
+        targets = [path[0]] if path and path[0] in batch.aliases.values() else batch.aliases.values()
+        for alias in targets:
+            batch.errors.setdefault(alias, message)
+
+    rate = batch.data.get("rateLimit") or {}
+    with _lock:
+        _stats["queries"] += 1
+        _stats["fields"] += len(batch.aliases)
+        _stats["cost"] += rate.get("cost") or 0
+        if "remaining" in rate:
+            _stats["remaining"] = rate["remaining"]
+            _stats["reset_at"] = rate.get("resetAt")
+    logger.info(
+        f"GitHub GraphQL: {len(batch.aliases)} fields in one query, "
+        f"cost {rate.get('cost')}, {rate.get('remaining')} points left"
+    )
+
+
+def fetch_field(field, token, timeout=15):
+    """Return the data of one top-level GraphQL *field*, e.g. ``user(login: "x") { name }``.
+
+    The field joins the batch that is currently collecting, or opens one and
+    sends it — after ``_BATCH_WINDOW`` if other tool calls of the current
+    ``ToolRound`` are still running, at once otherwise.  Raises ``GraphQLError`` if GitHub
+    reported an error for it, ``RateLimitError`` if the point budget is
+    used up, and ``HTTPError``/``OSError`` if the request failed; in the
+    last two cases an expired result is returned instead when there is one.
+    """
+    key = (token, field)
+    entry = _RESULTS.get(key)
+    if entry is not None and time.time() - entry[1] < _TTL:
+        with _lock:
+            _stats["cached"] += 1
+        tool_metrics.cache_hit("github_graphql")
+        return entry[0]
+    if entry is not None and github_quota.peek(f"Bearer {token}", "graphql")[0] != "ok":
+        # Points are running out: an expired result beats spending them
+        with _lock:
+            _stats["quota_stale"] += 1
+        tool_metrics.cache_hit("github_graphql_stale")
+        return entry[0]
+
+    with _lock:
+        batch = _pending.get(token)
+        leader = batch is None
+        if leader:
+            batch = _pending[token] = _Batch()
+        alias = batch.aliases.setdefault(field, f"f{len(batch.aliases)}")
+
+    if leader:
+        tool_round = _round.get()
+        if tool_round is not None and tool_round.others_running():
+            time.sleep(_BATCH_WINDOW)
+        with _lock:
+            del _pending[token]  # later fields start a new batch
+        try:
+            _send(batch, token, timeout)
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+    else:
+        batch.done.wait()
+
+    if batch.error is not None:
+        error = batch.error
+        if entry is not None and (
+            isinstance(error, github_quota.RateLimitError)
+            or (isinstance(error, OSError) and not isinstance(error, HTTPError))
+        ):
+            logger.warning(f"GitHub GraphQL unavailable, serving expired result: {error}")
+            with _lock:
+                _stats["quota_stale"] += 1
+            tool_metrics.cache_hit("github_graphql_stale")
+            return entry[0]
+        raise error
+    if alias in batch.errors:
+        raise GraphQLError(batch.errors[alias])
+    data = batch.data.get(alias)
+    _RESULTS.put(key, (data, time.time()))
+    return data
+
+
+# ── fields used by the tools ─────────────────────────────────────────
+def owner_repositories(login, token, sort="stars", limit=30):
+    """Public repositories owned by user or organization *login*, or None if it doesn't exist.
+
+    Returns ``{"totalCount", "nodes"}`` with up to *limit* nodes, fetched
+    ``_PAGE_SIZE`` at a time by cursor.  GraphQL can sort by stars, which
+    the REST listing cannot.
+    """
+    order = _REPO_ORDER.get(sort, "STARGAZERS")
+    nodes, after = [], None
+    while True:
+        cursor = f", after: {_literal(after)}" if after else ""
+        field = (
+            f"repositoryOwner(login: {_literal(login)}) {{ repositories(first: {min(_PAGE_SIZE, limit - len(nodes))}"
+            f"{cursor}, privacy: PUBLIC, ownerAffiliations: OWNER, orderBy: {{field: {order}, direction: DESC}}) "
+            f"{{ totalCount pageInfo {{ endCursor hasNextPage }} nodes {{ {_REPO_FIELDS} }} }} }}"
+        )
+        owner = fetch_field(field, token)
+        if not owner:
+            return None
+        page = owner["repositories"]
+        nodes.extend(page["nodes"])
+        if len(nodes) >= limit or not page["pageInfo"]["hasNextPage"]:
+            return {"totalCount": page["totalCount"], "nodes": nodes[:limit]}
+        after = page["pageInfo"]["endCursor"]
+
+
+def pinned_repositories(login, token, first=6):
+    """Repositories pinned on the profile of *login*, or None if it doesn't exist."""
+    field = (
+        f"repositoryOwner(login: {_literal(login)}) {{ ... on ProfileOwner {{ "
+        f"pinnedItems(first: {int(first)}, types: REPOSITORY) {{ nodes {{ ... on Repository {{ {_REPO_FIELDS} }} }} }} }} }}"
+    )
+    owner = fetch_field(field, token)
+    return owner["pinnedItems"]["nodes"] if owner else None
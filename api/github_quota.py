@@ -0,0 +1,166 @@
+"""
+GitHub API rate-limit bookkeeping shared by github_cache and github_graphql.
+
+Every GitHub response reports the caller's budget in ``X-RateLimit-Limit``,
+``X-RateLimit-Remaining``, ``X-RateLimit-Reset`` and ``X-RateLimit-Resource``
+(``core`` for REST, ``graphql`` for GraphQL points); secondary limits answer
+403/429 with ``Retry-After``.  This module keeps the latest numbers per
+(token, resource) for all threads of the process, and reserves one request
+from the budget before each call so concurrent tool calls see it shrink.
+
+Callers ask ``reserve()`` before sending: when the budget is *low* they
+serve a stale cached response if they have one, and when it is
+*exhausted* they either wait (a short ``Retry-After``) or fail fast with
+``RateLimitError`` instead of sending a request that can only get a 403.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Below this fraction of the limit (and at least _LOW_MIN requests) the
+# budget counts as low and cached responses are preferred
+_LOW_FRACTION = 0.05
+_LOW_MIN = 3
+# Longest Retry-After / reset wait that is slept through instead of failing
+_MAX_WAIT = float(os.getenv("GITHUB_MAX_BACKOFF", "5"))
+
+_state = {}  # (token id, resource) -> {"limit", "remaining", "reset", "retry_at", "low"}
+_lock = threading.Lock()
+
+
+class RateLimitError(Exception):
+    """The GitHub budget for a resource is used up until *wait* seconds from now."""
+
+    def __init__(self, resource, wait):
+        self.resource = resource
+        self.wait = wait
+        super().__init__(
+            f"GitHub API rate limit exhausted ({resource}); retry in {max(1, round(wait / 60))} min"
+        )
+
+
+def token_id(authorization):
+    """Short, non-reversible name for the token in an Authorization header."""
+    if not authorization:
+        return "anonymous"
+    return hashlib.sha256(authorization.encode()).hexdigest()[:12]
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def update(authorization, headers, default_resource="core"):
+    """Record the rate-limit headers of a GitHub response (also of error responses)."""
+    if headers is None:
+        return
+    remaining = _int(headers.get("X-RateLimit-Remaining"))
+    retry_after = _int(headers.get("Retry-After"))
+    if remaining is None and retry_after is None:
+        return
+    resource = headers.get("X-RateLimit-Resource") or default_resource
+    tid = token_id(authorization)
+    with _lock:
+        st = _state.setdefault((tid, resource), {
+            "limit": None, "remaining": None, "reset": None, "retry_at": 0.0, "low": False,
+        })
+        if remaining is not None:
+            st["limit"] = _int(headers.get("X-RateLimit-Limit")) or st["limit"]
+            st["remaining"] = remaining
+            st["reset"] = _int(headers.get("X-RateLimit-Reset")) or st["reset"]
+        if retry_after is not None:
+            st["retry_at"] = time.time() + retry_after
+        low = _status(st, time.time())[0] != "ok"
+        crossed, st["low"] = low != st["low"], low
+        snapshot = dict(st)
+    if crossed and low:
+        logger.warning(
+            f"GitHub {resource} quota low for token {tid}: {snapshot['remaining']}/{snapshot['limit']} left, "
+            f"resets at {time.strftime('%H:%M:%S', time.localtime(snapshot['reset'] or 0))}"
+        )
+    elif crossed:
+        logger.info(f"GitHub {resource} quota recovered for token {tid}: {snapshot['remaining']} left")
+
+
+def _status(st, now):
+    if st["retry_at"] > now:
+        return "exhausted", st["retry_at"] - now
+    if st["remaining"] is None or not st["reset"] or st["reset"] <= now:
+        return "ok", 0.0  # unknown, or the window has already reset
+    if st["remaining"] <= 0:
+        return "exhausted", st["reset"] - now
+    if st["remaining"] <= max(_LOW_MIN, (st["limit"] or 0) * _LOW_FRACTION):
+        return "low", st["reset"] - now
+    return "ok", 0.0
+
+
+def peek(authorization, resource="core"):
+    """Return ``(status, seconds until reset)`` like ``reserve`` without claiming anything."""
+    with _lock:
+        st = _state.get((token_id(authorization), resource))
+        return _status(st, time.time()) if st is not None else ("ok", 0.0)
+
+
+def reserve(authorization, resource="core"):
+    """Claim one request from the budget; return ``(status, seconds until it resets)``.
+
+    *status* is ``"ok"``, ``"low"`` or ``"exhausted"``.  Nothing is claimed
+    when the budget is exhausted.
+    """
+    with _lock:
+        st = _state.get((token_id(authorization), resource))
+        if st is None:
+            return "ok", 0.0
+        status, wait = _status(st, time.time())
+        if status != "exhausted" and st["remaining"] is not None:
+            st["remaining"] -= 1
+        return status, wait
+
+
+def wait_or_raise(resource, wait):
+    """Sleep through a short back-off, or raise ``RateLimitError`` for a long one."""
+    if wait > _MAX_WAIT:
+        raise RateLimitError(resource, wait)
+    logger.info(f"GitHub {resource} rate limited, backing off {wait:.1f}s")
+    time.sleep(wait)
+
+
+def is_rate_limited(error):
+    """True if an ``HTTPError`` is GitHub's primary or secondary rate-limit response."""
+    if error.code not in (403, 429) or error.headers is None:
+        return False
+    return error.headers.get("X-RateLimit-Remaining") == "0" or error.headers.get("Retry-After") is not None
+
+
+def retry_wait(headers):
+    """Seconds a rate-limited response asks us to wait (Retry-After, else until reset)."""
+    retry_after = _int(headers.get("Retry-After"))
+    if retry_after is not None:
+        return float(retry_after)
+    reset = _int(headers.get("X-RateLimit-Reset"))
+    return max(0.0, reset - time.time()) if reset else 60.0
+
+
+def stats():
+    """Return the known budget per token and resource."""
+    now = time.time()
+    with _lock:
+        return [
+            {
+                "token": tid,
+                "resource": resource,
+                "limit": st["limit"],
+                "remaining": st["remaining"],
+                "resets_in": max(0, round((st["reset"] or now) - now)),
+                "status": _status(st, now)[0],
+            }
+            for (tid, resource), st in sorted(_state.items())
+        ]
@@ -0,0 +1,163 @@
+"""
+HTML-to-text extraction for the site's own pages.
+
+Built on the standard-library ``html.parser`` so it runs anywhere the API
+does.  Produces the page title, the visible text with whitespace collapsed,
+and the heading outline with character offsets into that text, which is
+what the RAG passage chunker needs to split pages at headings.
+
+The bilingual pages keep their English copy in ``data-en="…"`` attributes
+and render the Chinese as text (the language toggle swaps them in the
+browser).  That attribute copy is collected as its own segment just before
+the element's text, so both languages reach the extracted text.
+
+The document is fed to the parser in chunks, so with a character budget
+(``max_chars``) extraction stops as soon as enough text has been collected
+instead of walking the rest of a large page.
+"""
+
+import re
+from html.parser import HTMLParser
+
+# Elements whose content is never visible prose
+_SKIP_TAGS = frozenset({"script", "style", "noscript", "svg", "canvas", "template", "nav"})
+_HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4}
+# Characters of HTML handed to the parser per feed() call
+_FEED_CHUNK = 16 * 1024
+# Attribute carrying the English copy of a bilingual element
+_COPY_ATTR = "data-en"
+# data-en values may themselves contain markup such as <code>
+_ATTR_TAG_RE = re.compile(r"<[^>]*>")
+
+
+class _PageTextParser(HTMLParser):
+    """Collect visible text, the <title> and headings in one parse."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.parts = []
+        self.length = 0
+        self.headings = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._heading = None  # [level, start offset, words]
+        self._pending_space = False
+        self._copy = None  # words of a data-en attribute not yet emitted
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_copy()
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title" and not self.title:
+            self._in_title = True
+        elif tag in _HEADING_TAGS and not self._skip_depth:
+            self._heading = [_HEADING_TAGS[tag], None, []]
+        # Tags separate words, like the old `<[^>]+>` → " " substitution
+        self._pending_space = True
+        attrs = dict(attrs)
+        copy = attrs.get(_COPY_ATTR)
+        if copy and copy != attrs.get("data-zh") and not self._skip_depth and not self._in_title:
+            self._copy = _ATTR_TAG_RE.sub(" ", copy).split() or None
+
+    def handle_endtag(self, tag):
+        self._flush_copy()
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _HEADING_TAGS and self._heading is not None:
+            level, start, words = self._heading
+            if words:
+                self.headings.append({"level": level, "heading": " ".join(words), "start": start})
+            self._heading = None
+        self._pending_space = True
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        words = data.split()
+        if self._in_title:
+            self.title = " ".join(self.title.split() + words)
+            return
+        if not words:
+            self._pending_space = self._pending_space or bool(data)
+            return
+        # Copy that repeats the element's own text (pages whose default
+        # language is English) is dropped rather than indexed twice
+        if self._copy == words:
+            self._copy = None
+        self._flush_copy()
+        self._pending_space = self._pending_space or data[0].isspace()
+        self._add_words(words)
+        self._pending_space = data[-1].isspace()
+
+    def _flush_copy(self):
+        if self._copy:
+            self._add_words(self._copy)
+            self._pending_space = True
+        self._copy = None
+
+    def _add_words(self, words):
+        if self.length and self._pending_space:
+            self.parts.append(" ")
+            self.length += 1
+        if self._heading is not None:
+            if self._heading[1] is None:
+                self._heading[1] = self.length
+            self._heading[2].extend(words)
+        chunk = " ".join(words)
+        self.parts.append(chunk)
+        self.length += len(chunk)
+
+
+def extract_page(html, max_chars=None):
+    """Extract ``{"title", "text", "headings", "truncated"}`` from an HTML document.
+
+    ``headings`` is a list of ``{"level", "heading", "start"}`` dicts, where
+    ``start`` is the offset of the heading text within ``text``.  With
+    *max_chars*, parsing stops once that much text is collected and ``text``
+    is cut to it; ``truncated`` tells whether anything was left out.
+    """
+    parser = _PageTextParser()
+    truncated = False
+    for pos in range(0, len(html), _FEED_CHUNK):
+        parser.feed(html[pos:pos + _FEED_CHUNK])
+        if max_chars is not None and parser.length >= max_chars:
+            truncated = parser.length > max_chars or pos + _FEED_CHUNK < len(html)
+            break
+    else:
+        parser.close()
+        parser._flush_copy()
+    text = "".join(parser.parts)
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars]
+    return {
+        "title": parser.title,
+        "text": text,
+        "headings": [h for h in parser.headings if h["start"] < len(text)],
+        "truncated": truncated,
+    }
+
+
+def split_sections(page):
+    """Split an extracted page into sections, one per heading.
+
+    Text before the first heading becomes a section with an empty heading.
+    Each section is ``{"heading", "level", "start", "end", "text"}``.
+    """
+    text = page["text"]
+    bounds = [{"heading": "", "level": 0, "start": 0}] + page["headings"]
+    sections = []
+    for i, h in enumerate(bounds):
+        end = bounds[i + 1]["start"] if i + 1 < len(bounds) else len(text)
+        body = text[h["start"]:end].strip()
+        if body:
+            sections.append({
+                "heading": h["heading"],
+                "level": h["level"],
+                "start": h["start"],
+                "end": end,
+                "text": body,
+            })
+    return sections
@@ -0,0 +1,218 @@
+"""
+Pooled keep-alive HTTP client for the agent tools.
+
+``urlopen`` opens a fresh connection for every request — a TCP and TLS
+handshake, plus a CONNECT round trip when ``http_proxy`` is set.  This
+module keeps idle ``http.client`` connections per (scheme, host, port) and
+hands them back out, so an agent round that calls the GitHub API three or
+four times pays for one handshake.
+
+Responses are read in full and gzip/deflate bodies are decoded
+transparently.  Errors look like urllib's: a 4xx/5xx status raises
+``urllib.error.HTTPError`` and connection failures raise ``OSError``
+subclasses, so existing ``except HTTPError`` handlers keep working.
+"""
+
+import base64
+import gzip
+import http.client
+import io
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+from urllib.error import HTTPError
+from urllib.parse import unquote, urljoin, urlsplit
+
+logger = logging.getLogger(__name__)
+
+_PROXY = os.getenv("http_proxy", os.getenv("HTTP_PROXY", ""))
+_NO_PROXY_HOSTS = ("localhost", "127.0.0.1")
+# Idle connections kept per (scheme, host, port)
+_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# Idle connections older than this are closed instead of reused; servers
+# drop keep-alive connections after a while (GitHub: ~60 s)
+_IDLE_TIMEOUT = 30.0
+_MAX_REDIRECTS = 5
+_REDIRECT_CODES = frozenset({301, 302, 303, 307, 308})
+# Methods safe to resend when a pooled connection dies after the request
+# went out; anything else (POST) is only resent if it was never written,
+# unless the caller passes idempotent=True (e.g. read-only GraphQL queries)
+_RETRY_METHODS = frozenset({"GET", "HEAD"})
+
+Response = namedtuple("Response", ["status", "headers", "body", "url"])
+
+_idle = {}  # (scheme, host, port) -> [(connection, last used)]
+_lock = threading.Lock()
+_stats = {"requests": 0, "connections": 0, "reused": 0}
+
+
+def _proxy_for(host):
+    """Return (host, port, Proxy-Authorization header or None) for *host*, or None."""
+    if not _PROXY or host in _NO_PROXY_HOSTS:
+        return None
+    proxy = urlsplit(_PROXY if "://" in _PROXY else f"http://{_PROXY}")
+    auth = None
+    if proxy.username:
+        creds = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+        auth = "Basic " + base64.b64encode(creds.encode()).decode()
+    return proxy.hostname, proxy.port or 80, auth
+
+
+def _connect(scheme, host, port):
+    """Open a new connection to *host*, tunnelling through the proxy if one is set."""
+    proxy = _proxy_for(host)
+    if proxy is None:
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = cls(host, port, timeout=_CONNECT_TIMEOUT)
+    elif scheme == "https":
+        proxy_host, proxy_port, auth = proxy
+        conn = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=_CONNECT_TIMEOUT)
+        conn.set_tunnel(host, port, headers={"Proxy-Authorization": auth} if auth else None)
+    else:
+        # Plain HTTP goes to the proxy with an absolute URL (see _target)
+        conn = http.client.HTTPConnection(proxy[0], proxy[1], timeout=_CONNECT_TIMEOUT)
+    conn.connect()
+    with _lock:
+        _stats["connections"] += 1
+    return conn
+
+
+def _checkout(key):
+    """Return ``(connection, reused)``: an idle pooled connection or a new one."""
+    now = time.monotonic()
+    with _lock:
+        idle = _idle.get(key, [])
+        while idle:
+            conn, last_used = idle.pop()
+            if now - last_used < _IDLE_TIMEOUT:
+                _stats["reused"] += 1
+                return conn, True
+            conn.close()
+    return _connect(*key), False
+
+
+def _checkin(key, conn):
+    """Return *conn* to the pool, or close it if the pool is full."""
+    with _lock:
+        idle = _idle.setdefault(key, [])
+        if len(idle) < _POOL_SIZE:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
+
+
+def close_all():
+    """Close every idle pooled connection."""
+    with _lock:
+        pools = list(_idle.values())
+        _idle.clear()
+    for idle in pools:
+        for conn, _last_used in idle:
+            conn.close()
+
+
+def stats():
+    """Return ``{"requests", "connections", "reused", "idle"}`` counters."""
+    with _lock:
+        return {**_stats, "idle": sum(len(idle) for idle in _idle.values())}
+
+
+def _decode(body, encoding):
+    encoding = (encoding or "").lower()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)  # raw deflate
+    return body
+
+
+def _target(parts):
+    """Request target for *parts*: origin-form, or absolute for plain HTTP via a proxy."""
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    if parts.scheme == "http" and _proxy_for(parts.hostname):
+        return f"http://{parts.netloc}{path}"
+    return path
+
+
+def _send(method, parts, headers, body, timeout, idempotent):
+    """Send one request over a pooled connection; return (status, reason, headers, body)."""
+    scheme = parts.scheme
+    key = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+    proxy = _proxy_for(parts.hostname)
+    if scheme == "http" and proxy and proxy[2]:
+        headers = {**headers, "Proxy-Authorization": proxy[2]}
+
+    while True:
+        conn, reused = _checkout(key)
+        sent = False
+        try:
+            conn.sock.settimeout(timeout)
+            conn.request(method, _target(parts), body=body, headers=headers)
+            sent = True
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            # The server closed the idle connection; retry on a fresh one,
+            # unless a non-idempotent request may already have reached it
+            if reused and (idempotent or not sent):
+                logger.debug(f"Pooled connection to {key[1]} went stale: {e}")
+                continue
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            _checkin(key, conn)
+        return resp.status, resp.reason, resp.headers, _decode(payload, resp.headers.get("Content-Encoding"))
+
+
+def request(method, url, headers=None, body=None, timeout=15, idempotent=None):
+    """Perform an HTTP request over a pooled keep-alive connection.
+
+    Follows redirects (up to ``_MAX_REDIRECTS``), asks for gzip and decodes
+    it, and returns a ``Response(status, headers, body, url)`` for any
+    status below 400; 4xx/5xx raise ``urllib.error.HTTPError`` whose
+    ``read()`` returns the body.  *timeout* is the per-read timeout.
+
+    A request that went out on a pooled connection the server had already
+    closed is resent on a fresh one only if it is *idempotent*, which
+    defaults to GET/HEAD; pass ``idempotent=True`` for a read-only POST.
+    """
+    headers = dict(headers or {})
+    if not any(k.lower() == "accept-encoding" for k in headers):
+        headers["Accept-Encoding"] = "gzip, deflate"
+    with _lock:
+        _stats["requests"] += 1
+
+    for _ in range(_MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        retry = method in _RETRY_METHODS if idempotent is None else idempotent
+        status, reason, resp_headers, payload = _send(method, parts, headers, body, timeout, retry)
+        location = resp_headers.get("Location")
+        if status in _REDIRECT_CODES and location:
+            url = urljoin(url, location)
+            if urlsplit(url).hostname != parts.hostname:
+                # Never forward credentials to another host
+                headers = {k: v for k, v in headers.items() if k.lower() != "authorization"}
+            if status == 303 or (status in (301, 302) and method == "POST"):
+                method, body = "GET", None
+                headers = {k: v for k, v in headers.items() if k.lower() != "content-type"}
+            continue
+        if status >= 400:
+            raise HTTPError(url, status, reason, resp_headers, io.BytesIO(payload))
+        return Response(status, resp_headers, payload, url)
+    raise HTTPError(url, status, "Too many redirects", resp_headers, io.BytesIO(payload))
@@ -2,74 +2,300 @@
 RAG (Retrieval-Augmented Generation) utility module.
 
 Provides lightweight keyword-based retrieval over a local knowledge base
-of publications and GitHub projects.  No external vector-DB or embedding
-model is required — designed for Vercel serverless cold-start constraints.
+of publications, GitHub projects and passages from the site's own pages.
+No external vector-DB or embedding model is required — designed for
+Vercel serverless cold-start constraints.
 """
 
-import yaml
+import hashlib
+import heapq
+import json
+import logging
 import math
+import mmap
 import os
 import re
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
 from collections import Counter
+from datetime import date
+
+import yaml
+
+import html_text
+import snapshot
+from cache_utils import LRUCache
 
-_KB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "research_data.yaml")
-_knowledge_base = None
+logger = logging.getLogger(__name__)
+
+_ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+_KB_PATH = os.path.join(_ROOT_DIR, "data", "research_data.yaml")
+_ARTIFACT_PATH = os.path.join(_ROOT_DIR, "data", "research_data.kbidx")
+_PAGES_DIR = os.path.join(_ROOT_DIR, "pages")
+_SITE_URL = "https://anxiangsir.github.io"
+# Pages with no prose worth retrieving (the chat UI itself, the Mario game)
+_PAGE_EXCLUDE = frozenset({"chat", "mario"})
 _MEDIA_KEYWORDS = "media news 媒体 新闻 报道"
 
 
-def _load_knowledge_base():
-    """Load and cache the knowledge base from research_data.yaml."""
-    global _knowledge_base
-    if _knowledge_base is not None:
-        return _knowledge_base
+def _join(*parts):
+    """Join the non-empty *parts* into one lower-cased field string."""
+    return " ".join(p for p in parts if p).lower()
 
-    with open(_KB_PATH, "r", encoding="utf-8") as fh:
-        data = yaml.safe_load(fh)
 
+def _build_documents(data):
+    """Flatten the parsed research_data.yaml into searchable documents.
+
+    Each document keeps its text split into the BM25F fields (``_fields``)
+    plus the concatenation of all of them (``_searchable``) for plain BM25.
+    """
     docs = []
 
     # Publications section
     for pub in data.get("publications", []):
         doc = {**pub, "type": "publication"}
-        parts = [
-            doc.get("title", ""),
-            doc.get("authors", ""),
-            doc.get("venue", ""),
-            doc.get("summary", ""),
-            doc.get("description", ""),
-            doc.get("name", ""),
-            doc.get("role", ""),
-        ]
-        keywords = doc.get("keywords", [])
-        if keywords:
-            parts.append(" ".join(keywords))
-
         media_links = doc.get("media_links", [])
+        media = ""
         if media_links:
-            parts.append(" ".join(ml.get("name", "") for ml in media_links))
-            parts.append(_MEDIA_KEYWORDS)
-
-        searchable = " ".join(p for p in parts if p).lower()
-        docs.append({**doc, "_searchable": searchable})
+            media = " ".join(ml.get("name", "") for ml in media_links) + " " + _MEDIA_KEYWORDS
+        fields = {
+            "title": _join(doc.get("title", "")),
+            "keywords": _join(" ".join(doc.get("keywords", []) or [])),
+            "venue": _join(doc.get("venue", "")),
+            "summary": _join(doc.get("summary", ""), doc.get("description", "")),
+            "authors": _join(doc.get("authors", "")),
+            "extra": _join(doc.get("name", ""), doc.get("role", ""), media),
+        }
+        docs.append({**doc, "_fields": fields, "_searchable": _join(*fields.values())})
 
     # GitHub projects section
     for proj in data.get("github_projects", []):
         doc = {**proj, "type": "github_project"}
-        parts = [
-            doc.get("name", ""),
-            doc.get("description", ""),
-            doc.get("role", ""),
-            doc.get("url", ""),
+        fields = {
+            "title": _join(doc.get("name", "")),
+            "keywords": _join(" ".join(doc.get("keywords", []) or [])),
+            "venue": "",
+            "summary": _join(doc.get("description", "")),
+            "authors": "",
+            "extra": _join(doc.get("role", ""), doc.get("url", "")),
+        }
+        docs.append({**doc, "_fields": fields, "_searchable": _join(*fields.values())})
+
+    return docs
+
+
+# ── site page passages ───────────────────────────────────────────────
+# Sections shorter than _MIN_PASSAGE_CHARS are merged with the next one;
+# longer runs are cut at sentence ends into passages of ~_PASSAGE_CHARS.
+_PASSAGE_CHARS = 1200
+_MIN_PASSAGE_CHARS = 300
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])")
+
+
+def _chunk_text(text, limit=_PASSAGE_CHARS):
+    """Split *text* into chunks of at most *limit* chars, at sentence ends."""
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(text):
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+        while len(current) > limit:
+            chunks.append(current[:limit])
+            current = current[limit:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _page_url(page_name):
+    return "/index.html" if page_name == "index" else f"/pages/{page_name}.html"
+
+
+def extract_site_page(page_name, html):
+    """Extract one site page as ``{"title", "url", "text", "headings"}``.
+
+    ``text`` is the visible text and ``headings`` its outline with offsets
+    into it (see ``html_text.extract_page``).
+    """
+    page = html_text.extract_page(html)
+    return {
+        "title": page["title"] or page_name,
+        "url": _page_url(page_name),
+        "text": page["text"],
+        "headings": page["headings"],
+    }
+
+
+def _page_passages(page_name, page):
+    """Split one extracted site page into heading-scoped passages."""
+    passages = []
+    headings, texts = [], []
+
+    def flush():
+        for chunk in _chunk_text(" ".join(texts)):
+            passages.append({
+                "page": page_name,
+                "title": page["title"],
+                "heading": headings[0] if headings else "",
+                "headings": list(headings),
+                "url": page["url"],
+                "text": chunk,
+            })
+        headings.clear()
+        texts.clear()
+
+    for section in html_text.split_sections(page):
+        if section["heading"]:
+            headings.append(section["heading"])
+        texts.append(section["text"])
+        if sum(len(t) for t in texts) >= _MIN_PASSAGE_CHARS:
+            flush()
+    if texts:
+        flush()
+    return passages
+
+
+def _build_passages(page_name, html):
+    """Split one site page into heading-scoped passages."""
+    return _page_passages(page_name, extract_site_page(page_name, html))
+
+
+def _passage_documents(pages):
+    """Turn the passages of the extracted *pages* into searchable documents."""
+    docs = []
+    for p in (p for name, page in pages.items() for p in _page_passages(name, page)):
+        fields = {
+            "title": _join(p["title"]),
+            "keywords": _join(*p["headings"]),
+            "venue": "",
+            "summary": _join(p["text"]),
+            "authors": "",
+            "extra": _join(p["page"].replace("_", " ")),
+        }
+        docs.append({**p, "type": "site_page", "_fields": fields, "_searchable": _join(*fields.values())})
+    return docs
+
+
+def _source_paths():
+    """List the knowledge-base source files as ``(relative path, absolute path)``."""
+    paths = [
+        ("data/research_data.yaml", _KB_PATH),
+        ("index.html", os.path.join(_ROOT_DIR, "index.html")),
+    ]
+    if os.path.isdir(_PAGES_DIR):
+        paths += [
+            (f"pages/{fname}", os.path.join(_PAGES_DIR, fname))
+            for fname in sorted(os.listdir(_PAGES_DIR))
+            if fname.endswith(".html") and fname[:-5] not in _PAGE_EXCLUDE
         ]
-        keywords = doc.get("keywords", [])
-        if keywords:
-            parts.append(" ".join(keywords))
+    return paths
+
+
+def _read_sources():
+    """Read every knowledge-base source file as ``{relative path: bytes}``."""
+    sources = {}
+    for rel, path in _source_paths():
+        if rel == "data/research_data.yaml" or os.path.exists(path):
+            with open(path, "rb") as fh:
+                sources[rel] = fh.read()
+    return sources
+
+
+def _plain_data(value, where="research_data.yaml"):
+    """Return the parsed YAML *value* with only JSON types in it.
+
+    The artifact stores the data as JSON, so a snapshot must see the same
+    values whether it parsed the YAML or loaded the artifact.  Dates become
+    ISO strings and mapping keys strings; any other non-JSON value (sets,
+    binary) is rejected rather than stringified.
+    """
+    if isinstance(value, dict):
+        return {str(k): _plain_data(v, f"{where}.{k}") for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain_data(v, f"{where}[{i}]") for i, v in enumerate(value)]
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    raise ValueError(f"{where}: unsupported {type(value).__name__} value {value!r}")
+
+
+def _compile_sources(sources):
+    """Parse *sources* and build (data, pages, docs, index) from scratch."""
+    data = _plain_data(yaml.safe_load(sources["data/research_data.yaml"]))
+    pages = {}
+    for rel, raw in sources.items():
+        if rel.endswith(".html"):
+            page_name = os.path.basename(rel)[:-5]
+            pages[page_name] = extract_site_page(page_name, raw.decode("utf-8", errors="replace"))
+    docs = _build_documents(data) + _passage_documents(pages)
+    return data, pages, docs, _build_index(docs)
+
+
+def _build_snapshot():
+    """Build the knowledge-base snapshot: research_data.yaml plus site pages.
+
+    The compiled artifact (see ``build_artifact``) is used when its content
+    hash matches the sources on disk; otherwise the YAML and pages are
+    parsed and the inverted index is built in the same pass, so ``search()``
+    never has to tokenize the corpus at query time.
+    """
+    sources = _read_sources()
+    loaded = _load_artifact(_ARTIFACT_PATH, _source_digest(sources))
+    if loaded is not None:
+        data, pages, docs, index = loaded
+    else:
+        data, pages, docs, index = _compile_sources(sources)
+    # Snapshots are read-only once published, so everything derived from
+    # the index is built here rather than on first use by a request thread
+    _attach_matrices(docs, index)
+    return {"data": data, "pages": pages, "docs": docs, "index": index, "facets": _build_facets(docs)}
+
+
+def _watched_paths():
+    return [path for _rel, path in _source_paths()] + [_ARTIFACT_PATH]
 
-        searchable = " ".join(p for p in parts if p).lower()
-        docs.append({**doc, "_searchable": searchable})
 
-    _knowledge_base = docs
-    return _knowledge_base
+# Rebuilt in the background when research_data.yaml, a page or the artifact
+# changes on disk; see snapshot.SnapshotManager
+_KB = snapshot.SnapshotManager("knowledge base", _watched_paths, _build_snapshot)
+
+
+def _kb_snapshot():
+    """Return the current knowledge-base snapshot (``.version``, ``.value``).
+
+    Callers that need several parts of the knowledge base (documents and
+    index) must take them from one snapshot so a concurrent reload cannot
+    mix two versions.
+    """
+    return _KB.get()
+
+
+def _load_knowledge_base():
+    """Return the documents of the current knowledge-base snapshot."""
+    return _kb_snapshot().value["docs"]
+
+
+def load_research_data():
+    """Return the parsed research_data.yaml dict (shared with the agent tools)."""
+    return _kb_snapshot().value["data"]
+
+
+def load_site_pages():
+    """Return ``{page name: extracted page}`` for the indexed site pages."""
+    return _kb_snapshot().value["pages"]
+
+
+def _load_index():
+    """Return the inverted index of the current knowledge-base snapshot."""
+    return _kb_snapshot().value["index"]
 
 
 # ── simple tokeniser ─────────────────────────────────────────────────
@@ -81,7 +307,7 @@ _STOP_WORDS = frozenset(
     "what which who whom whose where when how that this these those "
     "i me my we our you your he him his she her it its they them their "
     "的 了 在 是 我 他 她 它 们 这 那 个 和 与 或 但 如果 因为 所以 也 都 就 "
-    "请问 什么 哪个 怎么 如何 可以 能 会 要 想 "
+    "请问 什么 哪个 哪些 怎么 如何 可以 能 会 要 想 介绍 一下 有哪 "
     "".split()
 )
 
@@ -121,143 +347,1193 @@ _ZH_EN_MAP = {
 }
 
 
+# ── Chinese term matching (Aho-Corasick) ──────────────────────────────
+def _build_automaton(keys):
+    """Build an Aho-Corasick automaton over *keys*.
+
+    Returns (goto, fail, out): per-state transition dicts, failure links and
+    the keys that end at each state (including those reached via failure
+    links), so one scan of a string reports every overlapping match.
+    """
+    goto, fail, out = [{}], [0], [[]]
+    for key in keys:
+        state = 0
+        for ch in key:
+            nxt = goto[state].get(ch)
+            if nxt is None:
+                nxt = goto[state][ch] = len(goto)
+                goto.append({})
+                fail.append(0)
+                out.append([])
+            state = nxt
+        out[state].append(key)
+
+    queue = list(goto[0].values())
+    for state in queue:
+        for ch, nxt in goto[state].items():
+            f = fail[state]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] = out[nxt] + out[fail[nxt]]
+            queue.append(nxt)
+    return goto, fail, out
+
+
+_ZH_AUTOMATON = _build_automaton(_ZH_EN_MAP)
+
+
+def _match_zh_terms(text):
+    """Return the dictionary terms occurring in *text*, by first occurrence."""
+    goto, fail, out = _ZH_AUTOMATON
+    found = {}
+    state = 0
+    for pos, ch in enumerate(text):
+        while state and ch not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+        for key in out[state]:
+            found.setdefault(key, pos - len(key) + 1)
+    return sorted(found, key=found.get)
+
+
+# ── CJK bigrams ──────────────────────────────────────────────────────
+# Chinese is written without spaces, so a query run like "新浪财经报道" is a
+# single regex token.  Indexing and querying overlapping bigrams as well
+# lets such runs match text that only shares part of the run.
+_CJK_BIGRAMS = True
+
+
+def _is_cjk(token):
+    """True if *token* (a ``_TOKEN_RE`` match) is a run of CJK characters."""
+    return token[0] >= "\u4e00"
+
+
+# Stop words split a CJK run into fragments ("安翔的论文有哪些" → "安翔",
+# "论文", "些"); longest first so "有哪" wins over a shorter entry
+_CJK_STOP_RE = re.compile(
+    "|".join(sorted((w for w in _STOP_WORDS if _is_cjk(w)), key=len, reverse=True))
+)
+
+# Longer CJK fragments are whole phrases or sentences that would only ever
+# match an identical query run; they are indexed through their bigrams alone.
+_MAX_CJK_WORD = 4
+
+
+def _cjk_terms(run):
+    """Terms of a CJK run: its stop-word-free fragments and their bigrams.
+
+    Fragments of 2.._MAX_CJK_WORD chars are kept whole, fragments of 3+
+    chars also yield overlapping bigrams.  Neither ever spans a stop word,
+    and single characters left between stop words are dropped.
+    """
+    terms = []
+    for frag in _CJK_STOP_RE.split(run):
+        if len(frag) < 2 and frag != run:
+            continue
+        if len(frag) <= _MAX_CJK_WORD:
+            terms.append(frag)
+        if len(frag) >= 3:
+            terms.extend(frag[i:i + 2] for i in range(len(frag) - 1))
+    return terms
+
+
+def _index_tokens(text):
+    """Tokens indexed for *text*: regex tokens, CJK runs as ``_cjk_terms``."""
+    tokens = _TOKEN_RE.findall(text)
+    if not _CJK_BIGRAMS:
+        return tokens
+    indexed = []
+    for t in tokens:
+        if _is_cjk(t):
+            indexed.extend(_cjk_terms(t))
+        else:
+            indexed.append(t)
+    return indexed
+
+
 def _tokenize(text):
     """Return a list of meaningful tokens from *text*.
 
     Chinese tokens are expanded to English equivalents so they can match
-    the primarily English knowledge base.
+    the primarily English knowledge base, and split into bigrams so long
+    unsegmented queries still match Chinese text in the documents.
     """
     raw = _TOKEN_RE.findall(text.lower())
     expanded = []
     for t in raw:
         if t in _STOP_WORDS:
             continue
-        expanded.append(t)
-        # If it's a Chinese token, also add English translations
-        if re.fullmatch(r"[\u4e00-\u9fff]+", t):
-            # Direct lookup first (O(1))
-            if t in _ZH_EN_MAP:
-                expanded.extend(_ZH_EN_MAP[t].split())
-            else:
-                # Substring matching for compound Chinese terms
-                for zh, en in _ZH_EN_MAP.items():
-                    if zh in t:
-                        expanded.extend(en.split())
+        if not _is_cjk(t):
+            expanded.append(t)
+            continue
+        if _CJK_BIGRAMS:
+            expanded.extend(_cjk_terms(t))
+        else:
+            expanded.append(t)
+        # Exact dictionary entries win over the terms they contain
+        # (e.g. "预训练" is "pretraining", not also "training")
+        if t in _ZH_EN_MAP:
+            expanded.extend(_ZH_EN_MAP[t].split())
+        else:
+            for zh in _match_zh_terms(t):
+                expanded.extend(_ZH_EN_MAP[zh].split())
     return expanded
 
 
+# ── inverted index ───────────────────────────────────────────────────
+def _build_index(docs):
+    """Build an inverted index over the ``_searchable`` text of *docs*.
+
+    Returns a dict with:
+      - ``postings``: term -> (doc_ids, tfs), both ``array('I')`` sorted by doc id
+      - ``idf``:      term -> BM25 inverse document frequency
+      - ``max_score``: term -> largest BM25 contribution in its postings
+                      (the MaxScore upper bound used by ``_top_k``)
+      - ``doc_len``:  ``array('I')`` of token counts per document
+      - ``avg_dl``:   average document length
+      - ``n_docs``:   number of documents
+
+    and the BM25F counterparts, computed from the per-field text in
+    ``_fields`` (documents without it are treated as a single field):
+      - ``field_postings``: term -> (doc_ids, ftfs); ``ftfs`` is the
+                           weighted, length-normalized ``array('d')`` term
+                           frequency summed over fields
+      - ``field_max_score``: term -> largest BM25F contribution
+      - ``field_len``:      field -> ``array('I')`` of token counts per doc
+      - ``avg_field_len``:  field -> average field length
+
+    and the per-document ranking prior (see ``_LISTING_PAGE_PRIOR``):
+      - ``prior``:     ``array('d')`` score multiplier per document
+
+    and, when NumPy is installed, the dense vectors (see ``_build_dense``):
+      - ``dense``:     ``array('f')`` of ``n_docs x _DENSE_DIM`` unit vectors
+      - ``dense_idf``: ``array('f')`` of per-bucket IDF weights
+    """
+    term_rows = {}
+    doc_len = array("I")
+    field_len = {f: array("I") for f in _BM25F_FIELDS}
+    field_tfs = []
+    for doc_id, d in enumerate(docs):
+        tokens = _index_tokens(d["_searchable"])
+        doc_len.append(len(tokens))
+        for term, f in Counter(tokens).items():
+            row = term_rows.get(term)
+            if row is None:
+                row = term_rows[term] = (array("I"), array("I"))
+            row[0].append(doc_id)
+            row[1].append(f)
+
+        fields = d.get("_fields") or {"extra": d["_searchable"]}
+        per_field = {}
+        for field in _BM25F_FIELDS:
+            field_tokens = _index_tokens(fields.get(field, ""))
+            field_len[field].append(len(field_tokens))
+            per_field[field] = Counter(field_tokens)
+        field_tfs.append(per_field)
+
+    n_docs = len(docs)
+    avg_dl = sum(doc_len) / max(n_docs, 1)
+    avg_field_len = {f: sum(lens) / max(n_docs, 1) for f, lens in field_len.items()}
+    idf = {
+        term: math.log((n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5) + 1.0)
+        for term, (doc_ids, _tfs) in term_rows.items()
+    }
+    max_score = {
+        term: max(
+            _bm25_term_score(f, doc_len[doc_id], avg_dl, idf[term])
+            for doc_id, f in zip(doc_ids, tfs)
+        )
+        for term, (doc_ids, tfs) in term_rows.items()
+    }
+
+    # Field normalization depends only on the document, so it is folded
+    # into the stored frequency and BM25F costs nothing extra per query.
+    field_postings = {}
+    for term, (doc_ids, _tfs) in term_rows.items():
+        ftfs = array("d")
+        for doc_id in doc_ids:
+            ftf = 0.0
+            for field, (weight, b) in _BM25F_FIELDS.items():
+                f = field_tfs[doc_id][field].get(term, 0)
+                if f:
+                    norm = 1 - b + b * field_len[field][doc_id] / max(avg_field_len[field], 1)
+                    ftf += weight * f / norm
+            ftfs.append(ftf)
+        field_postings[term] = (doc_ids, ftfs)
+    field_max_score = {
+        term: max(_bm25f_term_score(ftf, idf[term]) for ftf in ftfs)
+        for term, (_doc_ids, ftfs) in field_postings.items()
+    }
+
+    return {
+        "postings": term_rows,
+        "idf": idf,
+        "max_score": max_score,
+        "doc_len": doc_len,
+        "avg_dl": avg_dl,
+        "n_docs": n_docs,
+        "field_postings": field_postings,
+        "field_max_score": field_max_score,
+        "field_len": field_len,
+        "avg_field_len": avg_field_len,
+        "prior": array("d", (_doc_prior(d) for d in docs)),
+        **_build_dense(docs),
+    }
+
+
+# ── compiled artifact ────────────────────────────────────────────────
+# Layout: header | JSON meta | 8-byte aligned arrays.  The numeric arrays
+# (postings, doc lengths, IDF) are exposed as memoryviews over an mmap, so
+# loading is zero-copy.  The page text and the vocabulary are UTF-8 blobs
+# in the same section, decoded with one bytes.decode() each; the JSON meta
+# block keeps the YAML data, page titles/outlines and the array layout
+# (~60 KB).
+_ARTIFACT_MAGIC = b"KBIX"
+_ARTIFACT_VERSION = 9
+_ARTIFACT_HEADER = struct.Struct("<4sI32sQ")
+
+
+def _source_digest(sources):
+    """Content hash of all source files, salted with the artifact version."""
+    h = hashlib.sha256(f"v{_ARTIFACT_VERSION}".encode())
+    for rel in sorted(sources):
+        h.update(rel.encode("utf-8") + b"\0")
+        h.update(hashlib.sha256(sources[rel]).digest())
+    return h.digest()
+
+
+def build_artifact(out_path=None):
+    """Compile the knowledge-base sources into the binary artifact at *out_path*."""
+    out_path = out_path or _ARTIFACT_PATH
+    sources = _read_sources()
+    data, pages, _docs, index = _compile_sources(sources)
+
+    terms = list(index["postings"])
+    post_ptr = array("I", [0])
+    post_doc = array("I")
+    post_tf = array("I")
+    post_ftf = array("d")
+    for term in terms:
+        doc_ids, tfs = index["postings"][term]
+        post_doc.extend(doc_ids)
+        post_tf.extend(tfs)
+        # BM25F postings cover the same documents, so they share post_doc
+        post_ftf.extend(index["field_postings"][term][1])
+        post_ptr.append(len(post_doc))
+    arrays = {
+        "doc_len": index["doc_len"],
+        "post_ptr": post_ptr,
+        "post_doc": post_doc,
+        "post_tf": post_tf,
+        "post_ftf": post_ftf,
+        "idf": array("d", (index["idf"][t] for t in terms)),
+        "max_score": array("d", (index["max_score"][t] for t in terms)),
+        "field_max_score": array("d", (index["field_max_score"][t] for t in terms)),
+        "prior": index["prior"],
+    }
+    for field, lens in index["field_len"].items():
+        arrays[f"field_len.{field}"] = lens
+    if "dense" in index:
+        arrays["dense"] = index["dense"]
+        arrays["dense_idf"] = index["dense_idf"]
+    # Tokens never contain NUL, and page text is sliced by byte offsets
+    arrays["terms"] = array("B", "\0".join(terms).encode("utf-8"))
+    page_ptr = array("I", [0])
+    page_text = array("B")
+    for page in pages.values():
+        page_text.frombytes(page["text"].encode("utf-8"))
+        page_ptr.append(len(page_text))
+    arrays["page_ptr"] = page_ptr
+    arrays["page_text"] = page_text
+
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        nbytes = len(arr) * arr.itemsize
+        layout[name] = [offset, nbytes, arr.typecode]
+        offset += nbytes + (-nbytes % 8)
+    meta = json.dumps({
+        "byteorder": sys.byteorder,
+        "data": data,
+        "pages": {name: {k: v for k, v in page.items() if k != "text"} for name, page in pages.items()},
+        "avg_dl": index["avg_dl"],
+        "avg_field_len": index["avg_field_len"],
+        "arrays": layout,
+    }, ensure_ascii=False).encode("utf-8")
+    meta += b" " * (-(_ARTIFACT_HEADER.size + len(meta)) % 8)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(_ARTIFACT_HEADER.pack(
+            _ARTIFACT_MAGIC, _ARTIFACT_VERSION, _source_digest(sources), len(meta)
+        ))
+        fh.write(meta)
+        for arr in arrays.values():
+            payload = arr.tobytes()
+            fh.write(payload + b"\0" * (-len(payload) % 8))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _load_artifact(path, digest):
+    """Map the artifact at *path*; return (data, pages, docs, index) or None if stale."""
+    try:
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        logger.info(f"No RAG artifact at {path}, compiling from source files")
+        return None
+
+    try:
+        buf = memoryview(mm)
+        magic, version, source_digest, meta_len = _ARTIFACT_HEADER.unpack_from(buf)
+        if (magic, version, source_digest) != (_ARTIFACT_MAGIC, _ARTIFACT_VERSION, digest):
+            logger.warning(
+                f"RAG artifact {path} is stale, compiling from source files "
+                "(run scripts/build_kb_index.py to refresh it)"
+            )
+            return None
+        base = _ARTIFACT_HEADER.size
+        meta = json.loads(bytes(buf[base:base + meta_len]))
+        if meta["byteorder"] != sys.byteorder:
+            return None
+
+        base += meta_len
+        arrays = {
+            name: buf[base + off:base + off + nbytes].cast(typecode)
+            for name, (off, nbytes, typecode) in meta["arrays"].items()
+        }
+    except Exception as e:
+        logger.warning(f"Failed to read RAG artifact: {e}")
+        return None
+
+    pages = meta["pages"]
+    page_ptr, page_text = arrays["page_ptr"], arrays["page_text"]
+    for i, page in enumerate(pages.values()):
+        page["text"] = bytes(page_text[page_ptr[i]:page_ptr[i + 1]]).decode("utf-8")
+    terms = bytes(arrays["terms"]).decode("utf-8").split("\0") if len(arrays["terms"]) else []
+
+    # Documents are cheap string joins and chunking over the stored data and
+    # page text; the expensive parts (YAML/HTML parsing, tokenizing,
+    # postings) are not.
+    docs = _build_documents(meta["data"]) + _passage_documents(pages)
+    ptr, post_doc = arrays["post_ptr"], arrays["post_doc"]
+    post_tf, post_ftf = arrays["post_tf"], arrays["post_ftf"]
+    postings = {}
+    field_postings = {}
+    for i, term in enumerate(terms):
+        start, end = ptr[i], ptr[i + 1]
+        doc_ids = post_doc[start:end]
+        postings[term] = (doc_ids, post_tf[start:end])
+        field_postings[term] = (doc_ids, post_ftf[start:end])
+    index = {
+        "postings": postings,
+        "idf": dict(zip(terms, arrays["idf"])),
+        "max_score": dict(zip(terms, arrays["max_score"])),
+        "doc_len": arrays["doc_len"],
+        "avg_dl": meta["avg_dl"],
+        "n_docs": len(docs),
+        "field_postings": field_postings,
+        "field_max_score": dict(zip(terms, arrays["field_max_score"])),
+        "field_len": {f: arrays[f"field_len.{f}"] for f in meta["avg_field_len"]},
+        "avg_field_len": meta["avg_field_len"],
+        "prior": arrays["prior"],
+    }
+    if "dense" in arrays:
+        index["dense"] = arrays["dense"]
+        index["dense_idf"] = arrays["dense_idf"]
+    return meta["data"], pages, docs, index
+
+
 # ── BM25-lite scoring ────────────────────────────────────────────────
 _K1 = 1.2
 _B = 0.75
 
 
-def _score_bm25(query_tokens, doc_searchable, avg_dl, n_docs, df_map):
-    """Compute a simplified BM25 score for one document."""
-    doc_tokens = _TOKEN_RE.findall(doc_searchable)
-    dl = len(doc_tokens)
-    tf = Counter(doc_tokens)
-    score = 0.0
-    for qt in query_tokens:
-        f = tf.get(qt, 0)
-        if f == 0:
+def _bm25_term_score(f, dl, avg_dl, idf):
+    """BM25 contribution of one query term with frequency *f* in a doc of length *dl*."""
+    numerator = f * (_K1 + 1)
+    denominator = f + _K1 * (1 - _B + _B * dl / max(avg_dl, 1))
+    return idf * numerator / denominator
+
+
+# ── BM25F (field-weighted) scoring ───────────────────────────────────
+# field -> (weight, b).  Title hits count most; short fields get a weaker
+# length normalization so a long summary cannot dilute a title match.
+_BM25F_FIELDS = {
+    "title": (3.0, 0.5),
+    "keywords": (2.0, 0.5),
+    "venue": (1.5, 0.3),
+    "summary": (1.0, 0.75),
+    "authors": (1.0, 0.75),
+    "extra": (1.0, 0.75),
+}
+_DEFAULT_SCORING = "bm25f"
+
+# Score multiplier for passages of the listing pages.  The homepage and the
+# blog index name every paper, project and post, so their passages match
+# almost any query about one of them and would crowd out the page or paper
+# itself.  Must stay <= 1: the MaxScore bounds in _top_k ignore the prior.
+_LISTING_PAGES = frozenset({"index", "blog"})
+_LISTING_PAGE_PRIOR = 0.25
+
+
+def _doc_prior(doc):
+    """Ranking prior of *doc*: ``_LISTING_PAGE_PRIOR`` for listing-page passages, else 1."""
+    if doc.get("type") == "site_page" and doc.get("page") in _LISTING_PAGES:
+        return _LISTING_PAGE_PRIOR
+    return 1.0
+
+
+def _bm25f_term_score(ftf, idf):
+    """BM25F contribution of one query term with field-weighted frequency *ftf*."""
+    return idf * ftf * (_K1 + 1) / (ftf + _K1)
+
+
+# ── top-k retrieval (MaxScore) ───────────────────────────────────────
+# The pure-Python scorer, used when NumPy is not installed (NumPy stays an
+# optional dependency of the API).  With NumPy, _rank uses _top_k_batch,
+# which is faster at this corpus size despite scoring every document;
+# test_batch_matches_maxscore keeps the two in agreement.
+# Slack for comparing upper bounds against exact scores, so floating-point
+# rounding in the bound sums can never prune a document that qualifies.
+_UB_SLACK = 1e-9
+
+
+def _top_k(docs, index, query_tokens, top_k, min_score, scoring=_DEFAULT_SCORING, allowed=None):
+    """Return the *top_k* of *docs* scoring at least *min_score* under *index*.
+
+    Document-at-a-time MaxScore over the query postings: terms are ordered
+    by upper bound, and the low-bound prefix whose bounds sum below the
+    current entry threshold becomes "non-essential" — documents that only
+    appear there cannot reach the top k and are never visited.  Candidates
+    are kept in a bounded heap; result dicts are built for the winners only.
+
+    *scoring* is ``"bm25f"`` (field-weighted) or ``"bm25"`` (flat text).
+    *allowed*, if given, is a facet bitmap (bit i set = doc i may match).
+    """
+    if top_k <= 0:
+        return []
+    if scoring == "bm25f":
+        postings, max_score = index["field_postings"], index["field_max_score"]
+
+        def term_score(ftf, _doc_id, idf):
+            return _bm25f_term_score(ftf, idf)
+    elif scoring == "bm25":
+        postings, max_score = index["postings"], index["max_score"]
+        doc_len, avg_dl = index["doc_len"], index["avg_dl"]
+
+        def term_score(f, doc_id, idf):
+            return _bm25_term_score(f, doc_len[doc_id], avg_dl, idf)
+    else:
+        raise ValueError(f"Unknown scoring mode: {scoring}")
+
+    prior = index["prior"]
+    # Repeated query tokens count once per occurrence, as in plain BM25
+    qtf = Counter(t for t in query_tokens if t in postings)
+    if not qtf:
+        return []
+    terms = sorted(qtf, key=lambda t: qtf[t] * max_score[t])
+    lists = [postings[t] for t in terms]
+    weights = [(qtf[t], index["idf"][t]) for t in terms]
+    bound_prefix = []
+    total = 0.0
+    for t in terms:
+        total += qtf[t] * max_score[t] + _UB_SLACK
+        bound_prefix.append(total)
+
+    # heap of (score, -doc_id): the root is the weakest entry, and among
+    # equal scores the later document, which loses ties.
+    heap = []
+
+    def can_enter(bound):
+        if len(heap) < top_k:
+            return bound >= min_score
+        return bound > heap[0][0]
+
+    def first_essential():
+        i = 0
+        while i < len(terms) and not can_enter(bound_prefix[i]):
+            i += 1
+        return i
+
+    pos = [0] * len(terms)
+    essential = first_essential()
+    while essential < len(terms):
+        # Next candidate: smallest doc id under the essential cursors
+        candidate = None
+        for i in range(essential, len(terms)):
+            doc_ids = lists[i][0]
+            if pos[i] < len(doc_ids) and (candidate is None or doc_ids[pos[i]] < candidate):
+                candidate = doc_ids[pos[i]]
+        if candidate is None:
+            break
+        if allowed is not None and not (allowed >> candidate) & 1:
+            for i in range(essential, len(terms)):
+                doc_ids = lists[i][0]
+                if pos[i] < len(doc_ids) and doc_ids[pos[i]] == candidate:
+                    pos[i] += 1
+            continue
+
+        contributions = [0.0] * len(terms)
+        for i in range(essential, len(terms)):
+            doc_ids, tfs = lists[i]
+            if pos[i] < len(doc_ids) and doc_ids[pos[i]] == candidate:
+                qf, idf = weights[i]
+                contributions[i] = qf * term_score(tfs[pos[i]], candidate, idf)
+                pos[i] += 1
+
+        # Non-essential terms, largest bound first, until the doc is hopeless
+        partial = sum(contributions)
+        for i in range(essential - 1, -1, -1):
+            if not can_enter(partial + bound_prefix[i]):
+                partial = None
+                break
+            doc_ids, tfs = lists[i]
+            j = bisect_left(doc_ids, candidate, pos[i])
+            pos[i] = j
+            if j < len(doc_ids) and doc_ids[j] == candidate:
+                qf, idf = weights[i]
+                contributions[i] = qf * term_score(tfs[j], candidate, idf)
+                partial += contributions[i]
+        if partial is None:
+            continue
+
+        score = math.fsum(contributions) * prior[candidate]
+        if not can_enter(score):
+            continue
+        if len(heap) < top_k:
+            heapq.heappush(heap, (score, -candidate))
+        else:
+            heapq.heapreplace(heap, (score, -candidate))
+        essential = first_essential()
+
+    winners = sorted(heap, key=lambda e: (-e[0], -e[1]))
+    return [{**docs[-neg_id], "_score": score, "_doc_id": -neg_id} for score, neg_id in winners]
+
+
+# ── batch scoring (NumPy) ────────────────────────────────────────────
+# The postings double as a CSR term-document matrix: row = term, column =
+# doc, value = the term's BM25/BM25F contribution for a query frequency of
+# one.  A batch of queries is a sparse query-term matrix, and scoring it is
+# one sparse-dense product, done with np.bincount over the gathered rows.
+# NumPy is optional: without it search() falls back to _top_k.
+
+# Upper bound on the dense (queries x docs) score block scored at once
+_BATCH_CELLS = 1 << 22
+
+
+def _numpy():
+    """Return the numpy module, or None when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _attach_matrices(docs, index):
+    """Build the NumPy matrices of *index* into ``index["_matrices"]`` (no-op without NumPy).
+
+    Done before a snapshot is published; indexes without them (tests, the
+    benchmark's synthetic corpora) get the matrices rebuilt on every call.
+    """
+    if _numpy() is None:
+        return
+    matrices = {scoring: _build_term_matrix(index, scoring) for scoring in ("bm25f", "bm25")}
+    if "dense" in index:
+        matrices["dense"] = _build_dense_matrix(docs, index)
+    index["_matrices"] = matrices
+
+
+def _term_matrix(index, scoring):
+    """Return the CSR matrix ``(row_of, indptr, indices, data)`` for *scoring*."""
+    matrix = index.get("_matrices", {}).get(scoring)
+    return matrix if matrix is not None else _build_term_matrix(index, scoring)
+
+
+def _build_term_matrix(index, scoring):
+    """CSR matrix of *index*: one row per term, BM25/BM25F contributions as values."""
+    np = _numpy()
+    if scoring == "bm25f":
+        postings = index["field_postings"]
+    elif scoring == "bm25":
+        postings = index["postings"]
+    else:
+        raise ValueError(f"Unknown scoring mode: {scoring}")
+    terms = list(postings)
+    lengths = np.fromiter((len(postings[t][0]) for t in terms), dtype=np.int64, count=len(terms))
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate([np.asarray(postings[t][0], dtype=np.int64) for t in terms] or [[]])
+    freqs = np.concatenate([np.asarray(postings[t][1], dtype=np.float64) for t in terms] or [[]])
+    idf = np.repeat(np.fromiter((index["idf"][t] for t in terms), dtype=np.float64), lengths)
+    if scoring == "bm25f":
+        data = idf * freqs * (_K1 + 1) / (freqs + _K1)
+    else:
+        dl = np.asarray(index["doc_len"], dtype=np.float64)[indices.astype(np.intp)]
+        norm = 1 - _B + _B * dl / max(index["avg_dl"], 1)
+        data = idf * freqs * (_K1 + 1) / (freqs + _K1 * norm)
+    data *= np.asarray(index["prior"], dtype=np.float64)[indices.astype(np.intp)]
+
+    return {t: i for i, t in enumerate(terms)}, indptr, indices, data
+
+
+def _score_batch(np, matrix, queries, n_docs):
+    """Dense ``(len(queries), n_docs)`` score block for query-term Counters."""
+    row_of, indptr, indices, data = matrix
+    rows, qids, qtfs = [], [], []
+    for qi, qtf in enumerate(queries):
+        for term, count in qtf.items():
+            rows.append(row_of[term])
+            qids.append(qi)
+            qtfs.append(count)
+    scores = np.zeros(len(queries) * n_docs)
+    if rows:
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = indptr[rows]
+        lengths = indptr[rows + 1] - starts
+        # Flat positions of every gathered posting: each row's start repeated
+        # over its length, plus the offset within the row
+        offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        cells = np.repeat(np.asarray(qids, dtype=np.int64) * n_docs, lengths) + indices[offsets]
+        weights = data[offsets] * np.repeat(np.asarray(qtfs, dtype=np.float64), lengths)
+        scores = np.bincount(cells, weights=weights, minlength=len(queries) * n_docs)
+    return scores.reshape(len(queries), n_docs)
+
+
+def _top_k_batch(docs, index, queries_tokens, top_k, min_score, scoring=_DEFAULT_SCORING, allowed=None):
+    """``_top_k`` for many queries at once via the CSR term matrix (needs NumPy)."""
+    np = _numpy()
+    matrix = _term_matrix(index, scoring)
+    row_of = matrix[0]
+    queries = [Counter(t for t in tokens if t in row_of) for tokens in queries_tokens]
+    n_docs = len(docs)
+    if top_k <= 0 or not n_docs:
+        return [[] for _ in queries]
+    mask = _bitmap_mask(np, allowed, n_docs)
+
+    results = []
+    chunk = max(1, _BATCH_CELLS // n_docs)
+    for lo in range(0, len(queries), chunk):
+        block = _score_batch(np, matrix, queries[lo:lo + chunk], n_docs)
+        for row in block:
+            # Matched documents always score > 0; min_score may be 0
+            candidates = np.flatnonzero((row > 0) & (row >= min_score) & mask)
+            cand_scores = row[candidates]
+            if len(candidates) > top_k:
+                # Keep everything tied with the k-th score, then break ties by doc id
+                kth = np.partition(cand_scores, len(candidates) - top_k)[len(candidates) - top_k]
+                keep = cand_scores >= kth
+                candidates, cand_scores = candidates[keep], cand_scores[keep]
+            order = np.lexsort((candidates, -cand_scores))[:top_k]
+            results.append([
+                {**docs[int(candidates[i])], "_score": float(cand_scores[i]), "_doc_id": int(candidates[i])}
+                for i in order
+            ])
+    return results
+
+
+def _rank(docs, index, queries_tokens, top_k, min_score, scoring, allowed=None):
+    """Top-k results per query: batched on the term matrix, else MaxScore."""
+    if _numpy() is not None:
+        return _top_k_batch(docs, index, queries_tokens, top_k, min_score, scoring, allowed)
+    return [_top_k(docs, index, tokens, top_k, min_score, scoring, allowed) for tokens in queries_tokens]
+
+
+def _bitmap_mask(np, allowed, n_docs):
+    """Boolean doc mask for a facet bitmap (``None`` allows every doc)."""
+    if allowed is None:
+        return np.ones(n_docs, dtype=bool)
+    raw = np.frombuffer(allowed.to_bytes((n_docs + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder="little")[:n_docs].astype(bool)
+
+
+# Extra candidates fetched so that dropping repeat passages of one page
+# still leaves top_k results, and so that the window still holds the
+# publications a Chinese query is about once English page copy
+# (``data-en``) matches the expanded "paper"/"model" terms too
+_PASSAGE_OVERFETCH = 4
+
+
+def _order_hits(results):
+    """Keep the best passage of each site page; publications and projects first.
+
+    Site pages are written in Chinese prose that retells the structured data,
+    so a Chinese query matches them on many more terms than the English
+    publication it is about.  Among the candidates a query fetched,
+    publications and projects therefore take the top slots and site-page
+    passages fill the rest, each group in rank order.
+    """
+    seen_pages = set()
+    structured, passages = [], []
+    for r in results:
+        if r.get("type") != "site_page":
+            structured.append(r)
+        elif r["page"] not in seen_pages:
+            seen_pages.add(r["page"])
+            passages.append(r)
+    return structured + passages
+
+
+# ── dense retrieval (hashed character n-grams) ───────────────────────
+# BM25 needs shared words, so paraphrases ("face training at scale" vs
+# "Partial FC") miss.  Each document also gets a dense vector: character
+# trigrams (plus CJK bigrams) hashed into _DENSE_DIM buckets, weighted by
+# sublinear tf x bucket IDF and L2-normalized.  No model, no GPU, no
+# network; the vectors are computed at build time and stored as float32 in
+# the artifact.  Dense and BM25 rankings are merged by reciprocal rank
+# fusion.  Needs NumPy; without it retrieval is lexical only.
+_DENSE_DIM = 512
+# Cosine below this is noise: unrelated small talk peaks around 0.2
+_DENSE_MIN_SIM = 0.25
+# A document only the dense side found (no BM25 hit above min_score) needs
+# a clearer match: misspellings of a title score ~0.3, chatter ~0.25
+_DENSE_ONLY_MIN_SIM = 0.28
+_RRF_K = 60
+# Dense ranks are the weaker signal: they break ties and rescue paraphrases
+# rather than override a clear keyword match
+_DENSE_RRF_WEIGHT = 0.5
+# Candidates taken from each ranking before fusion
+_RRF_DEPTH = 20
+_DEFAULT_HYBRID = True
+_DENSE_WORD_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+")
+_CJK_RUN_RE = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def _dense_text(text):
+    """Normalized form of *text* the dense n-grams are taken from."""
+    return " ".join(_DENSE_WORD_RE.findall(text.lower()))
+
+
+def _dense_grams(text):
+    """Character trigrams over the normalized words of *text*, plus CJK bigrams."""
+    text = " " + _dense_text(text) + " "
+    grams = [text[i:i + 3] for i in range(len(text) - 2)]
+    for run in _CJK_RUN_RE.findall(text):
+        grams.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def _dense_counts(np, texts):
+    """Hashed n-gram counts, one ``_DENSE_DIM`` row per text."""
+    counts = np.zeros((len(texts), _DENSE_DIM), dtype=np.float32)
+    for row, text in zip(counts, texts):
+        # crc32, not hash(): the buckets must be stable across processes
+        buckets = [zlib.crc32(g.encode("utf-8")) % _DENSE_DIM for g in _dense_grams(text)]
+        np.add.at(row, buckets, 1)
+    return counts
+
+
+def _dense_vectors(np, counts, idf):
+    """Sublinear tf x IDF weighting with L2-normalized rows."""
+    weights = np.where(counts > 0, 1 + np.log(np.maximum(counts, 1)), 0) * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    return (weights / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _build_dense(docs):
+    """Return ``{"dense", "dense_idf"}`` arrays for *docs*, or {} without NumPy."""
+    np = _numpy()
+    if np is None or not docs:
+        return {}
+    counts = _dense_counts(np, [d["_searchable"] for d in docs])
+    df = (counts > 0).sum(axis=0)
+    idf = (np.log((len(docs) + 1) / (df + 1)) + 1).astype(np.float32)
+    dense, dense_idf = array("f"), array("f")
+    dense.frombytes(_dense_vectors(np, counts, idf).tobytes())
+    dense_idf.frombytes(idf.tobytes())
+    return {"dense": dense, "dense_idf": dense_idf}
+
+
+def _build_dense_matrix(docs, index):
+    """``(doc vectors, bucket idf)`` of *index* as NumPy arrays."""
+    np = _numpy()
+    return (
+        np.asarray(index["dense"], dtype=np.float32).reshape(len(docs), _DENSE_DIM),
+        np.asarray(index["dense_idf"], dtype=np.float32),
+    )
+
+
+def _dense_rank(docs, index, queries, depth, allowed=None):
+    """Top *depth* ``(doc_id, cosine)`` pairs per query text, above _DENSE_MIN_SIM."""
+    np = _numpy()
+    dense, idf = index.get("_matrices", {}).get("dense") or _build_dense_matrix(docs, index)
+    sims = _dense_vectors(np, _dense_counts(np, queries), idf) @ dense.T
+    sims *= np.asarray(index["prior"], dtype=np.float32)
+    if allowed is not None:
+        sims[:, ~_bitmap_mask(np, allowed, len(docs))] = -1.0
+    ranked = []
+    for row in sims:
+        top = np.argsort(-row, kind="stable")[:depth]
+        ranked.append([(int(i), float(row[i])) for i in top if row[i] >= _DENSE_MIN_SIM])
+    return ranked
+
+
+def _fuse(docs, lexical, dense, limit):
+    """Reciprocal rank fusion of a BM25 result list and a dense ranking.
+
+    ``_score`` of a fused result is its RRF score.  Dense-only documents
+    below ``_DENSE_ONLY_MIN_SIM`` are dropped.
+    """
+    fused = {}
+    for rank, r in enumerate(lexical):
+        fused[r["_doc_id"]] = 1 / (_RRF_K + rank + 1)
+    for rank, (doc_id, sim) in enumerate(dense):
+        if doc_id not in fused and sim < _DENSE_ONLY_MIN_SIM:
             continue
-        df = df_map.get(qt, 0)
-        idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
-        numerator = f * (_K1 + 1)
-        denominator = f + _K1 * (1 - _B + _B * dl / max(avg_dl, 1))
-        score += idf * numerator / denominator
-    return score
+        fused[doc_id] = fused.get(doc_id, 0.0) + _DENSE_RRF_WEIGHT / (_RRF_K + rank + 1)
+    order = sorted(fused, key=lambda d: (-fused[d], d))[:limit]
+    return [{**docs[d], "_score": fused[d], "_doc_id": d} for d in order]
+
+
+def _retrieve(docs, index, queries_tokens, texts, limit, min_score, scoring, hybrid, allowed=None):
+    """Up to *limit* ranked candidates per query: BM25, optionally fused with dense.
+
+    *queries_tokens* are the ``_tokenize`` lists for BM25 and *texts* the
+    query texts for the dense side.  *allowed* restricts both rankings to a
+    facet bitmap of doc ids.
+    """
+    ranked = _rank(
+        docs, index, queries_tokens, max(limit, _RRF_DEPTH) if hybrid else limit,
+        min_score, scoring, allowed,
+    )
+    if not hybrid:
+        return ranked
+    dense = _dense_rank(docs, index, texts, _RRF_DEPTH, allowed)
+    return [_fuse(docs, lex[:_RRF_DEPTH], den, limit) for lex, den in zip(ranked, dense)]
+
+
+# ── result caches ────────────────────────────────────────────────────
+# The same questions arrive over and over.  search() results are keyed on
+# the snapshot version plus the sorted expanded query tokens (and, for
+# hybrid search, the normalized query text the dense side embeds), so case
+# and punctuation variants share an entry, and a reload makes every older
+# entry unreachable (they age out of the LRU).
+_SEARCH_CACHE = LRUCache(256)
+_CONTEXT_CACHE = LRUCache(128)
+
+
+def cache_stats():
+    """Hit/miss counters of the retrieval caches, for diagnostics."""
+    return {"search": _SEARCH_CACHE.stats(), "context": _CONTEXT_CACHE.stats()}
 
 
 # ── public API ────────────────────────────────────────────────────────
-def search(query, top_k=3, min_score=0.5):
+def search(query, top_k=3, min_score=0.5, scoring=_DEFAULT_SCORING, hybrid=_DEFAULT_HYBRID):
     """Return the *top_k* most relevant knowledge-base documents for *query*.
 
     Each result is a dict with the original document fields plus a
-    ``_score`` key.
+    ``_score`` key.  With NumPy installed (as deployed) BM25 scores are
+    accumulated into a dense per-document vector (``_top_k_batch``) and the
+    dense side is a matrix-vector product over every document, so both
+    grow linearly with the corpus (~0.1 ms each at this site's ~450
+    documents).  Without NumPy the MaxScore ``_top_k`` runs instead.
+    Ties keep corpus order.  *scoring* selects field-weighted ``"bm25f"``
+    (default) or flat ``"bm25"``.  Site pages are indexed as passages; at
+    most one passage per page is returned, after any matching publications
+    and projects among the candidates (see ``_order_hits``).
+
+    With *hybrid* (and NumPy installed) the BM25 ranking is fused with the
+    dense n-gram ranking, and ``_score`` is the reciprocal-rank-fusion
+    score; *min_score* applies to the BM25 side, and documents only the
+    dense side found need a cosine of at least ``_DENSE_ONLY_MIN_SIM``.
+
+    Results are cached, so the returned dicts are shared between calls and
+    must not be mutated.
+    """
+    return search_many([query], top_k, min_score, scoring, hybrid)[0]
+
+
+def search_many(queries, top_k=3, min_score=0.5, scoring=_DEFAULT_SCORING, hybrid=_DEFAULT_HYBRID):
+    """Run ``search()`` for every query in *queries*; returns a list of result lists.
+
+    Uncached queries are scored together as one sparse matrix product, which
+    is much cheaper than a Python scoring loop per query — use it for
+    offline evaluation, cache warming and multi-query expansion.
     """
-    docs = _load_knowledge_base()
+    snap = _kb_snapshot()
+    docs, index = snap.value["docs"], snap.value["index"]
+    results = [[] for _ in queries]
     if not docs:
+        return results
+    hybrid = hybrid and "dense" in index and _numpy() is not None
+
+    pending = {}
+    for i, query in enumerate(queries):
+        query_tokens = _tokenize(query)
+        if not query_tokens:
+            continue
+        text = _dense_text(query) if hybrid else None
+        key = (snap.version, tuple(sorted(query_tokens)), text, top_k, min_score, scoring, hybrid)
+        cached = _SEARCH_CACHE.get(key)
+        if cached is not None:
+            results[i] = list(cached)
+        else:
+            pending.setdefault(key, (query_tokens, text, []))[2].append(i)
+    if not pending:
+        return results
+
+    ranked = _retrieve(
+        docs, index, [tokens for tokens, _, _ in pending.values()], [text for _, text, _ in pending.values()],
+        top_k * _PASSAGE_OVERFETCH, min_score, scoring, hybrid,
+    )
+    for (key, (_tokens, _text, positions)), candidates in zip(pending.items(), ranked):
+        hits = _order_hits(candidates)[:top_k]
+        # _doc_key identifies the document across reloads for the context cache
+        for r in hits:
+            r["_doc_key"] = (snap.version, r.pop("_doc_id"))
+        _SEARCH_CACHE.put(key, tuple(hits))
+        for i in positions:
+            results[i] = list(hits)
+    return results
+
+
+# ── publication facets ───────────────────────────────────────────────
+# Facets are int bitmaps over doc ids (bit i set = doc i has the facet), so
+# combining filters is a few integer ANDs.  They are built with each
+# knowledge-base snapshot.
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_VENUE_NAME_RE = re.compile(r"[,(]|\b(?:19|20)\d{2}\b")
+
+
+def _pub_year(pub):
+    """Publication year: the ``year`` field, else the first year in ``venue``."""
+    if pub.get("year"):
+        return int(pub["year"])
+    match = _YEAR_RE.search(str(pub.get("venue", "")))
+    return int(match.group()) if match else None
+
+
+def _venue_name(venue):
+    """Venue without year or notes: ``"ICCV, 2025 (Highlight)"`` -> ``"iccv"``."""
+    return _VENUE_NAME_RE.split(str(venue or ""))[0].strip().lower()
+
+
+def _year_arg(year):
+    """Parse a *year* filter given as a number or string; ValueError if it is not a year."""
+    text = str(year).strip()
+    if isinstance(year, bool) or not _YEAR_RE.fullmatch(text):
+        raise ValueError(f"year must be a four-digit year such as 2023, got {year!r}")
+    return int(text)
+
+
+def _build_facets(docs):
+    """Return the publication facet bitmaps over *docs*."""
+    facets = {"publication": 0, "year": {}, "venue": {}, "has_code": 0, "has_media": 0}
+    for doc_id, d in enumerate(docs):
+        if d.get("type") != "publication":
+            continue
+        bit = 1 << doc_id
+        facets["publication"] |= bit
+        year = _pub_year(d)
+        if year:
+            facets["year"][year] = facets["year"].get(year, 0) | bit
+        venue = _venue_name(d.get("venue"))
+        if venue:
+            facets["venue"][venue] = facets["venue"].get(venue, 0) | bit
+        if d.get("code_url"):
+            facets["has_code"] |= bit
+        if any(ml.get("url") for ml in d.get("media_links") or []):
+            facets["has_media"] |= bit
+    return facets
+
+
+def search_publications(query="", year=None, venue=None, has_code=None, has_media=None, top_k=5):
+    """Search publications only, with optional facet filters.
+
+    Ranked by the same index and scoring as ``search()``.  *year* and
+    *venue* (case-insensitive name, e.g. ``"CVPR"``) must match exactly; a
+    year inside *venue* (``"CVPR 2023"``) is applied as the year filter.
+    *has_code* / *has_media* are booleans.  With an empty *query*, the
+    filtered publications are listed in corpus order.
+
+    Raises ``ValueError`` for a *year* that is not a year, or one that
+    contradicts the year in *venue*.
+    """
+    if year is not None and year != "":
+        year = _year_arg(year)
+    else:
+        year = None
+    if venue:
+        match = _YEAR_RE.search(str(venue))
+        if match:
+            if year is not None and year != int(match.group()):
+                raise ValueError(f"venue {venue!r} names a different year than year={year}")
+            year = int(match.group())
+    snap = _kb_snapshot()
+    docs, index, facets = snap.value["docs"], snap.value["index"], snap.value["facets"]
+    all_docs = (1 << len(docs)) - 1
+    allowed = facets["publication"]
+    if year is not None:
+        allowed &= facets["year"].get(year, 0)
+    if venue:
+        allowed &= facets["venue"].get(_venue_name(venue), 0)
+    for flag, bitmap in ((has_code, facets["has_code"]), (has_media, facets["has_media"])):
+        if flag is not None:
+            allowed &= bitmap if flag else all_docs ^ bitmap
+    if not allowed:
         return []
 
-    query_tokens = _tokenize(query)
+    query_tokens = _tokenize(query or "")
     if not query_tokens:
-        return []
+        return [
+            {**docs[i], "_score": 0.0}
+            for i in range(len(docs)) if (allowed >> i) & 1
+        ][:top_k]
+    hybrid = "dense" in index and _numpy() is not None
+    # Any matching publication qualifies: the caller asked for papers explicitly
+    return _retrieve(docs, index, [query_tokens], [query], top_k, 0.0, _DEFAULT_SCORING, hybrid, allowed)[0]
 
-    # Pre-compute document frequencies and average doc length
-    n_docs = len(docs)
-    all_lengths = []
-    df_map = Counter()
-    for d in docs:
-        tokens = _TOKEN_RE.findall(d["_searchable"])
-        unique_tokens = set(tokens)
-        all_lengths.append(len(tokens))
-        for t in unique_tokens:
-            df_map[t] += 1
-    avg_dl = sum(all_lengths) / max(n_docs, 1)
-
-    scored = []
-    for d in docs:
-        s = _score_bm25(query_tokens, d["_searchable"], avg_dl, n_docs, df_map)
-        if s >= min_score:
-            scored.append({**d, "_score": s})
-
-    scored.sort(key=lambda x: x["_score"], reverse=True)
-    return scored[:top_k]
-
-
-def format_context(results):
-    """Format retrieved documents into a context string for the LLM."""
+
+def format_context(results, query=None, max_chars=None):
+    """Format retrieved documents into a context string for the LLM.
+
+    With *max_chars*, the context is packed to roughly that many characters:
+    titles, venues and URLs of every hit are always kept, and the remaining
+    budget is filled greedily with the summary/excerpt sentences that share
+    the most (IDF-weighted) terms with *query*, across all hits.  Without
+    it, every hit's full text is included.
+
+    Output for results that came from ``search()`` is cached on their
+    ``_doc_key``; other result lists are formatted on every call.
+    """
     if not results:
         return ""
 
+    query_terms = frozenset(_tokenize(query)) if query and max_chars is not None else frozenset()
+    key = tuple(r.get("_doc_key") for r in results)
+    if None in key:
+        return _format_context(results, query_terms, max_chars)
+    key += (max_chars, tuple(sorted(query_terms)))
+    context = _CONTEXT_CACHE.get(key)
+    if context is None:
+        context = _format_context(results, query_terms, max_chars)
+        _CONTEXT_CACHE.put(key, context)
+    return context
+
+
+_SECTION_SEP = "\n\n---\n\n"
+
+
+def _context_parts(r):
+    """Split one result into (lines before body, body label, body text, lines after)."""
+    doc_type = r.get("type", "")
+    if doc_type == "publication":
+        title = r.get("title", "")
+        venue = r.get("venue", "")
+        paper_url = r.get("paper_url", "")
+        code_url = r.get("code_url", "")
+        authors = r.get("authors", "")
+        lines = [f"**{title}**"]
+        if authors:
+            lines.append(f"Authors: {authors}")
+        if venue:
+            lines.append(f"Venue: {venue}")
+        if paper_url:
+            lines.append(f"Paper: {paper_url}")
+        if code_url:
+            lines.append(f"Code: {code_url}")
+        after = []
+        media_links = r.get("media_links", [])
+        if media_links:
+            ml_parts = [
+                f"[{ml['name']}]({ml['url']})"
+                for ml in media_links
+                if ml.get("name") and ml.get("url")
+            ]
+            if ml_parts:
+                after.append(f"Media coverage: {', '.join(ml_parts)}")
+        return lines, "Summary", r.get("summary", ""), after
+
+    if doc_type == "github_project":
+        name = r.get("name", "")
+        url = r.get("url", "")
+        role = r.get("role", "")
+        stars = r.get("stars", "")
+        lines = [f"**{name}**"]
+        if url:
+            lines.append(f"URL: {url}")
+        if stars:
+            lines.append(f"Stars: {stars}")
+        if role:
+            lines.append(f"Role: {role}")
+        return lines, "Description", r.get("description", ""), []
+
+    if doc_type == "site_page":
+        title = r.get("title", "")
+        heading = r.get("heading", "")
+        url = r.get("url", "")
+        header = f"**{title}**"
+        if heading and heading != title:
+            header += f" — {heading}"
+        lines = [header]
+        if url:
+            lines.append(f"Page: {_SITE_URL}{url}")
+        return lines, "Excerpt", r.get("text", ""), []
+
+    return None
+
+
+def _format_context(results, query_terms=frozenset(), max_chars=None):
+    parts = [p for p in (_context_parts(r) for r in results) if p is not None]
+    if max_chars is None:
+        bodies = [body for _before, _label, body, _after in parts]
+    else:
+        bodies = _pack_bodies(parts, query_terms, max_chars)
+
     sections = []
-    for r in results:
-        doc_type = r.get("type", "")
-        if doc_type == "publication":
-            title = r.get("title", "")
-            venue = r.get("venue", "")
-            paper_url = r.get("paper_url", "")
-            code_url = r.get("code_url", "")
-            summary = r.get("summary", "")
-            authors = r.get("authors", "")
-            lines = [f"**{title}**"]
-            if authors:
-                lines.append(f"Authors: {authors}")
-            if venue:
-                lines.append(f"Venue: {venue}")
-            if paper_url:
-                lines.append(f"Paper: {paper_url}")
-            if code_url:
-                lines.append(f"Code: {code_url}")
-            if summary:
-                lines.append(f"Summary: {summary}")
-            media_links = r.get("media_links", [])
-            if media_links:
-                ml_parts = [
-                    f"[{ml['name']}]({ml['url']})"
-                    for ml in media_links
-                    if ml.get("name") and ml.get("url")
-                ]
-                if ml_parts:
-                    lines.append(f"Media coverage: {', '.join(ml_parts)}")
-            sections.append("\n".join(lines))
-
-        elif doc_type == "github_project":
-            name = r.get("name", "")
-            url = r.get("url", "")
-            role = r.get("role", "")
-            desc = r.get("description", "")
-            stars = r.get("stars", "")
-            lines = [f"**{name}**"]
-            if url:
-                lines.append(f"URL: {url}")
-            if stars:
-                lines.append(f"Stars: {stars}")
-            if role:
-                lines.append(f"Role: {role}")
-            if desc:
-                lines.append(f"Description: {desc}")
-            sections.append("\n".join(lines))
-
-    return "\n\n---\n\n".join(sections)
+    for (before, label, _text, after), body in zip(parts, bodies):
+        lines = list(before)
+        if body:
+            lines.append(f"{label}: {body}")
+        sections.append("\n".join(lines + after))
+    return _SECTION_SEP.join(sections)
+
+
+def _pack_bodies(parts, query_terms, max_chars):
+    """Choose body sentences for every part so the context fits *max_chars*.
+
+    The fixed lines (titles, URLs, ...) are charged first.  Sentences are
+    then taken greedily across all hits by descending IDF-weighted overlap
+    with *query_terms*; ties (including sentences with no overlap) go to
+    the higher-ranked hit and the earlier sentence.
+    """
+    fixed = len(_SECTION_SEP) * max(len(parts) - 1, 0)
+    for before, label, _text, after in parts:
+        fixed += sum(len(line) + 1 for line in before + after) + len(label) + 3
+    remaining = max_chars - fixed
+
+    idf = _kb_snapshot().value["index"]["idf"]
+    candidates = []
+    split = []
+    for hit, (_before, _label, text, _after) in enumerate(parts):
+        sentences = [x.strip() for x in _SENTENCE_END_RE.split(text or "") if x and x.strip()]
+        split.append(sentences)
+        for pos, sentence in enumerate(sentences):
+            overlap = query_terms.intersection(_index_tokens(sentence.lower()))
+            score = sum(idf.get(t, 1.0) for t in overlap)
+            candidates.append((-score, hit, pos, sentence))
+
+    chosen = [set() for _ in parts]
+    for _neg_score, hit, pos, sentence in sorted(candidates):
+        # Separator plus a possible " …" gap marker
+        cost = len(sentence) + 3
+        if cost <= remaining:
+            chosen[hit].add(pos)
+            remaining -= cost
+
+    bodies = []
+    for hit, sentences in enumerate(split):
+        picked = []
+        prev = -1
+        for pos in sorted(chosen[hit]):
+            if picked and pos != prev + 1:
+                picked.append("…")
+            picked.append(sentences[pos])
+            prev = pos
+        if picked and prev != len(sentences) - 1:
+            picked.append("…")
+        bodies.append(" ".join(picked))
+    return bodies
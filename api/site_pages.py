@@ -0,0 +1,288 @@
+"""
+Full-text search over the site's own HTML pages for the agent tools.
+
+Pages are never re-read or re-parsed per call: the knowledge-base snapshot
+(see rag_utils) already holds each page's clean text, title and heading
+outline, extracted once at build time into the compiled artifact.  On top
+of that this module keeps a positional index — term → page → character
+offsets — so a search is a postings lookup that yields term counts, CJK
+phrase matches and the snippet position in one pass.  The index is built
+lazily once per snapshot version and kept beside the (read-only) snapshot,
+so it follows the snapshot's mtime-driven reloads.
+
+``read_site_page`` uses the same extracted pages and their heading
+outlines to return one section or character range instead of a whole page.
+"""
+
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+import rag_utils
+from cache_utils import LRUCache
+
+_ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+_PAGES_DIR = os.path.join(_ROOT_DIR, "pages")
+
+# Pages outside the knowledge base (chat, mario), parsed on demand and
+# keyed by (path, mtime_ns, size) so an edited file is parsed again
+_PARSED_PAGES = LRUCache(8)
+# Positional index per knowledge-base snapshot version
+_SITE_INDEXES = LRUCache(2)
+
+# English words, or CJK runs (indexed as overlapping bigrams)
+_WORD_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+", re.IGNORECASE)
+# Score bonus per query phrase found in the page title
+_TITLE_BONUS = 10
+# English query words at least this long also match longer words they
+# prefix ("diffusion" → "diffusions"), as the old substring count did
+_PREFIX_MIN_CHARS = 3
+# The snippet is placed over the window of this many chars that covers the
+# most distinct query phrases
+_SNIPPET_WINDOW = 300
+_SNIPPET_BEFORE = 100
+_SNIPPET_AFTER = 250
+
+
+def _page_terms(text):
+    """Yield ``(term, offset)`` for every indexed term of a page's *text*."""
+    for m in _WORD_RE.finditer(text):
+        word = m.group().lower()
+        if rag_utils._is_cjk(word):
+            for i in range(len(word) - 1):
+                yield word[i:i + 2], m.start() + i
+        elif word not in rag_utils._STOP_WORDS:
+            yield word, m.start()
+
+
+def _build_index(pages):
+    """Build the positional index over ``{name: page}``."""
+    names = list(pages)
+    postings = {}
+    for page_id, name in enumerate(names):
+        for term, offset in _page_terms(pages[name]["text"]):
+            by_page = postings.get(term)
+            if by_page is None:
+                by_page = postings[term] = {}
+            positions = by_page.get(page_id)
+            if positions is None:
+                by_page[page_id] = [offset]
+            else:
+                positions.append(offset)
+    return {
+        "names": names,
+        "pages": [pages[name] for name in names],
+        "titles": [pages[name]["title"].lower() for name in names],
+        "postings": postings,
+        "vocab": sorted(postings),
+    }
+
+
+def _site_index():
+    """Return the positional index of the current snapshot, building it on first use."""
+    snap = rag_utils._kb_snapshot()
+    index = _SITE_INDEXES.get(snap.version)
+    if index is None:
+        index = _build_index(snap.value["pages"])
+        _SITE_INDEXES.put(snap.version, index)
+    return index
+
+
+def _query_phrases(query):
+    """Split *query* into phrases: single English words and CJK runs.
+
+    CJK runs are cut at stop words ("什么是扩散模型" → "扩散模型"); single
+    leftover characters are dropped, as the index only holds bigrams.
+    """
+    phrases = []
+    for m in _WORD_RE.finditer(query.lower()):
+        word = m.group()
+        if not rag_utils._is_cjk(word):
+            if word not in rag_utils._STOP_WORDS:
+                phrases.append(word)
+            continue
+        phrases.extend(run for run in rag_utils._CJK_STOP_RE.split(word) if len(run) >= 2)
+    return list(dict.fromkeys(phrases))
+
+
+def _phrase_positions(index, phrase):
+    """Return ``{page id: sorted start offsets}`` of *phrase*."""
+    postings = index["postings"]
+    if not rag_utils._is_cjk(phrase):
+        terms = [phrase]
+        if len(phrase) >= _PREFIX_MIN_CHARS:
+            vocab = index["vocab"]
+            lo = bisect_left(vocab, phrase)
+            hi = bisect_left(vocab, phrase + "\uffff", lo)
+            terms = vocab[lo:hi]
+        found = {}
+        for term in terms:
+            for page_id, positions in postings.get(term, {}).items():
+                found.setdefault(page_id, []).extend(positions)
+        return {page_id: sorted(p) for page_id, p in found.items()}
+
+    # A CJK run matches where all of its bigrams occur back to back
+    grams = [phrase[i:i + 2] for i in range(len(phrase) - 1)]
+    found = {}
+    for page_id, positions in postings.get(grams[0], {}).items():
+        starts = set(positions)
+        for i, gram in enumerate(grams[1:], 1):
+            following = postings.get(gram, {}).get(page_id)
+            if not following:
+                starts = None
+                break
+            starts &= {p - i for p in following}
+        if starts:
+            found[page_id] = sorted(starts)
+    return found
+
+
+def _snippet_offset(hits):
+    """Start of the ``_SNIPPET_WINDOW`` that covers the most distinct phrases.
+
+    *hits* is a list of ``(offset, phrase number)``; ties go to the earliest
+    window.
+    """
+    hits.sort()
+    window = Counter()
+    best_offset, best_count = hits[0][0], 0
+    lo = 0
+    for offset, phrase in hits:
+        window[phrase] += 1
+        while hits[lo][0] < offset - _SNIPPET_WINDOW:
+            first = hits[lo][1]
+            window[first] -= 1
+            if not window[first]:
+                del window[first]
+            lo += 1
+        if len(window) > best_count:
+            best_offset, best_count = hits[lo][0], len(window)
+    return best_offset
+
+
+def _heading_at(page, offset):
+    """Return the heading of the section containing *offset* ("" before the first)."""
+    headings = page["headings"]
+    i = bisect_right([h["start"] for h in headings], offset) - 1
+    return headings[i]["heading"] if i >= 0 else ""
+
+
+def search(query, limit=8):
+    """Search the site pages; return up to *limit* best matches.
+
+    Pages score one point per occurrence of each query phrase plus
+    ``_TITLE_BONUS`` per phrase in the title.  Each result is a dict with
+    ``page``, ``title``, ``url``, ``score``, ``heading`` and ``snippet``,
+    where the snippet and heading locate the densest cluster of matches.
+    """
+    phrases = _query_phrases(query)
+    if not phrases:
+        return []
+    index = _site_index()
+
+    scores = Counter()
+    hits = {}
+    for n, phrase in enumerate(phrases):
+        for page_id, positions in _phrase_positions(index, phrase).items():
+            scores[page_id] += len(positions)
+            hits.setdefault(page_id, []).extend((p, n) for p in positions)
+    for page_id, title in enumerate(index["titles"]):
+        bonus = sum(_TITLE_BONUS for phrase in phrases if phrase in title)
+        if bonus:
+            scores[page_id] += bonus
+
+    results = []
+    for page_id in sorted(scores, key=lambda i: (-scores[i], i))[:limit]:
+        page = index["pages"][page_id]
+        snippet, heading = "", ""
+        if page_id in hits:
+            offset = _snippet_offset(hits[page_id])
+            text = page["text"]
+            snippet = text[max(0, offset - _SNIPPET_BEFORE):offset + _SNIPPET_AFTER].strip()
+            heading = _heading_at(page, offset)
+        results.append({
+            "page": index["names"][page_id],
+            "title": page["title"],
+            "url": page["url"],
+            "score": scores[page_id],
+            "heading": heading,
+            "snippet": snippet,
+        })
+    return results
+
+
+# ── page access and outlines ─────────────────────────────────────────
+def _page_path(name):
+    if name == "index":
+        return os.path.join(_ROOT_DIR, "index.html")
+    return os.path.join(_PAGES_DIR, f"{name}.html")
+
+
+def page_names():
+    """Return the names of all pages on disk, including ``index``."""
+    names = ["index"]
+    if os.path.isdir(_PAGES_DIR):
+        names += sorted(f[:-5] for f in os.listdir(_PAGES_DIR) if f.endswith(".html"))
+    return names
+
+
+def get_page(name):
+    """Return the extracted page *name* (see ``rag_utils.extract_site_page``), or None.
+
+    Knowledge-base pages come from the current snapshot; the rest are parsed
+    once per file version and kept in memory.
+    """
+    page = rag_utils.load_site_pages().get(name)
+    if page is not None:
+        return page
+    path = _page_path(name)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_mtime_ns, st.st_size)
+    page = _PARSED_PAGES.get(key)
+    if page is None:
+        with open(path, "r", encoding="utf-8", errors="replace") as fh:
+            page = rag_utils.extract_site_page(name, fh.read())
+        _PARSED_PAGES.put(key, page)
+    return page
+
+
+def outline(page):
+    """Return the sections of *page*, computed from its heading list.
+
+    Section 0 is the text before the first heading (if any); every heading
+    starts a numbered section that runs up to the next heading of the same
+    or a higher level, so it includes its subsections.  Each entry is
+    ``{"number", "level", "heading", "start", "end"}``.
+    """
+    text, headings = page["text"], page["headings"]
+    sections = []
+    if headings and text[:headings[0]["start"]].strip():
+        sections.append({"number": 0, "level": 0, "heading": "", "start": 0, "end": headings[0]["start"]})
+    for i, h in enumerate(headings):
+        end = next(
+            (later["start"] for later in headings[i + 1:] if later["level"] <= h["level"]), len(text)
+        )
+        sections.append({
+            "number": i + 1, "level": h["level"], "heading": h["heading"], "start": h["start"], "end": end,
+        })
+    return sections
+
+
+def find_section(page, section):
+    """Look up a section of *page* by number or heading text; None if absent.
+
+    Headings match case-insensitively, exactly first and then by substring.
+    """
+    sections = outline(page)
+    key = str(section).strip()
+    if key.isdigit():
+        return next((s for s in sections if s["number"] == int(key)), None)
+    key = key.lower()
+    return (
+        next((s for s in sections if s["heading"].lower() == key), None)
+        or next((s for s in sections if key and key in s["heading"].lower()), None)
+    )
@@ -0,0 +1,157 @@
+"""
+Hot-reloadable immutable snapshots of data built from files on disk.
+
+A ``SnapshotManager`` owns one value derived from a set of source files
+(the RAG knowledge base, the citation data, ...).  Readers call ``get()``
+and receive the current ``Snapshot``; they never block on a rebuild.
+
+Change detection is polling only — no watcher daemon: at most once per
+poll interval, ``get()`` stats the watched files.  When their mtime/size
+signature moves, a background thread re-reads them, skips the rebuild if
+the content hash is unchanged (e.g. a bare ``touch``), and otherwise builds
+a fresh value.  The new snapshot is published with a single reference
+assignment, so a request that already holds a snapshot keeps using it
+consistently and never sees a half-built index.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds between stat() polls; 0 disables hot reload entirely
+_POLL_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "2"))
+
+# version increases by one on every published rebuild; value must be
+# treated as read-only by callers
+Snapshot = namedtuple("Snapshot", ["version", "value", "signature", "digest"])
+
+
+def _signature(paths):
+    """Cheap change signature: (path, mtime_ns, size) of every watched file."""
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            sig.append((path, None, None))
+            continue
+        sig.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+def _content_digest(paths):
+    """SHA-256 over the contents of the watched files (missing files hash as empty)."""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode("utf-8") + b"\0")
+        try:
+            with open(path, "rb") as fh:
+                h.update(hashlib.sha256(fh.read()).digest())
+        except OSError:
+            h.update(b"\0")
+    return h.digest()
+
+
+class SnapshotManager:
+    """Serve the latest snapshot of ``build()`` over the files from ``watch()``.
+
+    *watch* returns the list of file paths to poll (called on every poll,
+    so newly added files are picked up); *build* returns the new value.
+    """
+
+    def __init__(self, name, watch, build, poll_interval=None):
+        self.name = name
+        self._watch = watch
+        self._build = build
+        self._poll_interval = _POLL_INTERVAL if poll_interval is None else poll_interval
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        # Signature of the last rebuild attempt, so a failing build is not
+        # retried on every poll — only when the files change again
+        self._attempted = None
+        self._thread = None
+
+    def get(self):
+        """Return the current snapshot, kicking off a reload if files changed."""
+        snap = self._snapshot
+        if snap is None:
+            # Cold start: there is nothing to serve yet, so build inline
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load(1)
+                return self._snapshot
+        if self._poll_interval > 0:
+            self._poll(snap)
+        return snap
+
+    def loaded(self):
+        """True once the first snapshot has been built (later builds are reloads)."""
+        return self._snapshot is not None
+
+    def reload(self):
+        """Rebuild synchronously if the sources changed; return the current snapshot."""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._load(1)
+            else:
+                self._refresh(self._snapshot)
+            return self._snapshot
+
+    def _load(self, version):
+        paths = self._watch()
+        signature = _signature(paths)
+        digest = _content_digest(paths)
+        return Snapshot(version, self._build(), signature, digest)
+
+    def _poll(self, snap):
+        now = time.monotonic()
+        if now - self._last_poll < self._poll_interval:
+            return
+        self._last_poll = now
+        signature = _signature(self._watch())
+        if signature in (snap.signature, self._attempted):
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # a rebuild is already running
+        self._attempted = signature
+        self._thread = threading.Thread(
+            target=self._rebuild_in_background, name=f"snapshot-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def _rebuild_in_background(self):
+        try:
+            self._refresh(self._snapshot)
+        finally:
+            self._lock.release()
+
+    def _refresh(self, snap):
+        """Publish a new snapshot if the watched content differs from *snap*.
+
+        Must be called with ``self._lock`` held.
+        """
+        paths = self._watch()
+        # Take the signature before reading, so an edit that lands mid-build
+        # shows up as a new change on the next poll
+        signature = _signature(paths)
+        digest = _content_digest(paths)
+        if digest == snap.digest:
+            self._snapshot = snap._replace(signature=signature)
+            return
+        started = time.perf_counter()
+        try:
+            value = self._build()
+        except Exception as e:
+            logger.warning(f"Rebuilding {self.name} snapshot failed, keeping v{snap.version}: {e}")
+            return
+        self._snapshot = Snapshot(snap.version + 1, value, signature, digest)
+        logger.info(
+            f"Reloaded {self.name} snapshot v{snap.version + 1} "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
@@ -0,0 +1,129 @@
+"""
+Per-tool instrumentation for ``tools.execute_tool``.
+
+Every tool call is measured: latency, result size, whether the agent loop
+will have to truncate the result, which caches answered it and — if it
+failed — the exception class.  Aggregates per tool are kept for the life
+of the process and served by ``GET /api/metrics``; each call's own record
+can also be collected for a per-request summary.
+
+Caches report hits with ``cache_hit(source)``, which is attributed to the
+tool call running in the current context (a no-op outside one).
+"""
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+# The agent loop shows at most this many characters of a tool result, and
+# keeps at most this many when compressing the context
+DISPLAY_CHARS = 2000
+
+_LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+_SIZE_BUCKETS = (256, 1024, 2048, 8192, 32768)
+
+_tools = {}  # tool name -> aggregate
+_lock = threading.Lock()
+_current = contextvars.ContextVar("tool_call", default=None)
+
+
+def _histogram(bounds):
+    return [0] * (len(bounds) + 1)
+
+
+def _labels(bounds, unit):
+    return [f"<={b}{unit}" for b in bounds] + [f">{bounds[-1]}{unit}"]
+
+
+@contextmanager
+def measure(name):
+    """Measure one call of tool *name*; yields its record.
+
+    Set ``record["result"]`` to the result string before leaving the block.
+    On exit the record gets ``ms``, ``bytes`` and ``truncated`` (the result
+    itself is dropped) and is added to the per-tool aggregates.
+    """
+    record = {"tool": name, "ms": 0.0, "bytes": 0, "truncated": False, "cache_hits": {}, "error": None}
+    token = _current.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _current.reset(token)
+        result = record.pop("result", None) or ""
+        record["bytes"] = len(result.encode("utf-8"))
+        record["truncated"] = len(result) > DISPLAY_CHARS
+        _add(record)
+
+
+def _add(record):
+    with _lock:
+        agg = _tools.get(record["tool"])
+        if agg is None:
+            agg = _tools[record["tool"]] = {
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "latency": _histogram(_LATENCY_BUCKETS_MS),
+                "total_bytes": 0, "max_bytes": 0, "size": _histogram(_SIZE_BUCKETS),
+                "truncated": 0, "cache_hits": Counter(), "errors": Counter(),
+            }
+        agg["calls"] += 1
+        agg["total_ms"] += record["ms"]
+        agg["max_ms"] = max(agg["max_ms"], record["ms"])
+        agg["latency"][bisect_left(_LATENCY_BUCKETS_MS, record["ms"])] += 1
+        agg["total_bytes"] += record["bytes"]
+        agg["max_bytes"] = max(agg["max_bytes"], record["bytes"])
+        agg["size"][bisect_left(_SIZE_BUCKETS, record["bytes"])] += 1
+        agg["truncated"] += record["truncated"]
+        agg["cache_hits"].update(record["cache_hits"])
+        if record["error"]:
+            agg["errors"][record["error"]] += 1
+
+
+def cache_hit(source):
+    """Count a cache hit from *source* for the tool call in progress, if any."""
+    record = _current.get()
+    if record is not None:
+        record["cache_hits"][source] = record["cache_hits"].get(source, 0) + 1
+
+
+def record_error(error):
+    """Note the class of an exception a tool handled (or a short error label)."""
+    record = _current.get()
+    if record is not None:
+        record["error"] = error if isinstance(error, str) else type(error).__name__
+
+
+def stats():
+    """Return the aggregates per tool, with latency and size histograms."""
+    latency_labels = _labels(_LATENCY_BUCKETS_MS, "ms")
+    size_labels = _labels(_SIZE_BUCKETS, "B")
+    with _lock:
+        return {
+            name: {
+                "calls": agg["calls"],
+                "mean_ms": round(agg["total_ms"] / agg["calls"], 1),
+                "max_ms": agg["max_ms"],
+                "latency_ms": dict(zip(latency_labels, agg["latency"])),
+                "mean_bytes": round(agg["total_bytes"] / agg["calls"]),
+                "max_bytes": agg["max_bytes"],
+                "size_bytes": dict(zip(size_labels, agg["size"])),
+                "truncated": agg["truncated"],
+                "cache_hits": dict(agg["cache_hits"]),
+                "errors": dict(agg["errors"]),
+            }
+            for name, agg in sorted(_tools.items())
+        }
+
+
+def summarize(records):
+    """Per-request summary of the call *records* collected during one chat request."""
+    return {
+        "calls": len(records),
+        "total_ms": round(sum(r["ms"] for r in records), 1),
+        "total_bytes": sum(r["bytes"] for r in records),
+        "truncated": sum(r["truncated"] for r in records),
+        "tools": records,
+    }
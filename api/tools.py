@@ -8,11 +8,21 @@ for each tool the GPT-5 agent can invoke.
 import json
 import logging
 import os
-import re
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
-
-import yaml
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
+import github_cache
+import github_graphql
+import github_quota
+import html_text
+import http_client
+import rag_utils
+import site_pages
+import snapshot
+import tool_metrics
+import webpage_cache
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +31,12 @@ _API_DIR = os.path.dirname(os.path.abspath(__file__))
 _ROOT_DIR = os.path.abspath(os.path.join(_API_DIR, ".."))
 _PAGES_DIR = os.path.join(_ROOT_DIR, "pages")
 _DATA_DIR = os.path.join(_ROOT_DIR, "data")
-_PUBLICATIONS_YAML = os.path.join(_DATA_DIR, "research_data.yaml")
 _CITATION_DATA_JSON = os.path.join(_DATA_DIR, "citation_data.json")
 
-# ── Proxy for external requests ──────────────────────────────────────────
-_PROXY = os.getenv("http_proxy", os.getenv("HTTP_PROXY", ""))
-
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 GITHUB_USERNAME = "anxiangsir"
+# Most items a paginated GitHub listing returns (repos, contributors)
+GITHUB_MAX_ITEMS = int(os.getenv("GITHUB_MAX_ITEMS", "200"))
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -52,8 +60,27 @@ TOOL_SCHEMAS = [
                 "properties": {
                     "query": {
                         "type": "string",
-                        "description": "Search query (e.g. 'PartialFC', 'face recognition', 'multimodal')",
-                    }
+                        "description": (
+                            "Search query (e.g. 'PartialFC', 'face recognition', 'multimodal'). "
+                            "May be empty when filtering, to list all matching papers."
+                        ),
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "Only papers published in this year (e.g. 2025)",
+                    },
+                    "venue": {
+                        "type": "string",
+                        "description": "Only papers at this venue (e.g. 'CVPR', 'ICCV', 'AAAI', 'Preprint'); a year in it (e.g. 'CVPR 2023') also filters by year",
+                    },
+                    "has_code": {
+                        "type": "boolean",
+                        "description": "true = only papers with released code; false = only papers without",
+                    },
+                    "has_media": {
+                        "type": "boolean",
+                        "description": "true = only papers with media coverage (news, videos, blog posts)",
+                    },
                 },
                 "required": ["query"],
             },
@@ -165,7 +192,9 @@ TOOL_SCHEMAS = [
                 "video_codec, publications, blog, chat, yarn, areal, ddpm, "
                 "diffusion_models, funasr, gae, mario, megatron_fp8, "
                 "monte_carlo_method, rabitq, verl_grpo, video_subtitle_benchmark. "
-                "Use this to answer questions about specific visualizations or pages."
+                "Use this to answer questions about specific visualizations or pages. "
+                "Long pages are truncated: call with list_sections=true first, then read "
+                "only the section you need."
             ),
             "parameters": {
                 "type": "object",
@@ -173,7 +202,26 @@ TOOL_SCHEMAS = [
                     "page_name": {
                         "type": "string",
                         "description": "Page name without extension (e.g. 'partial_fc', 'publications'). Use 'index' for the homepage.",
-                    }
+                    },
+                    "list_sections": {
+                        "type": "boolean",
+                        "description": "Return the page's numbered section outline instead of its text",
+                    },
+                    "section": {
+                        "type": "string",
+                        "description": (
+                            "Section number from list_sections, or (part of) its heading. "
+                            "Includes the section's subsections."
+                        ),
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Character offset to start reading from (e.g. to continue a truncated read)",
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": "Number of characters to read from offset (max 6000)",
+                    },
                 },
                 "required": ["page_name"],
             },
@@ -254,105 +302,159 @@ TOOL_SCHEMAS = [
 # ═══════════════════════════════════════════════════════════════════════════
 
 # ── Cached data loaders ──────────────────────────────────────────────────
-_publications_cache = None
-_citation_cache = None
+# Citation data is a hot-reloadable snapshot (see snapshot.py): edits to
+# citation_data.json are picked up without a restart.  Publications are
+# served from rag_utils' knowledge-base snapshot.
 
+def _read_citation_data():
+    """Parse citation_data.json for a new citation snapshot.
 
-def _load_publications():
-    """Load publications from YAML (cached)."""
-    global _publications_cache
-    if _publications_cache is not None:
-        return _publications_cache
+    Only the first load falls back to ``{}``; on a reload the error
+    propagates, so a broken edit keeps the last good snapshot instead of
+    publishing an empty one.
+    """
     try:
-        with open(_PUBLICATIONS_YAML, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-        _publications_cache = data.get("publications", [])
+        with open(_CITATION_DATA_JSON, "r", encoding="utf-8") as f:
+            return json.load(f)
     except Exception as e:
-        logger.warning(f"Failed to load research_data.yaml: {e}")
-        _publications_cache = []
-    return _publications_cache
+        if _CITATIONS.loaded():
+            raise
+        logger.warning(f"Failed to load citation_data.json: {e}")
+        return {}
+
+
+_CITATIONS = snapshot.SnapshotManager(
+    "citation data", lambda: [_CITATION_DATA_JSON], _read_citation_data
+)
 
 
 def _load_citation_data():
-    """Load citation data from JSON (cached)."""
-    global _citation_cache
-    if _citation_cache is not None:
-        return _citation_cache
-    try:
-        with open(_CITATION_DATA_JSON, "r", encoding="utf-8") as f:
-            _citation_cache = json.load(f)
-    except Exception as e:
-        logger.warning(f"Failed to load citation_data.json: {e}")
-        _citation_cache = {}
-    return _citation_cache
+    """Load citation data from JSON (cached, reloaded when the file changes)."""
+    return _CITATIONS.get().value
 
 
-# ── Helper: HTTP request with proxy support ──────────────────────────────
+# ── Helper: HTTP requests (pooled, proxy-aware) ──────────────────────────────
 
 def _http_get(url, headers=None, timeout=15):
-    """Perform an HTTP GET with optional proxy."""
+    """Perform an HTTP GET over the pooled keep-alive client (proxy-aware)."""
     if headers is None:
         headers = {}
     headers.setdefault("User-Agent", "Mozilla/5.0 (compatible; XiangAnBot/1.0)")
-    req = Request(url, headers=headers)
-
-    if _PROXY and not any(h in url for h in ("localhost", "127.0.0.1")):
-        from urllib.request import ProxyHandler, build_opener
-        opener = build_opener(ProxyHandler({"http": _PROXY, "https": _PROXY}))
-        return opener.open(req, timeout=timeout).read()
-    else:
-        return urlopen(req, timeout=timeout).read()
+    return http_client.request("GET", url, headers=headers, timeout=timeout).body
 
 
 def _http_post(url, data, headers=None, timeout=15):
-    """Perform an HTTP POST with optional proxy."""
+    """Perform an HTTP POST over the pooled keep-alive client (proxy-aware)."""
     if headers is None:
         headers = {}
     headers.setdefault("User-Agent", "Mozilla/5.0 (compatible; XiangAnBot/1.0)")
     headers.setdefault("Content-Type", "application/json")
     body = json.dumps(data).encode("utf-8")
-    req = Request(url, data=body, headers=headers, method="POST")
+    return http_client.request("POST", url, headers=headers, body=body, timeout=timeout).body
 
-    if _PROXY and not any(h in url for h in ("localhost", "127.0.0.1")):
-        from urllib.request import ProxyHandler, build_opener
-        opener = build_opener(ProxyHandler({"http": _PROXY, "https": _PROXY}))
-        return opener.open(req, timeout=timeout).read()
-    else:
-        return urlopen(req, timeout=timeout).read()
 
+def _github_get(url, headers, timeout=15):
+    """GET a GitHub API URL through the conditional-request cache."""
+    headers.setdefault("User-Agent", "Mozilla/5.0 (compatible; XiangAnBot/1.0)")
+    return github_cache.fetch("GET", url, headers=headers, timeout=timeout)
 
-# ── 1. search_publications ───────────────────────────────────────────────
 
-def _search_publications(query: str) -> str:
-    """Search publications by keyword using simple text matching."""
-    pubs = _load_publications()
-    if not pubs:
-        return "No publications data available."
-
-    query_lower = query.lower()
-    query_terms = [t for t in re.split(r'\W+', query_lower) if t]
-
-    scored = []
-    for pub in pubs:
-        searchable = " ".join(
-            str(pub.get(k, "")) for k in
-            ("title", "authors", "venue", "summary", "year")
-        ).lower()
-        score = sum(1 for term in query_terms if term in searchable)
-        # Bonus for title match
-        title_lower = pub.get("title", "").lower()
-        score += sum(2 for term in query_terms if term in title_lower)
-        if score > 0:
-            scored.append((score, pub))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    results = scored[:5]
+# ── Helper: GitHub REST pagination ───────────────────────────────────────
+# A listing's first page carries a Link header pointing at its last page;
+# the remaining pages are then fetched concurrently instead of following
+# rel="next" one round trip at a time.
+
+_GITHUB_PER_PAGE = 100
+_PAGE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="github-page")
+
 
+def _parse_link(header):
+    """Return ``{rel: url}`` from a Link header."""
+    links = {}
+    for part in (header or "").split(","):
+        url, _, params = part.partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "rel":
+                links[value.strip('"')] = url.strip().strip("<>")
+    return links
+
+
+def _with_page(url, page):
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    query["page"] = [str(page)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def _github_pages(url, headers, max_items=None):
+    """Yield the items of a paginated GitHub REST listing in order.
+
+    *url* should ask for ``per_page=100``.  After the first page, the pages
+    up to the ``rel="last"`` link (capped by *max_items*, default
+    ``GITHUB_MAX_ITEMS``) are fetched concurrently; items are yielded as
+    soon as every page before theirs has arrived.  Raises ``ValueError`` if
+    the first page is not a JSON list.
+    """
+    max_items = max_items or GITHUB_MAX_ITEMS
+    headers.setdefault("User-Agent", "Mozilla/5.0 (compatible; XiangAnBot/1.0)")
+    raw, link = github_cache.fetch_with_link(url, headers=headers)
+    items = json.loads(raw.decode("utf-8"))
+    if not isinstance(items, list):
+        raise ValueError("unexpected response (not a list)")
+    yield from items[:max_items]
+    remaining = max_items - len(items)
+    links = _parse_link(link)
+    if remaining <= 0 or not items or "next" not in links:
+        return
+
+    if "last" not in links:
+        # No page count to fan out over; follow rel="next"
+        yield from _github_pages(links["next"], headers, remaining)
+        return
+    first = int(parse_qs(urlsplit(links["next"]).query)["page"][0])
+    last = int(parse_qs(urlsplit(links["last"]).query)["page"][0])
+    last = min(last, first + (remaining - 1) // len(items))
+    futures = [
+        _PAGE_EXECUTOR.submit(github_cache.fetch, "GET", _with_page(links["next"], page), dict(headers))
+        for page in range(first, last + 1)
+    ]
+    try:
+        for future in futures:
+            page_items = json.loads(future.result().decode("utf-8"))
+            yield from page_items[:remaining]
+            remaining -= len(page_items)
+            if remaining <= 0:
+                return
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# ── 1. search_publications ───────────────────────────────────────────────
+
+def _search_publications(query: str, year=None, venue=None, has_code=None, has_media=None) -> str:
+    """Search publications through the shared RAG index, with optional facet filters."""
+    filters = {"year": year, "venue": venue, "has_code": has_code, "has_media": has_media}
+    try:
+        results = rag_utils.search_publications(query, **filters)
+    except ValueError as e:
+        tool_metrics.record_error("InvalidArguments")
+        return f"Error: {e}."
+    except Exception as e:
+        tool_metrics.record_error(e)
+        logger.warning(f"Publication search failed: {e}")
+        return f"Failed to search publications for '{query}': {e}"
+
+    described = query
+    active = ", ".join(f"{k}={v}" for k, v in filters.items() if v not in (None, ""))
+    if active:
+        described = f"{query} ({active})" if query else active
     if not results:
-        return f"No publications found matching '{query}'."
+        return f"No publications found matching '{described}'."
 
-    lines = [f"Found {len(results)} publication(s) matching '{query}':\n"]
-    for _score, pub in results:
+    lines = [f"Found {len(results)} publication(s) matching '{described}':\n"]
+    for pub in results:
         lines.append(f"**{pub.get('title', 'Untitled')}**")
         if pub.get("authors"):
             lines.append(f"  Authors: {pub['authors']}")
@@ -382,7 +484,10 @@ def _search_publications(query: str) -> str:
 # ── 2. fetch_webpage ─────────────────────────────────────────────────────
 
 def _fetch_webpage(url: str) -> str:
-    """Fetch webpage and extract content as markdown."""
+    """Fetch webpage and extract content as markdown (cached per canonical URL)."""
+    cached = webpage_cache.get(url)
+    if cached is not None:
+        return cached
     try:
         import trafilatura
         raw = _http_get(url, timeout=20)
@@ -397,24 +502,27 @@ def _fetch_webpage(url: str) -> str:
             # Truncate for LLM context
             if len(text) > 8000:
                 text = text[:8000] + "\n\n... [content truncated]"
-            return f"Content from {url}:\n\n{text}"
+            content = f"Content from {url}:\n\n{text}"
+            webpage_cache.put(url, content)
+            return content
         return f"Could not extract meaningful content from {url}."
     except ImportError:
         # Fallback: basic HTML text extraction without trafilatura
         try:
             raw = _http_get(url, timeout=20)
-            html_text = raw.decode("utf-8", errors="replace")
-            # Strip HTML tags
-            clean = re.sub(r'<script[^>]*>[\s\S]*?</script>', '', html_text)
-            clean = re.sub(r'<style[^>]*>[\s\S]*?</style>', '', clean)
-            clean = re.sub(r'<[^>]+>', ' ', clean)
-            clean = re.sub(r'\s+', ' ', clean).strip()
-            if len(clean) > 8000:
-                clean = clean[:8000] + "... [truncated]"
-            return f"Content from {url} (basic extraction):\n\n{clean}"
+            # Parsing stops once the 8000 chars we return are collected
+            page = html_text.extract_page(raw.decode("utf-8", errors="replace"), max_chars=8000)
+            clean = page["text"]
+            if page["truncated"]:
+                clean += "... [truncated]"
+            content = f"Content from {url} (basic extraction):\n\n{clean}"
+            webpage_cache.put(url, content)
+            return content
         except Exception as e:
+            tool_metrics.record_error(e)
             return f"Failed to fetch {url}: {e}"
     except Exception as e:
+        tool_metrics.record_error(e)
         return f"Failed to fetch {url}: {e}"
 
 
@@ -428,7 +536,7 @@ def _search_github_repo(repo: str, path: str = "") -> str:
         headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
 
     try:
-        raw = _http_get(api_url, headers=headers, timeout=15)
+        raw = _github_get(api_url, headers)
         data = json.loads(raw.decode("utf-8"))
 
         if isinstance(data, list):
@@ -450,36 +558,56 @@ def _search_github_repo(repo: str, path: str = "") -> str:
 
         return f"Unexpected response from GitHub API for {repo}/{path}."
     except HTTPError as e:
+        tool_metrics.record_error(e)
         if e.code == 404:
             return f"Path '{path}' not found in repo '{repo}'."
         return f"GitHub API error for {repo}/{path}: HTTP {e.code}"
     except Exception as e:
+        tool_metrics.record_error(e)
         return f"Failed to access {repo}/{path}: {e}"
 
 
 # ── 4. list_github_repos ────────────────────────────────────────────────
 
 def _list_github_repos(username: str = "", sort: str = "stars") -> str:
-    """List public repos for a GitHub user."""
+    """List public repos for a GitHub user (GraphQL with a token, REST without)."""
     username = username or GITHUB_USERNAME
-    sort_param = "stars" if sort == "stars" else sort
-    direction = "desc" if sort == "stars" else "desc"
-    api_url = (
-        f"https://api.github.com/users/{username}/repos"
-        f"?type=public&sort={sort_param}&direction={direction}&per_page=30"
-    )
-    headers = {"Accept": "application/vnd.github.v3+json"}
-    if GITHUB_TOKEN:
-        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
-
     try:
-        raw = _http_get(api_url, headers=headers, timeout=15)
-        repos = json.loads(raw.decode("utf-8"))
+        if GITHUB_TOKEN:
+            listing = github_graphql.owner_repositories(username, GITHUB_TOKEN, sort=sort, limit=GITHUB_MAX_ITEMS)
+            if listing is None:
+                return f"GitHub user or organization '{username}' not found."
+            total = listing["totalCount"]
+            repos = [
+                {
+                    "name": r["name"],
+                    "description": r.get("description"),
+                    "stargazers_count": r.get("stargazerCount", 0),
+                    "language": (r.get("primaryLanguage") or {}).get("name"),
+                    "fork": r.get("isFork"),
+                }
+                for r in listing["nodes"]
+            ]
+        else:
+            sort_param = "stars" if sort == "stars" else sort
+            direction = "desc" if sort == "stars" else "desc"
+            api_url = (
+                f"https://api.github.com/users/{username}/repos"
+                f"?type=public&sort={sort_param}&direction={direction}&per_page={_GITHUB_PER_PAGE}"
+            )
+            repos = list(_github_pages(api_url, {"Accept": "application/vnd.github.v3+json"}))
+            total = len(repos)
 
         if not repos:
             return f"No public repositories found for {username}."
 
-        lines = [f"Public repositories for **{username}** ({len(repos)} shown):\n"]
+        if total > len(repos):
+            shown = f"{len(repos)} of {total} shown"
+        elif len(repos) >= GITHUB_MAX_ITEMS:
+            shown = f"first {len(repos)} shown"
+        else:
+            shown = f"{len(repos)} shown"
+        lines = [f"Public repositories for **{username}** ({shown}):\n"]
         for r in repos:
             stars = r.get("stargazers_count", 0)
             desc = r.get("description", "") or ""
@@ -489,7 +617,11 @@ def _list_github_repos(username: str = "", sort: str = "stars") -> str:
             if desc:
                 lines.append(f"  {desc}")
         return "\n".join(lines)
+    except github_graphql.GraphQLError as e:
+        tool_metrics.record_error(e)
+        return f"GitHub GraphQL error: {e}"
     except Exception as e:
+        tool_metrics.record_error(e)
         return f"Failed to list repos for {username}: {e}"
 
 
@@ -546,46 +678,15 @@ def _get_citation_stats(detail_level: str = "summary") -> str:
 # ── 7. get_pinned_repos ────────────────────────────────────────────────
 
 def _get_pinned_repos(username: str = "") -> str:
-    """Get pinned repos for a GitHub user via GraphQL API."""
+    """Get pinned repos for a GitHub user via the batched GraphQL gateway."""
     username = username or GITHUB_USERNAME
     if not GITHUB_TOKEN:
         return "GitHub token not configured. Cannot query pinned repos (requires GraphQL API)."
 
-    query = """
-    query($login: String!) {
-      user(login: $login) {
-        pinnedItems(first: 6, types: REPOSITORY) {
-          nodes {
-            ... on Repository {
-              name
-              description
-              url
-              stargazerCount
-              forkCount
-              primaryLanguage { name }
-            }
-          }
-        }
-      }
-    }
-    """
-
     try:
-        raw = _http_post(
-            "https://api.github.com/graphql",
-            data={"query": query, "variables": {"login": username}},
-            headers={
-                "Authorization": f"Bearer {GITHUB_TOKEN}",
-                "Accept": "application/json",
-            },
-            timeout=15,
-        )
-        result = json.loads(raw.decode("utf-8"))
-
-        if "errors" in result:
-            return f"GitHub GraphQL error: {result['errors'][0].get('message', 'unknown')}"
-
-        nodes = result.get("data", {}).get("user", {}).get("pinnedItems", {}).get("nodes", [])
+        nodes = github_graphql.pinned_repositories(username, GITHUB_TOKEN)
+        if nodes is None:
+            return f"GitHub user or organization '{username}' not found."
         if not nodes:
             return f"No pinned repositories found for {username}."
 
@@ -604,7 +705,11 @@ def _get_pinned_repos(username: str = "") -> str:
             if url:
                 lines.append(f"  {url}")
         return "\n".join(lines)
+    except github_graphql.GraphQLError as e:
+        tool_metrics.record_error(e)
+        return f"GitHub GraphQL error: {e}"
     except Exception as e:
+        tool_metrics.record_error(e)
         return f"Failed to get pinned repos for {username}: {e}"
 
 # ── 7.6. get_repo_contributors ────────────────────────────────────────
@@ -614,150 +719,146 @@ def _get_repo_contributors(repo: str) -> str:
     if not repo or "/" not in repo:
         return "Please provide a repo in 'owner/name' format (e.g. 'deepinsight/insightface')."
 
-    api_url = f"https://api.github.com/repos/{repo}/contributors?per_page=30"
+    api_url = f"https://api.github.com/repos/{repo}/contributors?per_page={_GITHUB_PER_PAGE}"
     headers = {"Accept": "application/vnd.github.v3+json"}
     if GITHUB_TOKEN:
         headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
 
     try:
-        raw = _http_get(api_url, headers=headers, timeout=15)
-        data = json.loads(raw.decode("utf-8"))
-
-        if not isinstance(data, list):
-            return f"Unexpected response from GitHub API for {repo} contributors."
-
-        if not data:
-            return f"No contributors found for {repo}. The repo may be empty or not exist."
-
-        lines = [f"Contributors for {repo} ({len(data)} total):\n"]
-        for i, c in enumerate(data, 1):
+        lines = []
+        for i, c in enumerate(_github_pages(api_url, headers), 1):
             login = c.get("login", "unknown")
             contribs = c.get("contributions", 0)
             profile = c.get("html_url", f"https://github.com/{login}")
-            avatar = c.get("avatar_url", "")
             lines.append(
                 f"{i}. **{login}** — {contribs} commits  "
                 f"(profile: {profile})"
             )
-        return "\n".join(lines)
+
+        if not lines:
+            return f"No contributors found for {repo}. The repo may be empty or not exist."
+
+        count = f"first {len(lines)}" if len(lines) >= GITHUB_MAX_ITEMS else f"{len(lines)} total"
+        return "\n".join([f"Contributors for {repo} ({count}):\n"] + lines)
+    except ValueError as e:
+        tool_metrics.record_error(e)
+        return f"Unexpected response from GitHub API for {repo} contributors."
     except HTTPError as e:
+        tool_metrics.record_error(e)
         if e.code == 404:
             return f"Repository '{repo}' not found on GitHub."
         return f"GitHub API error for {repo} contributors: HTTP {e.code}"
     except Exception as e:
+        tool_metrics.record_error(e)
         return f"Failed to get contributors for {repo}: {e}"
 
 # ── 7.5. search_site_pages ─────────────────────────────────────────────
 
 def _search_site_pages(query: str) -> str:
     """Search all site pages by keyword and return matching excerpts."""
-    query_lower = query.lower()
-    query_terms = [t for t in re.split(r'\W+', query_lower) if t]
-    if not query_terms:
+    if not query.strip():
         return "Please provide a search query."
 
-    results = []
-
-    # Collect all HTML files: index.html + pages/*.html
-    html_files = []
-    index_path = os.path.join(_ROOT_DIR, "index.html")
-    if os.path.exists(index_path):
-        html_files.append(("index", index_path))
-    if os.path.isdir(_PAGES_DIR):
-        for fname in os.listdir(_PAGES_DIR):
-            if fname.endswith(".html") and fname != "chat.html":
-                html_files.append((fname.replace(".html", ""), os.path.join(_PAGES_DIR, fname)))
-
-    for page_name, filepath in html_files:
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                html = f.read()
-            # Extract title
-            title_match = re.search(r'<title>(.*?)</title>', html, re.IGNORECASE)
-            title = title_match.group(1) if title_match else page_name
-            # Strip script/style/tags
-            clean = re.sub(r'<script[^>]*>[\s\S]*?</script>', '', html)
-            clean = re.sub(r'<style[^>]*>[\s\S]*?</style>', '', clean)
-            clean = re.sub(r'<[^>]+>', ' ', clean)
-            clean = re.sub(r'\s+', ' ', clean).strip()
-            clean_lower = clean.lower()
-            # Score: count term hits, bonus for title match
-            score = sum(clean_lower.count(term) for term in query_terms)
-            title_lower = title.lower()
-            score += sum(10 for term in query_terms if term in title_lower)
-            if score > 0:
-                # Extract a relevant snippet around the first match
-                snippet = ""
-                for term in query_terms:
-                    idx = clean_lower.find(term)
-                    if idx >= 0:
-                        start = max(0, idx - 100)
-                        end = min(len(clean), idx + len(term) + 200)
-                        snippet = "..." + clean[start:end].strip() + "..."
-                        break
-                results.append((score, page_name, title, snippet))
-        except Exception:
-            continue
-
-    results.sort(key=lambda x: x[0], reverse=True)
-    top = results[:8]
+    try:
+        top = site_pages.search(query, limit=8)
+    except Exception as e:
+        tool_metrics.record_error(e)
+        return f"Failed to search site pages for '{query}': {e}"
 
     if not top:
         return f"No site pages found matching '{query}'."
 
     lines = [f"Found {len(top)} page(s) matching '{query}':\n"]
-    for _score, page_name, title, snippet in top:
-        page_url = f"/pages/{page_name}.html" if page_name != "index" else "/index.html"
-        lines.append(f"**{title}** ({page_url})")
-        if snippet:
-            lines.append(f"  {snippet}")
+    for r in top:
+        lines.append(f"**{r['title']}** ({r['url']})")
+        if r["heading"]:
+            lines.append(f"  Section: {r['heading']}")
+        if r["snippet"]:
+            lines.append(f"  ...{r['snippet']}...")
         lines.append("")
     return "\n".join(lines)
 
 
 # ── 6. read_site_page ───────────────────────────────────────────────────
 
-def _read_site_page(page_name: str) -> str:
-    """Read an HTML page from the site and extract text content."""
-    page_name = page_name.strip().lower().replace(".html", "")
+# Longest text returned by one read; longer pages/sections are cut with a
+# pointer to the offset to continue from
+_PAGE_READ_CHARS = 6000
 
-    if page_name == "index":
-        filepath = os.path.join(_ROOT_DIR, "index.html")
-    else:
-        filepath = os.path.join(_PAGES_DIR, f"{page_name}.html")
-
-    if not os.path.exists(filepath):
-        available = [
-            f.replace(".html", "")
-            for f in os.listdir(_PAGES_DIR)
-            if f.endswith(".html")
-        ]
-        return (
-            f"Page '{page_name}' not found. Available pages: "
-            + ", ".join(sorted(available))
-            + ", index"
-        )
 
+def _int_arg(value, name):
+    """Parse a whole-number tool argument the model may send as a number or string."""
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a whole number, got {value!r}")
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            html = f.read()
-
-        # Extract title
-        title_match = re.search(r'<title>(.*?)</title>', html, re.IGNORECASE)
-        title = title_match.group(1) if title_match else page_name
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number, got {value!r}") from None
+    if not number.is_integer():
+        raise ValueError(f"{name} must be a whole number, got {value!r}")
+    return int(number)
 
-        # Strip script and style tags, then HTML tags
-        clean = re.sub(r'<script[^>]*>[\s\S]*?</script>', '', html)
-        clean = re.sub(r'<style[^>]*>[\s\S]*?</style>', '', clean)
-        clean = re.sub(r'<[^>]+>', ' ', clean)
-        clean = re.sub(r'\s+', ' ', clean).strip()
 
-        if len(clean) > 6000:
-            clean = clean[:6000] + "... [page content truncated]"
+def _read_site_page(page_name: str, section=None, list_sections: bool = False,
+                    offset=None, length=None) -> str:
+    """Read a site page: its outline, one section, a character range, or the start."""
+    page_name = page_name.strip().lower().replace(".html", "")
 
-        return f"Page: {title}\n\n{clean}"
+    try:
+        page = site_pages.get_page(page_name)
     except Exception as e:
+        tool_metrics.record_error(e)
         return f"Failed to read page '{page_name}': {e}"
+    if page is None:
+        return (
+            f"Page '{page_name}' not found. Available pages: "
+            + ", ".join(sorted(site_pages.page_names()))
+        )
+
+    title, text = page["title"], page["text"]
+    if list_sections:
+        lines = [f"Page: {title} ({len(text)} chars)\n", "Sections:"]
+        for s in site_pages.outline(page):
+            indent = "  " * max(0, s["level"] - 1)
+            heading = s["heading"] or "(introduction)"
+            lines.append(f"{s['number']}. {indent}{heading}  [chars {s['start']}-{s['end']}]")
+        if len(lines) == 2:
+            lines.append("(no headings — read by offset instead)")
+        lines.append("\nRead one with section=<number or heading>, or a range with offset/length.")
+        return "\n".join(lines)
+
+    if section not in (None, ""):
+        found = site_pages.find_section(page, section)
+        if found is None:
+            return (
+                f"Section '{section}' not found on page '{page_name}'. "
+                "Use list_sections=true to see the available sections."
+            )
+        start, end = found["start"], found["end"]
+        header = f"Page: {title} — {found['heading'] or '(introduction)'}"
+    elif offset is not None or length is not None:
+        try:
+            start = max(0, _int_arg(offset or 0, "offset"))
+            length = _int_arg(length or _PAGE_READ_CHARS, "length")
+        except ValueError as e:
+            tool_metrics.record_error("InvalidArguments")
+            return f"Error: {e}."
+        if length <= 0:
+            tool_metrics.record_error("InvalidArguments")
+            return f"Error: length must be positive, got {length}."
+        end = start + min(length, _PAGE_READ_CHARS)
+        header = f"Page: {title} (chars {start}-{min(end, len(text))} of {len(text)})"
+    else:
+        start, end = 0, len(text)
+        header = f"Page: {title}"
+
+    body = text[start:end].strip()
+    if end - start > _PAGE_READ_CHARS:
+        body = text[start:start + _PAGE_READ_CHARS].strip() + (
+            f"... [truncated; {len(text)} chars total — continue with "
+            f"offset={start + _PAGE_READ_CHARS}, or use list_sections=true to read one section]"
+        )
+    return f"{header}\n\n{body}"
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -765,7 +866,10 @@ def _read_site_page(page_name: str) -> str:
 # ═══════════════════════════════════════════════════════════════════════════
 
 _TOOL_MAP = {
-    "search_publications": lambda args: _search_publications(args.get("query", "")),
+    "search_publications": lambda args: _search_publications(
+        args.get("query", ""), args.get("year"), args.get("venue"),
+        args.get("has_code"), args.get("has_media"),
+    ),
     "fetch_webpage": lambda args: _fetch_webpage(args.get("url", "")),
     "search_github_repo": lambda args: _search_github_repo(
         args.get("repo", ""), args.get("path", "")
@@ -776,7 +880,10 @@ _TOOL_MAP = {
     "get_citation_stats": lambda args: _get_citation_stats(
         args.get("detail_level", "summary")
     ),
-    "read_site_page": lambda args: _read_site_page(args.get("page_name", "")),
+    "read_site_page": lambda args: _read_site_page(
+        args.get("page_name", ""), args.get("section"), args.get("list_sections", False),
+        args.get("offset"), args.get("length"),
+    ),
     "search_site_pages": lambda args: _search_site_pages(args.get("query", "")),
     "get_pinned_repos": lambda args: _get_pinned_repos(args.get("username", "")),
     "get_repo_contributors": lambda args: _get_repo_contributors(args.get("repo", "")),
@@ -795,24 +902,110 @@ TOOL_DISPLAY = {
     "get_repo_contributors": {"icon": "👥", "label": "Fetching contributors"},
 }
 
-def execute_tool(name: str, arguments_json: str) -> str:
-    """Execute a tool by name. Returns the result string.
+# ── Single-flight coalescing ─────────────────────────────────────────────
+# Identical tool calls that arrive while one is already running (several
+# visitors asking about the same paper at once) wait for that execution and
+# share its result instead of each going to the network.  Nothing is cached
+# after the call completes; the per-tool caches handle that.
+
+class _Flight:
+    """One in-flight tool execution that later identical calls wait on."""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_flight_counts = {"executed": 0, "coalesced": 0}
+
+
+def _flight_key(name, args):
+    """Tool name plus canonicalized arguments."""
+    if name == "fetch_webpage" and isinstance(args.get("url"), str):
+        args = {**args, "url": webpage_cache.canonical_url(args["url"])}
+    return name, json.dumps(args, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def single_flight_stats():
+    """Return ``{"executed", "coalesced", "in_flight"}`` counters."""
+    with _inflight_lock:
+        return {**_flight_counts, "in_flight": len(_inflight)}
 
-    Args:
-        name: Tool function name.
-        arguments_json: JSON string of arguments.
-    """
-    func = _TOOL_MAP.get(name)
-    if func is None:
-        return f"Unknown tool: {name}"
 
+def metrics():
+    """Return the counters of the tool layer: per-tool metrics, HTTP pool, caches and GitHub quota."""
+    return {
+        "tools": tool_metrics.stats(),
+        "http": http_client.stats(),
+        "github_quota": github_quota.stats(),
+        "github_cache": github_cache.stats(),
+        "github_graphql": github_graphql.stats(),
+        "webpage_cache": webpage_cache.stats(),
+        "single_flight": single_flight_stats(),
+        "rag": rag_utils.cache_stats(),
+    }
+
+
+def _run_tool(name, func, arguments_json):
+    """Parse the arguments and run *func*, sharing the execution with identical concurrent calls."""
     try:
         args = json.loads(arguments_json) if arguments_json else {}
     except json.JSONDecodeError:
+        args = None
+    if not isinstance(args, dict):
+        tool_metrics.record_error("InvalidArguments")
         return f"Invalid arguments JSON for tool {name}."
 
+    key = _flight_key(name, args)
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+            _flight_counts["executed"] += 1
+        else:
+            _flight_counts["coalesced"] += 1
+    if not leader:
+        tool_metrics.cache_hit("single_flight")
+        flight.done.wait()
+        return flight.result
+
     try:
-        return func(args)
+        flight.result = func(args)
     except Exception as e:
         logger.exception(f"Tool execution error: {name}")
-        return f"Tool '{name}' failed: {e}"
+        tool_metrics.record_error(e)
+        flight.result = f"Tool '{name}' failed: {e}"
+    finally:
+        if flight.result is None:
+            flight.result = f"Tool '{name}' failed."
+        with _inflight_lock:
+            del _inflight[key]
+        flight.done.set()
+    return flight.result
+
+
+def execute_tool(name: str, arguments_json: str, calls=None) -> str:
+    """Execute a tool by name. Returns the result string.
+
+    Concurrent calls with the same name and arguments share one execution.
+    Every call is measured (see tool_metrics).
+
+    Args:
+        name: Tool function name.
+        arguments_json: JSON string of arguments.
+        calls: Optional list; the call's metrics record is appended to it.
+    """
+    func = _TOOL_MAP.get(name)
+    if func is None:
+        return f"Unknown tool: {name}"
+
+    with tool_metrics.measure(name) as call:
+        result = call["result"] = _run_tool(name, func, arguments_json)
+    if calls is not None:
+        calls.append(call)
+    return result
@@ -0,0 +1,189 @@
+"""
+Two-tier cache for ``fetch_webpage`` results.
+
+The system prompt sends the model to the same arXiv abstract pages every
+time paper authors come up, and each fetch means a download plus a
+trafilatura pass.  This caches the *extracted* text (never raw HTML), keyed
+by the canonicalized URL, in a bounded in-process LRU and — when
+``POSTGRES_URL`` is set — in the ``webpage_cache`` table (see schema.sql),
+so it survives cold starts.  How long an entry stays valid depends on the
+domain: arXiv abstracts practically never change, GitHub pages do.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import tool_metrics
+from cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds an extracted page stays valid, by domain (subdomains included;
+# first match wins)
+_DOMAIN_TTLS = (
+    ("arxiv.org", 7 * 86400),
+    ("openreview.net", 86400),
+    ("aclanthology.org", 7 * 86400),
+    ("openaccess.thecvf.com", 7 * 86400),
+    ("scholar.google.com", 6 * 3600),
+    ("github.com", 3600),
+)
+_DEFAULT_TTL = 6 * 3600
+# Query parameters that never change the page content
+_TRACKING_PARAMS = frozenset({"fbclid", "gclid", "ref", "ref_src"})
+
+_MEMORY = LRUCache(128)
+_DB_ENABLED = bool(os.getenv("POSTGRES_URL")) and os.getenv("WEBPAGE_CACHE_DB", "1") != "0"
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def canonical_url(url):
+    """Normalize *url* so trivially different spellings share one entry.
+
+    Lower-cases scheme and host, drops default ports, fragments and tracking
+    parameters (``utm_*``, ``fbclid``, ...) and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www.") and host.endswith("arxiv.org"):
+        host = host[4:]
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.startswith("utm_") and k not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def _ttl(canonical):
+    host = urlsplit(canonical).hostname or ""
+    return next(
+        (ttl for domain, ttl in _DOMAIN_TTLS if host == domain or host.endswith("." + domain)),
+        _DEFAULT_TTL,
+    )
+
+
+def _count(outcome):
+    with _counts_lock:
+        _counts[outcome] += 1
+
+
+def stats():
+    """Return hit/miss counters per tier and the overall hit rate."""
+    with _counts_lock:
+        counts = dict(_counts)
+    lookups = sum(counts.values())
+    hits = counts.get("memory_hits", 0) + counts.get("db_hits", 0)
+    return {
+        **counts,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "memory": _MEMORY.stats(),
+    }
+
+
+# ── Postgres tier ────────────────────────────────────────────────────
+# Set once the table has been created by this process
+_table_ready = False
+
+
+def _ensure_cache_table(conn):
+    """Create the webpage_cache table if it doesn't exist (once per process)."""
+    global _table_ready
+    if _table_ready:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS webpage_cache (
+                url TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                fetched_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+        conn.commit()
+    _table_ready = True
+
+
+def _db_get(canonical, ttl):
+    """Return ``(content, fetched_at)`` if Postgres has a fresh entry, else None."""
+    if not _DB_ENABLED:
+        return None
+    from db_utils import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        _ensure_cache_table(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT content, EXTRACT(EPOCH FROM NOW() - fetched_at) AS age
+                   FROM webpage_cache WHERE url = %s""",
+                (canonical,),
+            )
+            row = cur.fetchone()
+        if row and float(row["age"]) < ttl:
+            return row["content"], time.time() - float(row["age"])
+    except Exception as e:
+        logger.warning(f"Webpage cache read failed: {e}")
+    finally:
+        conn.close()
+    return None
+
+
+def _db_put(canonical, content):
+    """Upsert an entry into Postgres; failures only log."""
+    if not _DB_ENABLED:
+        return
+    from db_utils import get_db_connection
+
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        _ensure_cache_table(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """INSERT INTO webpage_cache (url, content, fetched_at)
+                   VALUES (%s, %s, NOW())
+                   ON CONFLICT (url) DO UPDATE SET content = EXCLUDED.content, fetched_at = NOW()""",
+                (canonical, content),
+            )
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Webpage cache write failed: {e}")
+    finally:
+        conn.close()
+
+
+# ── public API ───────────────────────────────────────────────────────
+def get(url):
+    """Return the cached extracted content for *url*, or None if absent or expired."""
+    canonical = canonical_url(url)
+    ttl = _ttl(canonical)
+    entry = _MEMORY.get(canonical)
+    if entry is not None and time.time() - entry[1] < ttl:
+        _count("memory_hits")
+        tool_metrics.cache_hit("webpage_cache")
+        return entry[0]
+    entry = _db_get(canonical, ttl)
+    if entry is not None:
+        _MEMORY.put(canonical, entry)
+        _count("db_hits")
+        tool_metrics.cache_hit("webpage_cache")
+        return entry[0]
+    _count("misses")
+    return None
+
+
+def put(url, content):
+    """Cache the extracted *content* of *url* in both tiers."""
+    canonical = canonical_url(url)
+    _MEMORY.put(canonical, (content, time.time()))
+    _db_put(canonical, content)
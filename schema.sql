@@ -35,6 +35,37 @@ COMMENT ON COLUMN scholar_cache.key IS '缓存键（如 citations）';
 COMMENT ON COLUMN scholar_cache.value IS '缓存值（如引用次数）';
 COMMENT ON COLUMN scholar_cache.updated_at IS '最后更新时间';
 
+-- GitHub API 响应缓存表（ETag / Last-Modified 条件请求）
+CREATE TABLE IF NOT EXISTS github_cache (
+  key VARCHAR(64) PRIMARY KEY,
+  url TEXT NOT NULL,
+  etag TEXT,
+  last_modified TEXT,
+  body BYTEA NOT NULL,
+  link TEXT,
+  fetched_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE github_cache IS 'GitHub API 响应缓存表';
+COMMENT ON COLUMN github_cache.key IS '缓存键（方法、URL、认证信息与请求体的 SHA-256）';
+COMMENT ON COLUMN github_cache.etag IS '响应的 ETag，用于 If-None-Match 重新验证';
+COMMENT ON COLUMN github_cache.last_modified IS '响应的 Last-Modified，用于 If-Modified-Since 重新验证';
+COMMENT ON COLUMN github_cache.body IS '响应体原文';
+COMMENT ON COLUMN github_cache.link IS '响应的 Link 头（分页列表的 next/last 页地址）';
+COMMENT ON COLUMN github_cache.fetched_at IS '最后一次从 GitHub 获取或重新验证的时间';
+
+-- fetch_webpage 提取结果缓存表
+CREATE TABLE IF NOT EXISTS webpage_cache (
+  url TEXT PRIMARY KEY,
+  content TEXT NOT NULL,
+  fetched_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE webpage_cache IS 'fetch_webpage 网页提取结果缓存表';
+COMMENT ON COLUMN webpage_cache.url IS '规范化后的 URL';
+COMMENT ON COLUMN webpage_cache.content IS '提取后的 Markdown 文本（不存原始 HTML）';
+COMMENT ON COLUMN webpage_cache.fetched_at IS '抓取时间（按域名 TTL 判断是否过期）';
+
 CREATE TABLE IF NOT EXISTS visitor_logs (
   id SERIAL PRIMARY KEY,
   ip_anonymized VARCHAR(45) NOT NULL,
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality and latency benchmark for api/rag_utils.py.
+
+Measures, for the current working tree:
+  1. Quality: recall@1/3/5 and MRR of search() over the labeled Chinese,
+     English and mixed queries in scripts/rag_eval_queries.yaml
+  2. Latency: p50/p99 of uncached search() on the real knowledge base
+  3. Scale:   index build time and p50/p99 retrieval latency over synthetic
+     corpora that replicate research_data.yaml 10x-1000x
+
+Results are written as JSON (tagged with the git commit) so a tokenizer or
+scoring change can be compared against the previous commit's numbers.
+
+Usage:
+    python scripts/bench_rag.py                          # -> rag_bench.json
+    python scripts/bench_rag.py --scales 10 100 --out before.json
+    python scripts/bench_rag.py --compare before.json    # print deltas
+    python scripts/bench_rag.py --scoring bm25 --no-hybrid
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "api"))
+
+import rag_utils
+
+QUERIES_YAML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_eval_queries.yaml")
+RECALL_AT = (1, 3, 5)
+# Fraction of summary words replaced in each synthetic copy, so copies do
+# not collapse into identical postings
+SYNTHETIC_NOISE = 0.2
+
+
+# === Helpers ===
+def _doc_label(doc):
+    if doc.get("type") == "site_page":
+        return f"page:{doc['page']}"
+    return doc.get("title") or doc.get("name") or ""
+
+
+def _matches(label, doc_label):
+    if label.startswith("page:"):
+        return label == doc_label
+    return doc_label.startswith(label)
+
+
+def _percentiles(samples_ns):
+    ordered = sorted(samples_ns)
+
+    def pct(p):
+        # Nearest-rank percentile
+        idx = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[idx] / 1e6, 4)
+
+    return {"p50_ms": pct(50), "p99_ms": pct(99), "n": len(ordered)}
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def load_queries(path=QUERIES_YAML):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)["queries"]
+
+
+# === 1. Quality ===
+def evaluate_quality(queries, scoring, hybrid):
+    """Recall@k and MRR of search() over the labeled queries, overall and per language."""
+    k_max = max(RECALL_AT)
+    per_query = []
+    for q in queries:
+        results = rag_utils.search(q["query"], top_k=k_max, scoring=scoring, hybrid=hybrid)
+        labels = [_doc_label(r) for r in results]
+        relevant = q["relevant"]
+        first_hit = next(
+            (rank for rank, dl in enumerate(labels, 1) if any(_matches(l, dl) for l in relevant)), None
+        )
+        row = {"query": q["query"], "lang": q.get("lang", ""), "top": labels, "rr": 1 / first_hit if first_hit else 0.0}
+        for k in RECALL_AT:
+            found = sum(1 for l in relevant if any(_matches(l, dl) for dl in labels[:k]))
+            row[f"recall@{k}"] = found / len(relevant)
+        per_query.append(row)
+
+    def summarize(rows):
+        if not rows:
+            return {}
+        out = {f"recall@{k}": round(sum(r[f"recall@{k}"] for r in rows) / len(rows), 4) for k in RECALL_AT}
+        out["mrr"] = round(sum(r["rr"] for r in rows) / len(rows), 4)
+        out["n"] = len(rows)
+        return out
+
+    langs = sorted({r["lang"] for r in per_query})
+    return {
+        "overall": summarize(per_query),
+        "by_lang": {lang: summarize([r for r in per_query if r["lang"] == lang]) for lang in langs},
+        "queries": per_query,
+    }
+
+
+# === 2. Latency on the real knowledge base ===
+def measure_search_latency(queries, scoring, hybrid, repeat):
+    rag_utils.search("warm up", scoring=scoring, hybrid=hybrid)
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            rag_utils._SEARCH_CACHE.clear()
+            t0 = time.perf_counter_ns()
+            rag_utils.search(q["query"], scoring=scoring, hybrid=hybrid)
+            samples.append(time.perf_counter_ns() - t0)
+    return {"n_docs": len(rag_utils._load_knowledge_base()), **_percentiles(samples)}
+
+
+# === 3. Synthetic corpora ===
+def synthetic_data(data, scale, seed=0):
+    """Replicate publications and projects *scale* times with perturbed text."""
+    rng = random.Random(seed)
+    vocab = sorted({
+        w for item in data.get("publications", []) + data.get("github_projects", [])
+        for w in str(item.get("summary") or item.get("description") or "").split()
+    }) or ["token"]
+
+    def perturb(text):
+        words = str(text or "").split()
+        return " ".join(rng.choice(vocab) if rng.random() < SYNTHETIC_NOISE else w for w in words)
+
+    out = {"publications": [], "github_projects": []}
+    for copy in range(scale):
+        for pub in data.get("publications", []):
+            out["publications"].append({
+                **pub,
+                "title": f"{pub.get('title', '')} #{copy}",
+                "summary": perturb(pub.get("summary")),
+            })
+        for proj in data.get("github_projects", []):
+            out["github_projects"].append({
+                **proj,
+                "name": f"{proj.get('name', '')} #{copy}",
+                "description": perturb(proj.get("description")),
+            })
+    return out
+
+
+def measure_scale(data, queries, scale, scoring, hybrid, top_k=3):
+    docs = rag_utils._build_documents(synthetic_data(data, scale))
+    t0 = time.perf_counter()
+    index = rag_utils._build_index(docs)
+    rag_utils._attach_matrices(docs, index)
+    build_s = time.perf_counter() - t0
+    use_dense = hybrid and "dense" in index and rag_utils._numpy() is not None
+
+    texts = [q["query"] for q in queries if rag_utils._tokenize(q["query"])]
+    token_lists = [rag_utils._tokenize(text) for text in texts]
+    limit = top_k * rag_utils._PASSAGE_OVERFETCH
+    rag_utils._retrieve(docs, index, token_lists[:1], texts[:1], limit, 0.5, scoring, use_dense)  # warm up
+    samples = []
+    for tokens, text in zip(token_lists, texts):
+        t0 = time.perf_counter_ns()
+        rag_utils._retrieve(docs, index, [tokens], [text], limit, 0.5, scoring, use_dense)
+        samples.append(time.perf_counter_ns() - t0)
+
+    t0 = time.perf_counter()
+    rag_utils._retrieve(docs, index, token_lists, texts, limit, 0.5, scoring, use_dense)
+    batch_ms = (time.perf_counter() - t0) * 1000
+    return {
+        "scale": scale,
+        "n_docs": len(docs),
+        "build_s": round(build_s, 3),
+        **_percentiles(samples),
+        "batch_ms": round(batch_ms, 3),
+    }
+
+
+# === Reporting ===
+def compare(old, new):
+    """Print metric deltas between two result files."""
+    def row(name, a, b):
+        if a is None or b is None:
+            return
+        print(f"  {name:<28} {a:>10} -> {b:<10} ({b - a:+.4f})")
+
+    print(f"Comparing {old.get('commit')} -> {new.get('commit')}")
+    for key in ("recall@1", "recall@3", "recall@5", "mrr"):
+        row(key, old["quality"]["overall"].get(key), new["quality"]["overall"].get(key))
+    for key in ("p50_ms", "p99_ms"):
+        row(f"search {key}", old["latency"].get(key), new["latency"].get(key))
+    old_scales = {s["scale"]: s for s in old.get("scales", [])}
+    for s in new.get("scales", []):
+        o = old_scales.get(s["scale"])
+        if o:
+            for key in ("build_s", "p50_ms", "p99_ms"):
+                row(f"{s['scale']}x {key}", o.get(key), s.get(key))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="rag_bench.json", help="where to write the JSON results")
+    parser.add_argument("--scales", type=int, nargs="*", default=[10, 100, 1000],
+                        help="synthetic corpus multipliers (default: 10 100 1000)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes over the query set")
+    parser.add_argument("--scoring", default=rag_utils._DEFAULT_SCORING, choices=["bm25f", "bm25"])
+    parser.add_argument("--no-hybrid", action="store_true", help="disable dense retrieval + RRF")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="print deltas against an earlier run")
+    args = parser.parse_args()
+    hybrid = not args.no_hybrid
+
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+
+    queries = load_queries()
+    t0 = time.perf_counter()
+    rag_utils._kb_snapshot()
+    load_s = time.perf_counter() - t0
+
+    result = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": numpy_version,
+        "config": {"scoring": args.scoring, "hybrid": hybrid, "recall_at": list(RECALL_AT)},
+        "kb_load_s": round(load_s, 3),
+        "quality": evaluate_quality(queries, args.scoring, hybrid),
+        "latency": measure_search_latency(queries, args.scoring, hybrid, args.repeat),
+        "scales": [],
+    }
+    q = result["quality"]["overall"]
+    print(f"quality  recall@1={q['recall@1']} recall@3={q['recall@3']} "
+          f"recall@5={q['recall@5']} mrr={q['mrr']} (n={q['n']})")
+    lat = result["latency"]
+    print(f"search   p50={lat['p50_ms']}ms p99={lat['p99_ms']}ms over {lat['n_docs']} docs")
+
+    data = rag_utils.load_research_data()
+    for scale in args.scales:
+        s = measure_scale(data, queries, scale, args.scoring, hybrid)
+        result["scales"].append(s)
+        print(f"{scale:>5}x   {s['n_docs']} docs  build={s['build_s']}s  "
+              f"p50={s['p50_ms']}ms p99={s['p99_ms']}ms  batch={s['batch_ms']}ms")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
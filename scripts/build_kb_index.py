@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Compile data/research_data.yaml and the site pages into the binary RAG artifact.
+
+The API modules (rag_utils, tools) mmap data/research_data.kbidx on cold
+start instead of running PyYAML and parsing every page.  The artifact is not
+checked in: the Vercel build runs this script (``npm run build:kb``).  It
+embeds a content hash of its sources, so a missing or stale artifact is
+ignored and the sources are parsed instead (with a warning when stale).
+
+Usage:
+    python scripts/build_kb_index.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import rag_utils
+
+
+def main():
+    path = os.path.abspath(rag_utils.build_artifact())
+    print(f"Wrote {path} ({os.path.getsize(path):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
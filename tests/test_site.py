@@ -183,6 +183,45 @@ class TestRagTokenizer:
         # Chinese expansion should also be present
         assert "face" in tokens or "recognition" in tokens
 
+    def test_overlapping_chinese_terms_all_found(self):
+        from rag_utils import _match_zh_terms
+
+        # "预训练" contains "训练"; "多模态大模型" contains three entries
+        assert _match_zh_terms("多模态大模型预训练") == ["多模态", "大模型", "预训练", "训练"]
+        assert _match_zh_terms("没有词典词") == []
+
+    def test_exact_entry_not_split(self):
+        from rag_utils import _tokenize
+
+        tokens = _tokenize("预训练")
+        assert "pretraining" in tokens
+        assert "training" not in tokens
+
+    def test_cjk_bigrams(self):
+        from rag_utils import _tokenize
+
+        tokens = _tokenize("新浪财经的报道")
+        assert {"新浪", "浪财", "财经"} <= set(tokens)
+        # Bigrams across a stop character are not emitted
+        assert "经的" not in tokens and "的报" not in tokens
+
+    def test_cjk_runs_split_at_stop_words(self):
+        from rag_utils import _index_tokens, _tokenize
+
+        # Neither the whole run nor bigrams across a stop word ("文有") survive
+        assert _tokenize("安翔的论文有哪些") == ["安翔", "论文", "paper"]
+        assert _index_tokens("安翔的论文有哪些") == ["安翔", "论文"]
+
+    def test_unsegmented_chinese_query_matches(self):
+        from rag_utils import search
+
+        results = search("新浪财经的报道")
+        assert results
+        assert any(
+            ml.get("name") == "新浪财经"
+            for ml in results[0].get("media_links", [])
+        )
+
 
 class TestRagSearch:
     """Test rag_utils.search on the real knowledge base."""
@@ -221,6 +260,542 @@ class TestRagSearch:
         assert results == [], f"Unexpected results for nonsense query: {results}"
 
 
+class TestRagIndex:
+    """Test the inverted index built by rag_utils._load_knowledge_base."""
+
+    def test_postings_match_document_term_counts(self):
+        from collections import Counter
+
+        from rag_utils import _index_tokens, _load_index, _load_knowledge_base
+
+        docs = _load_knowledge_base()
+        index = _load_index()
+        assert index["n_docs"] == len(docs)
+        for doc_id, d in enumerate(docs):
+            tokens = _index_tokens(d["_searchable"])
+            assert index["doc_len"][doc_id] == len(tokens)
+            for term, f in Counter(tokens).items():
+                doc_ids, tfs = index["postings"][term]
+                assert tfs[list(doc_ids).index(doc_id)] == f
+
+    def test_idf_decreases_with_document_frequency(self):
+        from rag_utils import _load_index
+
+        index = _load_index()
+        by_df = sorted(index["postings"], key=lambda t: len(index["postings"][t][0]))
+        rare, common = by_df[0], by_df[-1]
+        assert index["idf"][rare] > index["idf"][common]
+
+
+class TestRagTopK:
+    """Test the MaxScore top-k engine against exhaustive BM25 scoring."""
+
+    def test_matches_exhaustive_scoring(self):
+        import random
+
+        from rag_utils import _bm25_term_score, _build_index, _top_k
+
+        rng = random.Random(0)
+        vocab = [f"w{i}" for i in range(40)]
+        for _ in range(100):
+            docs = [
+                {"id": i, "_searchable": " ".join(rng.choices(vocab[: rng.randint(5, 40)], k=rng.randint(1, 30)))}
+                for i in range(rng.randint(1, 50))
+            ]
+            index = _build_index(docs)
+            query = rng.choices(vocab, k=rng.randint(1, 5))
+            top_k = rng.randint(1, 8)
+            min_score = rng.choice([0.0, 0.5, 3.0])
+
+            scores = {}
+            for t in query:
+                for doc_id, f in zip(*index["postings"].get(t, ((), ()))):
+                    scores[doc_id] = scores.get(doc_id, 0.0) + _bm25_term_score(
+                        f, index["doc_len"][doc_id], index["avg_dl"], index["idf"][t]
+                    )
+            expected = sorted(
+                (doc_id for doc_id, s in scores.items() if s >= min_score),
+                key=lambda d: (-scores[d], d),
+            )[:top_k]
+
+            results = _top_k(docs, index, query, top_k, min_score, scoring="bm25")
+            assert [r["id"] for r in results] == expected
+            for r, d in zip(results, expected):
+                assert r["_score"] == pytest.approx(scores[d])
+
+
+class TestRagSearchMany:
+    """Test batch scoring on the CSR term matrix (rag_utils.search_many)."""
+
+    def test_batch_matches_maxscore(self):
+        import random
+
+        pytest.importorskip("numpy")
+        from rag_utils import _build_index, _top_k, _top_k_batch
+
+        rng = random.Random(1)
+        vocab = [f"w{i}" for i in range(40)]
+        for _ in range(30):
+            docs = [
+                {"id": i, "_searchable": " ".join(rng.choices(vocab[: rng.randint(5, 40)], k=rng.randint(1, 30)))}
+                for i in range(rng.randint(1, 50))
+            ]
+            index = _build_index(docs)
+            queries = [rng.choices(vocab, k=rng.randint(1, 5)) for _ in range(8)]
+            top_k = rng.randint(1, 8)
+            min_score = rng.choice([0.0, 0.5, 3.0])
+            for scoring in ("bm25", "bm25f"):
+                batch = _top_k_batch(docs, index, queries, top_k, min_score, scoring)
+                for query, results in zip(queries, batch):
+                    expected = _top_k(docs, index, query, top_k, min_score, scoring)
+                    assert [r["id"] for r in results] == [r["id"] for r in expected]
+                    for r, e in zip(results, expected):
+                        assert r["_score"] == pytest.approx(e["_score"])
+
+    def test_search_many_matches_search(self):
+        import rag_utils
+
+        queries = ["Partial FC", "", "多模态大模型", "Partial FC", "GRPO"]
+        batch = rag_utils.search_many(queries)
+        assert batch[1] == []
+        assert [r["_doc_key"] for r in batch[0]] == [r["_doc_key"] for r in batch[3]]
+        for query, results in zip(queries, batch):
+            assert [r["_doc_key"] for r in results] == [r["_doc_key"] for r in rag_utils.search(query)]
+
+
+class TestRagHybrid:
+    """Test dense n-gram retrieval and reciprocal rank fusion."""
+
+    def test_dense_vectors_are_unit_length(self):
+        np = pytest.importorskip("numpy")
+        from rag_utils import _DENSE_DIM, _load_index, _load_knowledge_base
+
+        dense = np.asarray(_load_index()["dense"]).reshape(-1, _DENSE_DIM)
+        assert len(dense) == len(_load_knowledge_base())
+        assert np.allclose(np.linalg.norm(dense, axis=1), 1, atol=1e-5)
+
+    def test_rrf_rewards_agreement(self):
+        from rag_utils import _fuse
+
+        docs = [{"id": i} for i in range(4)]
+        lexical = [{"id": 0, "_doc_id": 0}, {"id": 1, "_doc_id": 1}]
+        dense = [(1, 0.9), (3, 0.8)]
+        fused = _fuse(docs, lexical, dense, limit=3)
+        assert [r["id"] for r in fused] == [1, 0, 3]
+
+    def test_weak_dense_only_hits_are_dropped(self):
+        from rag_utils import _DENSE_ONLY_MIN_SIM, _fuse
+
+        docs = [{"id": i} for i in range(3)]
+        lexical = [{"id": 0, "_doc_id": 0}]
+        dense = [(1, _DENSE_ONLY_MIN_SIM - 0.01), (0, 0.26), (2, _DENSE_ONLY_MIN_SIM)]
+        # A lexical hit keeps any dense boost; dense-only doc 1 is too weak
+        assert [r["id"] for r in _fuse(docs, lexical, dense, limit=3)] == [0, 2]
+
+    def test_dense_side_embeds_the_query_text(self):
+        pytest.importorskip("numpy")
+        from rag_utils import search
+
+        # Sorted tokens would scramble the trigrams and bury the only paper
+        # with 新浪财经 media coverage
+        results = search("新浪财经报道过哪篇论文")
+        assert results and results[0]["title"].startswith("UniViT")
+
+    def test_misspelling_found_by_dense_side(self):
+        pytest.importorskip("numpy")
+        from rag_utils import search
+
+        assert search("insigthface", hybrid=False) == []
+        results = search("insigthface")
+        assert results and "InsightFace" in (results[0].get("title") or results[0].get("name"))
+
+
+class TestRagBM25F:
+    """Test field-weighted BM25F scoring."""
+
+    def _docs(self):
+        filler = "lorem ipsum dolor sit amet " * 20
+        return [
+            {"id": "summary", "_fields": {"title": "other paper", "summary": f"codec {filler}"}},
+            {"id": "title", "_fields": {"title": "codec paper", "summary": filler}},
+        ]
+
+    def test_title_match_beats_summary_match(self):
+        from rag_utils import _build_index, _top_k
+
+        docs = self._docs()
+        for d in docs:
+            d["_searchable"] = " ".join(d["_fields"].values())
+        index = _build_index(docs)
+        results = _top_k(docs, index, ["codec"], 2, 0.0, scoring="bm25f")
+        assert [r["id"] for r in results] == ["title", "summary"]
+        assert results[0]["_score"] > results[1]["_score"]
+
+    def test_field_lengths_precomputed(self):
+        from rag_utils import _BM25F_FIELDS, _load_index
+
+        index = _load_index()
+        assert set(index["field_len"]) == set(_BM25F_FIELDS)
+        assert index["avg_field_len"]["summary"] > index["avg_field_len"]["title"]
+
+    def test_unknown_scoring_mode_rejected(self):
+        from rag_utils import search
+
+        with pytest.raises(ValueError):
+            search("partial fc", scoring="tfidf")
+
+
+class TestRagPassages:
+    """Test passage chunking of site pages."""
+
+    def test_chunks_respect_limit_and_keep_text(self):
+        from rag_utils import _chunk_text
+
+        text = " ".join(f"Sentence number {i} is here." for i in range(200))
+        chunks = _chunk_text(text, limit=300)
+        assert all(len(c) <= 300 for c in chunks)
+        assert " ".join(chunks).split() == text.split()
+
+    def test_pages_split_at_headings(self):
+        from rag_utils import _build_passages
+
+        html = (
+            "<html><head><title>Demo</title><script>var x = 1;</script></head><body>"
+            "<h2>First</h2><p>" + "alpha " * 80 + "</p>"
+            "<h2>Second</h2><p>" + "beta " * 80 + "</p></body></html>"
+        )
+        passages = _build_passages("demo", html)
+        assert [p["heading"] for p in passages] == ["First", "Second"]
+        assert all(p["title"] == "Demo" and p["url"] == "/pages/demo.html" for p in passages)
+        assert "var x" not in " ".join(p["text"] for p in passages)
+
+    def test_extraction_stops_at_budget(self):
+        import html_text
+
+        html = (
+            '<title>Big</title><nav>menu</nav><h2 data-en="Start" data-zh="开始">开始</h2>'
+            + '<p>word &amp; more <span data-en="English copy" data-zh="中文">中文</span></p>' * 20000
+        )
+        full = html_text.extract_page(html)
+        assert not full["truncated"] and "menu" not in full["text"] and "word & more" in full["text"]
+        page = html_text.extract_page(html, max_chars=500)
+        assert page["truncated"] and len(page["text"]) == 500
+        assert page["title"] == "Big" and full["text"].startswith(page["text"])
+        assert page["text"].startswith("Start 开始 word & more English copy 中文")
+        assert [h["heading"] for h in page["headings"]] == ["Start 开始"]
+
+    def test_english_copy_in_attributes_is_kept(self):
+        import html_text
+
+        html = (
+            '<h2 data-en="Why FP8?" data-zh="为什么 FP8？">为什么 FP8？</h2>'
+            '<p><span data-en="Memory <code>halved</code>" data-zh="显存减半">显存减半</span></p>'
+            '<h3 data-en="Same" data-zh="同">Same</h3>'
+        )
+        page = html_text.extract_page(html)
+        assert page["text"] == "Why FP8? 为什么 FP8？ Memory halved 显存减半 Same"
+        assert [h["heading"] for h in page["headings"]] == ["Why FP8? 为什么 FP8？", "Same"]
+
+    def test_attribute_copy_is_searchable(self):
+        from rag_utils import search
+
+        results = search("GradScaler compatibility hybrid workflows")
+        assert results and results[0]["page"] == "megatron_fp8"
+        assert "GradScaler compatibility for hybrid workflows" in results[0]["text"]
+
+    def test_site_pages_are_searchable(self):
+        from rag_utils import search
+
+        results = search("GRPO KL penalty")
+        assert results and results[0]["type"] == "site_page"
+        assert results[0]["page"] == "verl_grpo"
+
+    def test_chinese_queries_rank_structured_docs_first(self):
+        from rag_utils import search
+
+        results = search("安翔的论文有哪些")
+        assert [r["type"] for r in results[:2]] == ["publication", "publication"]
+        for query in ("人脸识别", "多模态大模型"):
+            results = search(query)
+            assert results and results[0]["type"] != "site_page", query
+
+    def test_one_passage_per_page(self):
+        from rag_utils import search
+
+        pages = [r["page"] for r in search("Megatron FP8 training", top_k=5) if r["type"] == "site_page"]
+        assert len(pages) == len(set(pages))
+
+
+@pytest.fixture(scope="module")
+def artifact(tmp_path_factory):
+    """A freshly compiled knowledge-base artifact in a temp directory."""
+    import rag_utils
+
+    return rag_utils.build_artifact(str(tmp_path_factory.mktemp("kb") / "kb.kbidx"))
+
+
+class TestRagArtifact:
+    """Test the compiled knowledge-base artifact (build + mmap load)."""
+
+    def test_artifact_round_trip(self, artifact):
+        import rag_utils
+
+        sources = rag_utils._read_sources()
+        data, pages, docs, index = rag_utils._load_artifact(artifact, rag_utils._source_digest(sources))
+
+        _data, expected_pages, expected_docs, expected = rag_utils._compile_sources(sources)
+        assert data == _data
+        assert pages == expected_pages
+        assert docs == expected_docs
+        assert index["avg_dl"] == expected["avg_dl"]
+        assert list(index["doc_len"]) == list(expected["doc_len"])
+        for term, (doc_ids, tfs) in expected["postings"].items():
+            assert list(index["postings"][term][0]) == list(doc_ids)
+            assert list(index["postings"][term][1]) == list(tfs)
+            assert index["idf"][term] == expected["idf"][term]
+            assert list(index["field_postings"][term][1]) == list(expected["field_postings"][term][1])
+            assert index["field_max_score"][term] == expected["field_max_score"][term]
+        if "dense" in expected:
+            assert list(index["dense"]) == list(expected["dense"])
+
+    def test_stale_artifact_is_ignored(self, artifact, caplog):
+        import rag_utils
+
+        sources = rag_utils._read_sources()
+        sources["pages/blog.html"] = b"<html>edited</html>"
+        with caplog.at_level("WARNING", logger=rag_utils.logger.name):
+            assert rag_utils._load_artifact(artifact, rag_utils._source_digest(sources)) is None
+        assert "build_kb_index.py" in caplog.text
+
+    def test_yaml_values_are_normalized_for_json(self):
+        import rag_utils
+
+        sources = rag_utils._read_sources()
+        sources["data/research_data.yaml"] = b"publications:\n  - title: Dated\n    date: 2023-06-01\n    2023: year key\n"
+        data = rag_utils._compile_sources(sources)[0]
+        assert data["publications"][0]["date"] == "2023-06-01"
+        assert json.loads(json.dumps(data)) == data
+
+        sources["data/research_data.yaml"] = b"publications:\n  - title: Odd\n    tags: !!set {a, b}\n"
+        with pytest.raises(ValueError, match=r"publications\[0\]\.tags"):
+            rag_utils._compile_sources(sources)
+
+    def test_missing_artifact_is_ignored(self, tmp_path):
+        import rag_utils
+
+        assert rag_utils._load_artifact(str(tmp_path / "missing.kbidx"), b"") is None
+
+
+class TestSnapshotManager:
+    """Test snapshot.SnapshotManager hot reload (polling + atomic swap)."""
+
+    def _manager(self, path, build, poll_interval=0):
+        from snapshot import SnapshotManager
+
+        return SnapshotManager("test", lambda: [str(path)], build, poll_interval=poll_interval)
+
+    def _edit(self, path, text):
+        path.write_text(text)
+        st = path.stat()
+        # Force a visible mtime change even on coarse-grained filesystems
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    def test_reload_publishes_new_version(self, tmp_path):
+        path = tmp_path / "data.txt"
+        path.write_text("one")
+        mgr = self._manager(path, path.read_text)
+        assert mgr.get().value == "one" and mgr.get().version == 1
+
+        self._edit(path, "two")
+        snap = mgr.reload()
+        assert (snap.version, snap.value) == (2, "two")
+
+    def test_unchanged_content_keeps_version(self, tmp_path):
+        path = tmp_path / "data.txt"
+        path.write_text("one")
+        builds = []
+        mgr = self._manager(path, lambda: builds.append(1) or path.read_text())
+        mgr.get()
+        self._edit(path, "one")
+        assert mgr.reload().version == 1
+        assert len(builds) == 1
+
+    def test_readers_never_block_on_rebuild(self, tmp_path):
+        import threading
+
+        path = tmp_path / "data.txt"
+        path.write_text("one")
+        release = threading.Event()
+
+        def build():
+            text = path.read_text()
+            if text != "one":
+                release.wait(5)
+            return text
+
+        mgr = self._manager(path, build, poll_interval=1e-9)
+        mgr.get()
+        self._edit(path, "two")
+        # Starts the background rebuild, which is parked in build()
+        assert mgr.get().value == "one"
+        assert mgr.get().value == "one"
+        release.set()
+        mgr._thread.join(5)
+        assert mgr.get().value == "two" and mgr.get().version == 2
+
+    def test_failed_rebuild_keeps_old_snapshot(self, tmp_path):
+        path = tmp_path / "data.json"
+        path.write_text('{"a": 1}')
+        mgr = self._manager(path, lambda: json.loads(path.read_text()))
+        mgr.get()
+        self._edit(path, "{broken")
+        snap = mgr.reload()
+        assert (snap.version, snap.value) == (1, {"a": 1})
+
+    def test_broken_citation_edit_keeps_last_snapshot(self, tmp_path, monkeypatch):
+        import tools
+
+        path = tmp_path / "citation_data.json"
+        path.write_text("{broken")
+        monkeypatch.setattr(tools, "_CITATION_DATA_JSON", str(path))
+        monkeypatch.setattr(tools, "_CITATIONS", self._manager(path, tools._read_citation_data))
+        # Nothing to keep on the first load: no citation data
+        assert tools._load_citation_data() == {}
+
+        self._edit(path, '{"total_citations": 10}')
+        assert tools._CITATIONS.reload().value == {"total_citations": 10}
+        self._edit(path, '{"total_citations": ')
+        snap = tools._CITATIONS.reload()
+        assert (snap.version, snap.value) == (2, {"total_citations": 10})
+
+    def test_rag_snapshot_is_consistent(self):
+        import rag_utils
+
+        snap = rag_utils._kb_snapshot()
+        assert rag_utils._load_knowledge_base() is snap.value["docs"]
+        assert snap.value["index"]["n_docs"] == len(snap.value["docs"])
+
+    def test_queries_do_not_mutate_the_snapshot(self):
+        import rag_utils
+        import site_pages
+
+        snap = rag_utils._kb_snapshot()
+        before = (set(snap.value), set(snap.value["index"]), {n: set(p) for n, p in snap.value["pages"].items()})
+        rag_utils.search("snapshot mutation probe", scoring="bm25")
+        rag_utils.search_publications("face", year=2022)
+        site_pages.search("GRPO")
+        site_pages.outline(snap.value["pages"]["index"])
+        after = (set(snap.value), set(snap.value["index"]), {n: set(p) for n, p in snap.value["pages"].items()})
+        assert after == before
+
+
+class TestRagCache:
+    """Test the LRU caches in front of rag_utils.search / format_context."""
+
+    def test_lru_eviction_and_counters(self):
+        from cache_utils import LRUCache
+
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1  # "b" is now least recently used
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    def test_repeated_query_hits_cache(self):
+        import rag_utils
+
+        rag_utils._SEARCH_CACHE.clear()
+        first = rag_utils.search("partial fc face recognition")
+        # Case and punctuation variants share the entry
+        second = rag_utils.search("Partial-FC: face recognition?")
+        assert [r["_doc_key"] for r in second] == [r["_doc_key"] for r in first]
+        assert rag_utils.cache_stats()["search"]["hits"] == 1
+        rag_utils.search("partial fc face recognition", top_k=1)
+        assert rag_utils.cache_stats()["search"]["misses"] == 2
+
+    def test_reload_invalidates_entries(self, monkeypatch):
+        import rag_utils
+
+        rag_utils._SEARCH_CACHE.clear()
+        rag_utils.search("insightface")
+        snap = rag_utils._kb_snapshot()
+        monkeypatch.setattr(rag_utils._KB, "_snapshot", snap._replace(version=snap.version + 1))
+        rag_utils.search("insightface")
+        assert rag_utils.cache_stats()["search"]["hits"] == 0
+
+    def test_format_context_cached(self):
+        import rag_utils
+
+        rag_utils._CONTEXT_CACHE.clear()
+        results = rag_utils.search("partial fc")
+        context = rag_utils.format_context(results)
+        assert rag_utils.format_context(rag_utils.search("partial fc")) is context
+        assert rag_utils.cache_stats()["context"]["hits"] == 1
+
+
+class TestRagPublications:
+    """Test rag_utils.search_publications and its facet filters."""
+
+    def test_venue_and_year_parsing(self):
+        from rag_utils import _pub_year, _venue_name
+
+        assert _venue_name("ICCV, 2025 (Highlight)") == "iccv"
+        assert _venue_name("ACM MM 2025") == "acm mm"
+        assert _pub_year({"venue": "CVPR, 2022"}) == 2022
+        assert _pub_year({"venue": "Preprint 2026", "year": 2026}) == 2026
+
+    def test_only_publications_returned(self):
+        from rag_utils import search_publications
+
+        results = search_publications("face recognition")
+        assert results
+        assert all(r["type"] == "publication" for r in results)
+
+    def test_facet_filters(self):
+        from rag_utils import _pub_year, _venue_name, search_publications
+
+        for r in search_publications("", year=2025, top_k=50):
+            assert _pub_year(r) == 2025
+        iccv = search_publications("", venue="ICCV", top_k=50)
+        assert iccv and all(_venue_name(r["venue"]) == "iccv" for r in iccv)
+        for r in search_publications("multimodal", has_code=True, has_media=False, top_k=50):
+            assert r.get("code_url") and not r.get("media_links")
+
+    def test_filters_can_exclude_everything(self):
+        from rag_utils import search_publications
+
+        assert search_publications("face recognition", year=1990) == []
+
+    def test_year_in_venue_filters_by_year(self):
+        from rag_utils import _pub_year, search_publications
+
+        all_iccv = search_publications("", venue="ICCV", top_k=50)
+        iccv_2023 = search_publications("", venue="ICCV 2023", top_k=50)
+        assert iccv_2023 and len(iccv_2023) < len(all_iccv)
+        assert all(_pub_year(r) == 2023 for r in iccv_2023)
+        assert search_publications("", venue="ICCV, 2023", year="2023", top_k=50) == iccv_2023
+        with pytest.raises(ValueError, match="different year"):
+            search_publications("", venue="ICCV 2023", year=2025)
+
+    def test_invalid_year_is_rejected(self):
+        from rag_utils import search_publications
+        from tools import _search_publications
+
+        for year in ("abc", "2023.5", "20", True):
+            with pytest.raises(ValueError, match="four-digit year"):
+                search_publications("face", year=year)
+        assert _search_publications("face", year="last year").startswith("Error: year must be")
+
+    def test_tool_output(self):
+        from tools import _search_publications
+
+        out = _search_publications("partial fc", year=2022)
+        assert "Killing Two Birds" in out and "year=2022" in out
+        assert "Partial FC: Training 10 Million" not in out
+
+
 class TestRagFormatContext:
     """Test rag_utils.format_context."""
 
@@ -257,6 +832,143 @@ class TestRagFormatContext:
         assert "MyRepo" in result
         assert "github.com" in result
 
+    def test_format_site_page(self):
+        from rag_utils import format_context
+
+        doc = {
+            "type": "site_page",
+            "title": "YaRN: LLM Context Window Extension",
+            "heading": "RoPE",
+            "url": "/pages/yarn.html",
+            "text": "Rotary embeddings rotate query and key vectors.",
+        }
+        result = format_context([doc])
+        assert "YaRN" in result and "RoPE" in result
+        assert "https://anxiangsir.github.io/pages/yarn.html" in result
+        assert "Rotary embeddings" in result
+
+    def test_packed_context_fits_budget(self):
+        from rag_utils import format_context
+
+        filler = "This sentence is about something unrelated to the question. " * 30
+        docs = [
+            {
+                "type": "publication",
+                "title": f"Paper {i}",
+                "paper_url": f"https://example.com/{i}",
+                "summary": filler + f"Partial FC samples class centers in paper {i}. " + filler,
+            }
+            for i in range(3)
+        ]
+        full = format_context(docs)
+        packed = format_context(docs, query="partial fc class centers", max_chars=800)
+        assert len(packed) <= 800 < len(full)
+        for i in range(3):
+            # Titles and URLs are always kept; the matching sentence wins the budget
+            assert f"**Paper {i}**" in packed
+            assert f"https://example.com/{i}" in packed
+            assert f"Partial FC samples class centers in paper {i}." in packed
+
+    def test_packing_keeps_headers_when_budget_is_tiny(self):
+        from rag_utils import format_context
+
+        doc = {"type": "github_project", "name": "MyRepo", "url": "https://github.com/test/repo",
+               "description": "A cool project. It does many things."}
+        packed = format_context([doc], query="cool", max_chars=10)
+        assert "MyRepo" in packed and "github.com/test/repo" in packed
+        assert "Description" not in packed
+
+
+class TestSitePages:
+    """Test the positional site-page index behind search_site_pages."""
+
+    PAGES = {
+        "demo": {
+            "title": "Demo Page", "url": "/pages/demo.html",
+            "text": "Intro text. Diffusion models 扩散模型 are trained to denoise. Trained diffusions.",
+            "headings": [{"level": 2, "heading": "Models", "start": 12}],
+        },
+        "other": {
+            "title": "Other", "url": "/pages/other.html",
+            "text": "扩散 and 模型 appear apart here, as does diffusion.",
+            "headings": [],
+        },
+    }
+
+    def test_cjk_runs_match_as_phrases(self):
+        import site_pages
+
+        index = site_pages._build_index(self.PAGES)
+        found = site_pages._phrase_positions(index, "扩散模型")
+        assert list(found) == [0]
+        assert self.PAGES["demo"]["text"][found[0][0]:].startswith("扩散模型")
+
+    def test_query_phrases_and_prefixes(self):
+        import site_pages
+
+        assert site_pages._query_phrases("什么是扩散模型 the Diffusion") == ["扩散模型", "diffusion"]
+        index = site_pages._build_index(self.PAGES)
+        assert len(site_pages._phrase_positions(index, "diffusion")[0]) == 2  # + "diffusions"
+
+    def test_search_real_pages(self):
+        import site_pages
+
+        results = site_pages.search("Megatron FP8 training")
+        assert results[0]["page"] == "megatron_fp8"
+        assert results[0]["url"] == "/pages/megatron_fp8.html"
+        assert "fp8" in results[0]["snippet"].lower()
+        assert site_pages.search("the of and") == []
+
+    def test_tool_output(self):
+        from tools import _search_site_pages
+
+        out = _search_site_pages("YaRN RoPE")
+        assert out.startswith("Found") and "(/pages/yarn.html)" in out
+        assert _search_site_pages("  ") == "Please provide a search query."
+
+    def test_outline_sections_nest(self):
+        import site_pages
+
+        page = {
+            "title": "T", "url": "/pages/t.html", "text": "Intro. A body. A1 body. B body.",
+            "headings": [
+                {"level": 2, "heading": "A", "start": 7},
+                {"level": 3, "heading": "A1", "start": 15},
+                {"level": 2, "heading": "B", "start": 24},
+            ],
+        }
+        sections = site_pages.outline(page)
+        assert [(s["number"], s["heading"]) for s in sections] == [(0, ""), (1, "A"), (2, "A1"), (3, "B")]
+        # A section includes its subsections
+        assert page["text"][sections[1]["start"]:sections[1]["end"]] == "A body. A1 body. "
+        assert site_pages.find_section(page, "2")["heading"] == "A1"
+        assert site_pages.find_section(page, "a1")["number"] == 2
+        assert site_pages.find_section(page, "missing") is None
+
+    def test_read_tool_sections_and_ranges(self):
+        from tools import _read_site_page
+
+        listing = _read_site_page("verl_grpo", list_sections=True)
+        assert "KL" in listing and "[chars" in listing
+        section = _read_site_page("verl_grpo", section="KL")
+        assert "KL" in section.split("\n", 1)[0] and len(section) < 6500
+        ranged = _read_site_page("verl_grpo", offset=100, length=50)
+        assert "(chars 100-150 of" in ranged
+        assert "continue with offset=6000" in _read_site_page("verl_grpo")
+        assert "not found" in _read_site_page("verl_grpo", section="no such heading")
+
+    def test_read_tool_rejects_bad_ranges(self, caplog):
+        import tools
+
+        assert "(chars 1500-1550 of" in tools._read_site_page("verl_grpo", offset="1.5e3", length="50")
+        for offset, length in (("abc", None), (10, "1.5"), ([1], None), (None, -5)):
+            with caplog.at_level("ERROR", logger=tools.logger.name):
+                result = tools.execute_tool(
+                    "read_site_page", json.dumps({"page_name": "verl_grpo", "offset": offset, "length": length})
+                )
+            assert result.startswith("Error: ") and ("offset" in result or "length" in result), result
+        assert not caplog.records
+
 
 # ═══════════════════════════════════════════════════════════════════════
 # GROUP 6: Visitor API — pure utility functions
@@ -320,6 +1032,22 @@ def test_requirements_txt_has_key_deps():
         assert dep in content.lower(), f"requirements.txt missing {dep}"
 
 
+def test_rag_eval_labels_match_knowledge_base():
+    """Every label in scripts/rag_eval_queries.yaml must name a real document."""
+    import yaml
+
+    import rag_utils
+
+    sys.path.insert(0, str(ROOT / "scripts"))
+    from bench_rag import _doc_label, _matches
+
+    queries = yaml.safe_load((ROOT / "scripts" / "rag_eval_queries.yaml").read_text(encoding="utf-8"))
+    labels = {_doc_label(d) for d in rag_utils._load_knowledge_base()}
+    for q in queries["queries"]:
+        for label in q["relevant"]:
+            assert any(_matches(label, dl) for dl in labels), f"Unknown label {label!r} in {q['query']!r}"
+
+
 def test_no_broken_internal_links_in_index():
     """index.html should not reference non-existent local files in href/src."""
     content = (ROOT / "index.html").read_text(encoding="utf-8")
@@ -363,3 +1091,635 @@ def test_citation_data_json_valid():
     if path.exists():
         data = json.loads(path.read_text(encoding="utf-8"))
         assert isinstance(data, (dict, list)), "citation_data.json has unexpected type"
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# GROUP 9: Agent tool HTTP layer (local server only, no network)
+# ═══════════════════════════════════════════════════════════════════════
+
+
+@pytest.fixture(scope="module")
+def local_http():
+    """A keep-alive HTTP/1.1 server on localhost; yields (base URL, request log)."""
+    import gzip
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    log = []
+    dropped = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            payload = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            log.append((self.path, self.client_address[1], dict(self.headers)))
+            status, headers, body = 200, {}, b"hello"
+            if self.path == "/drop" or (self.path.endswith("?drop-once") and self.path not in dropped):
+                # Hang up after reading the request, as a server that timed
+                # out the keep-alive connection mid-request would
+                dropped.add(self.path)
+                self.close_connection = True
+                return
+            if self.path.split("?")[0] == "/graphql":
+                # Echo every aliased field; logins containing "ghost" are errors
+                data, errors = {"rateLimit": {"cost": 1, "remaining": 4999, "resetAt": "soon"}}, []
+                for alias, field in re.findall(r"^  (f\d+): (.*)$", json.loads(payload)["query"], re.M):
+                    if "ghost" in field:
+                        data[alias] = None
+                        errors.append({"path": [alias], "message": "Could not resolve to a User"})
+                    else:
+                        data[alias] = {"field": field}
+                body = json.dumps({"data": data, "errors": errors} if errors else {"data": data}).encode()
+            elif self.path.startswith("/list?"):
+                # 10 items, per_page at a time, with GitHub-style Link headers
+                query = {k: int(v) for k, v in (p.split("=") for p in self.path[6:].split("&"))}
+                page, per_page = query.get("page", 1), query["per_page"]
+                last = -(-10 // per_page)
+                body = json.dumps(list(range((page - 1) * per_page, min(page * per_page, 10)))).encode()
+                if page < last:
+                    headers["Link"] = (
+                        f'<{self.server.base}/list?per_page={per_page}&page={page + 1}>; rel="next", '
+                        f'<{self.server.base}/list?per_page={per_page}&page={last}>; rel="last"'
+                    )
+            elif self.path == "/ratelimited":
+                status, body = 403, b'{"message": "API rate limit exceeded"}'
+                headers.update({
+                    "X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(int(time.time()) + 3600), "X-RateLimit-Resource": "core",
+                })
+            elif self.path == "/gzip":
+                headers["Content-Encoding"] = "gzip"
+                body = gzip.compress(b"compressed body")
+            elif self.path == "/redirect":
+                status, headers, body = 302, {"Location": "/target"}, b""
+            elif self.path == "/target":
+                body = b"redirected"
+            elif self.path == "/missing":
+                status, body = 404, b'{"message": "Not Found"}'
+            elif self.path.startswith("/etag"):
+                headers["ETag"] = '"v1"'
+                if self.headers.get("If-None-Match") == '"v1"':
+                    status, body = 304, b""
+                else:
+                    body = b'{"n": 1}'
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_POST = do_GET
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.base = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.base, log
+    server.shutdown()
+
+
+class TestHttpClient:
+    """Test the pooled keep-alive client behind tools._http_get/_http_post."""
+
+    def test_connections_are_reused(self, local_http):
+        import http_client
+
+        base, log = local_http
+        http_client.close_all()
+        before = http_client.stats()
+        bodies = [http_client.request("GET", f"{base}/n{i}").body for i in range(4)]
+        after = http_client.stats()
+        assert bodies == [b"hello"] * 4
+        assert after["connections"] - before["connections"] == 1
+        assert after["reused"] - before["reused"] == 3
+        assert len({port for _path, port, _h in log[-4:]}) == 1
+
+    def test_gzip_and_redirects(self, local_http):
+        import http_client
+
+        base, log = local_http
+        assert http_client.request("GET", f"{base}/gzip").body == b"compressed body"
+        assert "gzip" in log[-1][2]["Accept-Encoding"]
+        resp = http_client.request("GET", f"{base}/redirect")
+        assert resp.body == b"redirected" and resp.url.endswith("/target")
+
+    def test_errors_raise_http_error(self, local_http):
+        from urllib.error import HTTPError
+
+        import tools
+
+        base, _log = local_http
+        with pytest.raises(HTTPError) as exc:
+            tools._http_get(f"{base}/missing")
+        assert exc.value.code == 404 and b"Not Found" in exc.value.read()
+        assert tools._http_post(f"{base}/echo", {"a": 1}) == b"hello"
+
+    def test_stale_pooled_connection_is_retried(self, local_http):
+        import socket
+
+        import http_client
+
+        base, _log = local_http
+        http_client.request("GET", f"{base}/warm")
+        for idle in http_client._idle.values():
+            for conn, _last_used in idle:
+                conn.sock.shutdown(socket.SHUT_RDWR)  # as if the server dropped it
+        assert http_client.request("GET", f"{base}/again").body == b"hello"
+
+    def test_post_is_not_resent_after_it_was_sent(self, local_http):
+        import http.client
+
+        import http_client
+
+        base, log = local_http
+        for method, idempotent, attempts in (("POST", None, 1), ("GET", None, 2), ("POST", True, 2)):
+            http_client.request("GET", f"{base}/warm")  # leave a pooled connection
+            before = len(log)
+            with pytest.raises(http.client.RemoteDisconnected):
+                http_client.request(
+                    method, f"{base}/drop", body=b"{}" if method == "POST" else None, idempotent=idempotent
+                )
+            # GET and idempotent POST are retried once on a fresh connection, POST never
+            assert [path for path, _port, _h in log[before:]] == ["/drop"] * attempts, (method, idempotent)
+
+
+class TestGithubCache:
+    """Test the ETag cache in front of the GitHub API tools."""
+
+    def test_fresh_entries_skip_the_network(self, local_http, monkeypatch):
+        import github_cache
+
+        base, log = local_http
+        monkeypatch.setattr(github_cache, "_DB_ENABLED", False)
+        url = f"{base}/etag/fresh"
+        assert github_cache.fetch("GET", url) == b'{"n": 1}'
+        sent = len(log)
+        assert github_cache.fetch("GET", url) == b'{"n": 1}'
+        assert len(log) == sent
+
+    def test_expired_entries_revalidate_with_etag(self, local_http, monkeypatch):
+        import github_cache
+
+        base, log = local_http
+        monkeypatch.setattr(github_cache, "_DB_ENABLED", False)
+        monkeypatch.setattr(github_cache, "_DEFAULT_TTL", 0)
+        url = f"{base}/etag/stale"
+        before = github_cache.stats().get("revalidated", 0)
+        assert github_cache.fetch("GET", url) == b'{"n": 1}'
+        assert "If-None-Match" not in log[-1][2]
+        assert github_cache.fetch("GET", url) == b'{"n": 1}'
+        assert log[-1][2]["If-None-Match"] == '"v1"'
+        assert github_cache.stats()["revalidated"] == before + 1
+
+    def test_cache_table_is_ensured_once_per_process(self, monkeypatch):
+        import github_cache
+
+        statements = []
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                statements.append(sql)
+
+        class Conn:
+            def cursor(self):
+                return Cursor()
+
+            def commit(self):
+                pass
+
+        monkeypatch.setattr(github_cache, "_table_ready", False)
+        github_cache._ensure_cache_table(Conn())
+        ddl = len(statements)
+        assert ddl == 2  # CREATE TABLE + ALTER TABLE
+        github_cache._ensure_cache_table(Conn())
+        assert len(statements) == ddl
+
+    def test_paginated_listing_is_merged_in_order(self, local_http):
+        import tools
+
+        base, log = local_http
+        sent = len(log)
+        assert list(tools._github_pages(f"{base}/list?per_page=3", {})) == list(range(10))
+        assert len(log) == sent + 4
+        assert list(tools._github_pages(f"{base}/list?per_page=3", {}, max_items=5)) == list(range(5))
+
+    def test_parse_link(self):
+        import tools
+
+        header = '<https://x/r?page=2>; rel="next", <https://x/r?page=9>; rel="last"'
+        assert tools._parse_link(header) == {"next": "https://x/r?page=2", "last": "https://x/r?page=9"}
+        assert tools._parse_link(None) == {}
+
+    def test_endpoint_ttls(self):
+        import github_cache
+
+        assert github_cache._ttl("https://api.github.com/repos/a/b/contents/src") == 300
+        assert github_cache._ttl("https://api.github.com/repos/a/b/contributors?per_page=30") == 6 * 3600
+        assert github_cache._ttl("https://api.github.com/users/a/repos?sort=stars") == 1800
+
+
+class TestGithubGraphQL:
+    """Test the batched GraphQL gateway behind list_github_repos/get_pinned_repos."""
+
+    def _fetch_in_round(self, tool_round, field, token):
+        import github_graphql
+
+        with tool_round.call():
+            return github_graphql.fetch_field(field, token)
+
+    def test_concurrent_fields_share_one_query(self, local_http, monkeypatch):
+        from concurrent.futures import ThreadPoolExecutor
+
+        import github_graphql
+
+        base, log = local_http
+        monkeypatch.setattr(github_graphql, "_ENDPOINT", f"{base}/graphql")
+        monkeypatch.setattr(github_graphql, "_BATCH_WINDOW", 0.2)
+        before = github_graphql.stats()
+        sent = len(log)
+        fields = ['user(login: "a") { name }', 'user(login: "b") { name }', 'user(login: "a") { name }']
+        tool_round = github_graphql.ToolRound(len(fields))
+        with ThreadPoolExecutor(3) as pool:
+            results = list(pool.map(lambda f: self._fetch_in_round(tool_round, f, "t0"), fields))
+        assert [r["field"] for r in results] == fields
+        assert len(log) == sent + 1
+        assert log[-1][2]["Authorization"] == "Bearer t0"
+        after = github_graphql.stats()
+        assert after["queries"] == before["queries"] + 1
+        assert after["fields"] == before["fields"] + 2
+        assert after["cost"] == before["cost"] + 1 and after["remaining"] == 4999
+
+        assert github_graphql.fetch_field(fields[0], "t0") == results[0]
+        assert len(log) == sent + 1
+
+    def test_query_is_resent_after_a_stale_connection(self, local_http, monkeypatch):
+        import github_graphql
+        import http_client
+
+        base, log = local_http
+        monkeypatch.setattr(github_graphql, "_ENDPOINT", f"{base}/graphql?drop-once")
+        monkeypatch.setattr(github_graphql, "_BATCH_WINDOW", 0)
+        http_client.request("GET", f"{base}/warm")  # leave a pooled connection
+        sent = len(log)
+        field = 'user(login: "stale") { name }'
+        assert github_graphql.fetch_field(field, "t2")["field"] == field
+        assert [path for path, _port, _h in log[sent:]] == ["/graphql?drop-once"] * 2
+
+    def test_field_errors_stay_with_their_field(self, local_http, monkeypatch):
+        from concurrent.futures import ThreadPoolExecutor
+
+        import github_graphql
+
+        base, _log = local_http
+        monkeypatch.setattr(github_graphql, "_ENDPOINT", f"{base}/graphql")
+        monkeypatch.setattr(github_graphql, "_BATCH_WINDOW", 0.2)
+        tool_round = github_graphql.ToolRound(2)
+        with ThreadPoolExecutor(2) as pool:
+            ok = pool.submit(self._fetch_in_round, tool_round, 'user(login: "c") { name }', "t1")
+            bad = pool.submit(self._fetch_in_round, tool_round, 'user(login: "ghost") { name }', "t1")
+            assert ok.result()["field"] == 'user(login: "c") { name }'
+            with pytest.raises(github_graphql.GraphQLError, match="Could not resolve"):
+                bad.result()
+
+    def test_lone_call_does_not_wait_for_a_batch(self, local_http, monkeypatch):
+        import time
+
+        import github_graphql
+
+        base, _log = local_http
+        monkeypatch.setattr(github_graphql, "_ENDPOINT", f"{base}/graphql")
+        monkeypatch.setattr(github_graphql, "_BATCH_WINDOW", 5)
+        start = time.monotonic()
+        assert github_graphql.fetch_field('user(login: "solo") { name }', "t3")
+        # The last call still running in a round has no one to wait for
+        tool_round = github_graphql.ToolRound(1)
+        assert self._fetch_in_round(tool_round, 'user(login: "last") { name }', "t3")
+        assert time.monotonic() - start < 2
+
+    def test_logins_are_escaped(self):
+        import github_graphql
+
+        assert github_graphql._literal('x") { secret }') == '"x\\") { secret }"'
+
+    def test_owner_repositories_pages_by_cursor(self, monkeypatch):
+        import github_graphql
+
+        fields = []
+
+        def fetch_field(field, token, timeout=15):
+            fields.append(field)
+            first = int(re.search(r"first: (\d+)", field).group(1))
+            after = re.search(r'after: "(\d+)"', field)
+            start = int(after.group(1)) if after else 0
+            end = min(start + first, 250)
+            return {"repositories": {
+                "totalCount": 250,
+                "pageInfo": {"endCursor": str(end), "hasNextPage": end < 250},
+                "nodes": [{"name": f"r{i}"} for i in range(start, end)],
+            }}
+
+        monkeypatch.setattr(github_graphql, "fetch_field", fetch_field)
+        listing = github_graphql.owner_repositories("someone", "t", limit=230)
+        assert listing["totalCount"] == 250
+        assert [n["name"] for n in listing["nodes"]] == [f"r{i}" for i in range(230)]
+        assert [re.search(r"first: (\d+)", f).group(1) for f in fields] == ["100", "100", "30"]
+
+
+class TestGithubQuota:
+    """Test rate-limit tracking and the cache's behaviour when the budget runs out."""
+
+    def test_budget_states(self, monkeypatch):
+        import time
+
+        import github_quota
+
+        monkeypatch.setattr(github_quota, "_state", {})
+        reset = str(int(time.time()) + 600)
+        headers = {"X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "40", "X-RateLimit-Reset": reset}
+        github_quota.update("Bearer t", headers)
+        assert github_quota.reserve("Bearer t")[0] == "ok"
+        assert github_quota.reserve("") == ("ok", 0.0)  # other tokens are tracked separately
+        github_quota.update("Bearer t", {**headers, "X-RateLimit-Remaining": "2"})
+        assert github_quota.peek("Bearer t")[0] == "low"
+        github_quota.update("Bearer t", {**headers, "X-RateLimit-Remaining": "0"})
+        status, wait = github_quota.reserve("Bearer t")
+        assert status == "exhausted" and 500 < wait <= 600
+        with pytest.raises(github_quota.RateLimitError):
+            github_quota.wait_or_raise("core", wait)
+        [state] = github_quota.stats()
+        assert state["remaining"] == 0 and state["status"] == "exhausted"
+        assert "Bearer" not in state["token"]
+
+    def test_low_budget_serves_expired_entries(self, local_http, monkeypatch):
+        import time
+
+        import github_cache
+        import github_quota
+
+        base, log = local_http
+        monkeypatch.setattr(github_quota, "_state", {})
+        monkeypatch.setattr(github_cache, "_DB_ENABLED", False)
+        monkeypatch.setattr(github_cache, "_DEFAULT_TTL", 0)
+        url = f"{base}/etag/quota"
+        assert github_cache.fetch("GET", url) == b'{"n": 1}'
+        github_quota.update("", {
+            "X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "1", "X-RateLimit-Reset": str(int(time.time()) + 600),
+        })
+        sent = len(log)
+        assert github_cache.fetch("GET", url) == b'{"n": 1}'
+        assert len(log) == sent
+        assert github_cache.stats()["quota_stale"] >= 1
+
+    def test_exhausted_budget_fails_fast(self, local_http, monkeypatch):
+        import github_cache
+        import github_quota
+
+        base, log = local_http
+        monkeypatch.setattr(github_quota, "_state", {})
+        monkeypatch.setattr(github_cache, "_DB_ENABLED", False)
+        with pytest.raises(github_quota.RateLimitError):
+            github_cache.fetch("GET", f"{base}/ratelimited")
+        sent = len(log)
+        with pytest.raises(github_quota.RateLimitError):
+            github_cache.fetch("GET", f"{base}/ratelimited/other")
+        assert len(log) == sent
+
+    def test_metrics_endpoint(self):
+        import chat
+
+        resp = chat.app.test_client().get("/api/metrics")
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert {"http", "github_quota", "github_cache", "webpage_cache", "single_flight"} <= set(data)
+
+
+class TestWebpageCache:
+    """Test the fetch_webpage result cache."""
+
+    def test_canonical_url(self):
+        from webpage_cache import canonical_url
+
+        assert canonical_url("HTTPS://www.arXiv.org:443/abs/2304.01234?utm_source=x#intro") == (
+            "https://arxiv.org/abs/2304.01234"
+        )
+        assert canonical_url("https://example.com?b=2&a=1&fbclid=z") == "https://example.com/?a=1&b=2"
+
+    def test_domain_ttls(self):
+        from webpage_cache import _DEFAULT_TTL, _ttl
+
+        assert _ttl("https://arxiv.org/abs/1") == 7 * 86400
+        assert _ttl("https://export.arxiv.org/abs/1") == 7 * 86400
+        assert _ttl("https://github.com/a/b") == 3600
+        assert _ttl("https://notarxiv.org/") == _DEFAULT_TTL
+
+    def test_fetch_webpage_is_served_from_cache(self, local_http, monkeypatch):
+        import tools
+        import webpage_cache
+
+        base, log = local_http
+        monkeypatch.setattr(webpage_cache, "_DB_ENABLED", False)
+        first = tools._fetch_webpage(f"{base}/page?utm_campaign=a")
+        sent = len(log)
+        assert tools._fetch_webpage(f"{base}/page") == first
+        assert len(log) == sent
+        assert webpage_cache.stats()["memory_hits"] >= 1
+
+    def test_fallback_keeps_attribute_copy(self, monkeypatch):
+        import tools
+        import webpage_cache
+
+        html = '<p><span data-en="Memory halved" data-zh="显存减半">显存减半</span></p>'
+        monkeypatch.setitem(sys.modules, "trafilatura", None)
+        monkeypatch.setattr(tools, "_http_get", lambda url, timeout: html.encode())
+        monkeypatch.setattr(webpage_cache, "_DB_ENABLED", False)
+        content = tools._fetch_webpage("https://example.com/fp8")
+        assert content.endswith("Memory halved 显存减半")
+
+    def test_failures_are_not_cached(self, local_http, monkeypatch):
+        import tools
+        import webpage_cache
+
+        base, _log = local_http
+        monkeypatch.setattr(webpage_cache, "_DB_ENABLED", False)
+        assert tools._fetch_webpage(f"{base}/missing").startswith("Failed to fetch")
+        assert webpage_cache.get(f"{base}/missing") is None
+
+
+class TestAgentLoopTools:
+    """Test tool execution inside chat._run_agent_loop (fake model, no network)."""
+
+    @staticmethod
+    def _chunk(finish_reason=None, content=None, tool_calls=None):
+        from types import SimpleNamespace as NS
+
+        delta = NS(content=content, tool_calls=tool_calls, reasoning_content=None)
+        return NS(choices=[NS(delta=delta, finish_reason=finish_reason)])
+
+    def _fake_client(self, calls, seen):
+        from types import SimpleNamespace as NS
+
+        rounds = [
+            [self._chunk(tool_calls=[
+                NS(index=i, id=f"call_{i}", function=NS(name=name, arguments=json.dumps(args)))
+                for i, (name, args) in enumerate(calls)
+            ]), self._chunk(finish_reason="tool_calls")],
+            [self._chunk(content="done"), self._chunk(finish_reason="stop")],
+        ]
+
+        def create(**kwargs):
+            seen.append([dict(m) for m in kwargs["messages"]])
+            return iter(rounds[len(seen) - 1])
+
+        return NS(chat=NS(completions=NS(create=create)))
+
+    def test_tool_calls_run_concurrently_in_call_order(self, monkeypatch):
+        import time
+
+        import chat
+
+        delays = {"slow": 0.3, "fast": 0.0, "medium": 0.1}
+        spans = []
+
+        def fake_execute(name, arguments_json, calls=None):
+            which = json.loads(arguments_json)["which"]
+            start = time.perf_counter()
+            time.sleep(delays[which])
+            spans.append((start, time.perf_counter()))
+            return f"result {which}"
+
+        monkeypatch.setattr(chat.agent_tools, "execute_tool", fake_execute)
+        seen = []
+        client = self._fake_client([("fetch_webpage", {"which": w}) for w in delays], seen)
+
+        events = list(chat._run_agent_loop(client, [{"role": "user", "content": "hi"}], "system"))
+
+        kinds = [e.split("\n", 1)[0] for e in events]
+        results = [json.loads(e.split("data: ", 1)[1])["result"] for e in events if e.startswith("event: tool_result")]
+        assert kinds.index("event: tool_result") > max(i for i, k in enumerate(kinds) if k == "event: tool_call")
+        assert results == ["result fast", "result medium", "result slow"]
+        # The round takes as long as the slowest tool, not the sum
+        assert max(end for _s, end in spans) - min(start for start, _e in spans) < 0.35
+        tool_msgs = [m for m in seen[1] if m["role"] == "tool"]
+        assert [m["tool_call_id"] for m in tool_msgs] == ["call_0", "call_1", "call_2"]
+        assert tool_msgs[0]["content"] == "result slow"
+
+    def test_metrics_event_summarizes_the_request(self, monkeypatch):
+        import chat
+
+        monkeypatch.setitem(chat.agent_tools._TOOL_MAP, "fetch_webpage", lambda args: "x" * args["n"])
+        client = self._fake_client([("fetch_webpage", {"n": 10}), ("fetch_webpage", {"n": 5000})], [])
+
+        events = list(chat._run_agent_loop(client, [{"role": "user", "content": "hi"}], "system", True))
+
+        assert events[-1].startswith("event: done")
+        assert events[-2].startswith("event: metrics")
+        summary = json.loads(events[-2].split("data: ", 1)[1])
+        assert summary["calls"] == 2 and summary["truncated"] == 1
+        assert summary["total_bytes"] == 5010
+
+
+class TestToolSingleFlight:
+    """Test request coalescing in tools.execute_tool."""
+
+    def test_identical_concurrent_calls_share_one_execution(self, monkeypatch):
+        import threading
+        import time
+
+        import tools
+
+        calls = []
+
+        def slow_tool(args):
+            calls.append(args)
+            time.sleep(0.2)
+            return f"contributors of {args['repo']}"
+
+        monkeypatch.setitem(tools._TOOL_MAP, "get_repo_contributors", slow_tool)
+        before = tools.single_flight_stats()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                tools.execute_tool("get_repo_contributors", '{"repo": "a/b"}')
+            ))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == ["contributors of a/b"] * 5
+        after = tools.single_flight_stats()
+        assert after["coalesced"] - before["coalesced"] == 4
+        assert after["in_flight"] == 0
+
+    def test_keys_canonicalize_arguments(self):
+        import tools
+
+        assert tools._flight_key("x", {"a": 1, "b": 2}) == tools._flight_key("x", {"b": 2, "a": 1})
+        assert tools._flight_key("fetch_webpage", {"url": "https://arxiv.org/abs/1#x"}) == (
+            tools._flight_key("fetch_webpage", {"url": "HTTPS://arxiv.org/abs/1?utm_source=t"})
+        )
+
+    def test_sequential_calls_are_not_cached(self, monkeypatch):
+        import tools
+
+        calls = []
+        monkeypatch.setitem(tools._TOOL_MAP, "get_citation_stats", lambda args: calls.append(1) or "ok")
+        tools.execute_tool("get_citation_stats", "{}")
+        tools.execute_tool("get_citation_stats", "{}")
+        assert len(calls) == 2
+
+
+class TestToolMetrics:
+    """Test the per-tool instrumentation in tools.execute_tool."""
+
+    def test_calls_are_recorded(self, monkeypatch):
+        import tool_metrics
+        import tools
+
+        def flaky(args):
+            if args.get("fail"):
+                raise KeyError("boom")
+            tool_metrics.cache_hit("test_cache")
+            return "ok" * args.get("n", 1)
+
+        monkeypatch.setitem(tools._TOOL_MAP, "metrics_probe", flaky)
+        calls = []
+        assert tools.execute_tool("metrics_probe", '{"n": 1500}', calls) == "ok" * 1500
+        tools.execute_tool("metrics_probe", '{"fail": true}', calls)
+        tools.execute_tool("metrics_probe", "[1]", calls)
+
+        assert [c["error"] for c in calls] == [None, "KeyError", "InvalidArguments"]
+        assert calls[0]["bytes"] == 3000 and calls[0]["truncated"]
+        assert calls[0]["cache_hits"] == {"test_cache": 1}
+        stats = tool_metrics.stats()["metrics_probe"]
+        assert stats["calls"] == 3 and stats["truncated"] == 1
+        assert stats["errors"] == {"KeyError": 1, "InvalidArguments": 1}
+        assert sum(stats["latency_ms"].values()) == 3
+        assert "tools" in tools.metrics() and "rag" in tools.metrics()
+
+    def test_cache_hits_outside_a_tool_call_are_ignored(self):
+        import tool_metrics
+
+        before = tool_metrics.stats()
+        tool_metrics.cache_hit("nothing")
+        tool_metrics.record_error(ValueError())
+        assert tool_metrics.stats() == before
+        # ...and are not attributed to the next call either
+        with tool_metrics.measure("outside_probe") as record:
+            record["result"] = "ok"
+        assert record["cache_hits"] == {} and record["error"] is None